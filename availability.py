@@ -0,0 +1,404 @@
+import heapq
+
+from collections.abc import Mapping, Sequence
+from datetime import date, datetime
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def parse_date_ordinal(date_string: str) -> int:
+    """
+    Turns a date from the API (e.g. "2022-06-22T00:00:00Z") into a day ordinal.
+    """
+    return date.fromisoformat(date_string[:10]).toordinal()
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    """
+    Yields the positions of the set bits in `mask`, lowest first.
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def window_starts(mask: int, nights: int) -> int:
+    """
+    Returns a mask with bit i set wherever bits i to i + nights - 1 of `mask`
+    are all set, i.e. every night a stay of `nights` nights can start on.
+
+    This doubles the span covered on every step, so it takes log(nights)
+    shifts rather than one per night.
+    """
+    span = 1
+    while span < nights:
+        step = min(span, nights - span)
+        mask &= mask >> step
+        span += step
+    return mask
+
+
+def run_lengths(mask: int) -> List[Tuple[int, int]]:
+    """
+    Returns the runs of consecutive set bits in `mask` as (position, length)
+    pairs, lowest first.
+    """
+    runs = []
+    # The lowest bit of every run. Adding those carries each run over into
+    # the bit just above it.
+    starts = mask & ~(mask << 1)
+    ends = (mask + starts) & ~mask
+    for start, end in zip(iter_bits(starts), iter_bits(ends)):
+        runs.append((start, end - start))
+    return runs
+
+
+class DateRange:
+    """
+    The stay from the night of day ordinal `first` to the morning of day
+    ordinal `last`. It can be read like the {"start": <date>, "end": <date>}
+    dicts the rest of the program uses, but only turns the ordinals into
+    strings when asked to.
+    """
+
+    __slots__ = ("first", "last")
+
+    def __init__(self, first: int, last: int) -> None:
+        self.first = first
+        self.last = last
+
+    @property
+    def start(self) -> str:
+        return date.fromordinal(self.first).isoformat()
+
+    @property
+    def end(self) -> str:
+        return date.fromordinal(self.last).isoformat()
+
+    @property
+    def nights(self) -> int:
+        return self.last - self.first
+
+    def __getitem__(self, key: str) -> str:
+        if key == "start":
+            return self.start
+        if key == "end":
+            return self.end
+        raise KeyError(key)
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"start": self.start, "end": self.end}
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, DateRange):
+            return (self.first, self.last) == (other.first, other.last)
+        if isinstance(other, Mapping):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((self.first, self.last))
+
+    def __repr__(self) -> str:
+        return "DateRange({!r}, {!r})".format(self.start, self.end)
+
+
+def date_range_ordinals(entry: Any) -> Tuple[int, int]:
+    """
+    Returns the first and last day ordinals of a `DateRange` or of a
+    {"start": <date>, "end": <date>} dict.
+    """
+    if isinstance(entry, DateRange):
+        return entry.first, entry.last
+    return (
+        date.fromisoformat(entry["start"][:10]).toordinal(),
+        date.fromisoformat(entry["end"][:10]).toordinal(),
+    )
+
+
+class StayRun:
+    """
+    Every stay of `nights` nights starting on one of `starts` consecutive
+    days from day ordinal `first_start`, i.e. a maximal run of available
+    nights as far as stays of that length are concerned.
+    """
+
+    __slots__ = ("first_start", "starts", "nights")
+
+    def __init__(self, first_start: int, starts: int, nights: int) -> None:
+        self.first_start = first_start
+        self.starts = starts
+        self.nights = nights
+
+    @property
+    def start(self) -> str:
+        return date.fromordinal(self.first_start).isoformat()
+
+    @property
+    def end(self) -> str:
+        return date.fromordinal(self.first_start + self.length).isoformat()
+
+    @property
+    def length(self) -> int:
+        """
+        The number of nights the run covers.
+        """
+        return self.starts + self.nights - 1
+
+    def windows(self) -> Iterator[DateRange]:
+        """
+        Yields each stay in the run.
+        """
+        for arrival in range(self.first_start, self.first_start + self.starts):
+            yield DateRange(arrival, arrival + self.nights)
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"start": self.start, "end": self.end, "length": str(self.length)}
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, StayRun):
+            return NotImplemented
+        return (self.first_start, self.starts, self.nights) == (
+            other.first_start,
+            other.starts,
+            other.nights,
+        )
+
+    def __repr__(self) -> str:
+        return "StayRun({}, {}, {})".format(self.first_start, self.starts, self.nights)
+
+
+class StayWindows(Sequence):
+    """
+    The stays of a site as a sequence of `DateRange`s. It only keeps the
+    maximal runs, and expands them into individual stays when they are
+    iterated over, so a site that is open for months doesn't cost an
+    object per possible stay until something asks for them.
+    """
+
+    __slots__ = ("runs", "_expanded")
+
+    def __init__(self, runs: Iterable[StayRun]) -> None:
+        self.runs = list(runs)
+        self._expanded: Optional[List[DateRange]] = None
+
+    def __len__(self) -> int:
+        return sum(run.starts for run in self.runs)
+
+    def __iter__(self) -> Iterator[DateRange]:
+        if self._expanded is not None:
+            return iter(self._expanded)
+        if len(set(run.nights for run in self.runs)) > 1:
+            # Stays of different lengths are interleaved by arrival, then
+            # length, like they'd be listed one by one.
+            return heapq.merge(
+                *(run.windows() for run in self.runs),
+                key=lambda d: (d.first, d.last),
+            )
+        return chain.from_iterable(run.windows() for run in self.runs)
+
+    def __getitem__(self, index: Any) -> Any:
+        if self._expanded is None:
+            self._expanded = list(self)
+        return self._expanded[index]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, StayWindows):
+            return self.runs == other.runs
+        if isinstance(other, (list, tuple, Sequence)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return "StayWindows({!r})".format(self.runs)
+
+    def compressed(self) -> List[Dict[str, str]]:
+        """
+        Returns the nights the runs cover as {"start": <date>, "end": <date>,
+        "length": <nights>}. Maximal runs of one length never overlap or
+        touch, but runs of several lengths, or of stays that can only start
+        on some weekdays, can, and are merged.
+        """
+        ranges: List[List[int]] = []
+        for run in sorted(self.runs, key=lambda r: r.first_start):
+            first, last = run.first_start, run.first_start + run.length
+            if ranges and first <= ranges[-1][1]:
+                ranges[-1][1] = max(ranges[-1][1], last)
+            else:
+                ranges.append([first, last])
+        return [
+            {
+                "start": date.fromordinal(first).isoformat(),
+                "end": date.fromordinal(last).isoformat(),
+                "length": str(last - first),
+            }
+            for first, last in ranges
+        ]
+
+
+class ParkResult:
+    """
+    What a check found for one park: `available` of its `maximum` sites
+    have a stay, listed by site ID in `sites`. It unpacks like the
+    (available, maximum, sites, name) tuples it replaces.
+    """
+
+    __slots__ = ("available", "maximum", "sites", "name")
+
+    def __init__(
+        self, available: int, maximum: int, sites: Dict[int, Sequence], name: str
+    ) -> None:
+        self.available = available
+        self.maximum = maximum
+        self.sites = sites
+        self.name = name
+
+    def _fields(self) -> Tuple[int, int, Dict[int, Sequence], str]:
+        return self.available, self.maximum, self.sites, self.name
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._fields())
+
+    def __len__(self) -> int:
+        return 4
+
+    def __getitem__(self, index: Any) -> Any:
+        return self._fields()[index]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (ParkResult, tuple)):
+            return self._fields() == tuple(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return "ParkResult({!r}, {!r}, {!r}, {!r})".format(*self._fields())
+
+    def to_json(self) -> Dict[int, List[Dict[str, str]]]:
+        """
+        Returns the stays of each site as lists of {"start": <date>,
+        "end": <date>} dicts.
+        """
+        return {
+            site_id: [
+                d.to_dict() if isinstance(d, DateRange) else dict(d) for d in dates
+            ]
+            for site_id, dates in self.sites.items()
+        }
+
+
+class AvailabilityMatrix:
+    """
+    The availability of every campsite in a park as a campsites × days bit
+    matrix. Each site maps to an int whose bit i is set if the site is
+    available on the night with day ordinal `first_day + i`.
+
+    Sites that were never available are kept (with no bits set) so that the
+    matrix still knows how many sites the park has.
+    """
+
+    __slots__ = ("first_day", "sites", "_runs")
+
+    def __init__(self, first_day: int, sites: Dict[str, int]) -> None:
+        self.first_day = first_day
+        self.sites = sites
+        self._runs: Optional[Dict[str, List[Tuple[int, int]]]] = None
+
+    def __len__(self) -> int:
+        return len(self.sites)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, AvailabilityMatrix):
+            return NotImplemented
+        return self.to_park_information() == other.to_park_information()
+
+    @classmethod
+    def from_ordinals(
+        cls, ordinals_by_site: Dict[str, List[int]]
+    ) -> "AvailabilityMatrix":
+        first_day = min(
+            (min(o) for o in ordinals_by_site.values() if o), default=0
+        )
+        sites = {}
+        for site, ordinals in ordinals_by_site.items():
+            mask = 0
+            for ordinal in ordinals:
+                mask |= 1 << (ordinal - first_day)
+            sites[site] = mask
+        return cls(first_day, sites)
+
+    @classmethod
+    def from_park_information(
+        cls, park_information: Dict[str, List[str]]
+    ) -> "AvailabilityMatrix":
+        """
+        Builds a matrix from {"<campsite_id>": [<ISO 8601 date>, ...]}.
+        """
+        return cls.from_ordinals(
+            {
+                site: [parse_date_ordinal(d) for d in dates]
+                for site, dates in park_information.items()
+            }
+        )
+
+    def to_park_information(self) -> Dict[str, List[str]]:
+        """
+        The inverse of `from_park_information`, e.g. for logging.
+        """
+        return {
+            site: [
+                date.fromordinal(self.first_day + i).strftime(
+                    "%Y-%m-%dT00:00:00Z"
+                )
+                for i in iter_bits(mask)
+            ]
+            for site, mask in self.sites.items()
+        }
+
+    def nights_mask(
+        self, start_date: datetime, end_date: datetime, weekends_only: bool = False
+    ) -> int:
+        """
+        Returns a mask of the nights from `start_date` up to (but not
+        including) `end_date`, optionally only Fridays and Saturdays.
+        """
+        num_days = (end_date - start_date).days
+        if num_days <= 0:
+            return 0
+        mask = (1 << num_days) - 1
+        if weekends_only:
+            # Friday and Saturday relative to start_date, repeated every week.
+            week = sum(1 << ((day - start_date.weekday()) % 7) for day in (4, 5))
+            weeks = num_days // 7 + 1
+            mask &= ((1 << (7 * weeks)) - 1) // 0b1111111 * week
+        shift = start_date.toordinal() - self.first_day
+        return mask << shift if shift >= 0 else mask >> -shift
+
+    def runs(self) -> Dict[str, List[Tuple[int, int]]]:
+        """
+        Returns each site's runs of consecutive available nights as
+        (first night's day ordinal, number of nights) pairs. They are worked
+        out once and then shared by every query against the matrix.
+        """
+        if self._runs is None:
+            self._runs = {
+                site: [(self.first_day + i, n) for i, n in run_lengths(mask)]
+                for site, mask in self.sites.items()
+            }
+        return self._runs
+
+    def stay_runs(
+        self, nights_mask: int, nights: int
+    ) -> Iterator[Tuple[str, StayWindows]]:
+        """
+        Yields each site that has at least one stay of `nights` consecutive
+        nights within `nights_mask`, with its stays as maximal runs of start
+        days.
+        """
+        for site, mask in self.sites.items():
+            starts = window_starts(mask & nights_mask, nights)
+            if starts:
+                yield site, StayWindows(
+                    StayRun(self.first_day + i, n, nights)
+                    for i, n in run_lengths(starts)
+                )
@@ -0,0 +1,143 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+
+class CachedMonth(NamedTuple):
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+    body: bytes
+
+    @property
+    def content(self) -> bytes:
+        return zlib.decompress(self.body)
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        return json.loads(self.content)
+
+    def validators(self) -> Dict[str, str]:
+        """
+        Returns the headers for a conditional request for this month.
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class AvailabilityCache:
+    """
+    A local cache of availability responses keyed by (park_id, month).
+
+    Months the server sent an ETag or Last-Modified header for are always
+    revalidated with a conditional request. Months without either are served
+    straight from the cache while they are younger than `freshness` seconds.
+    """
+
+    STORE_FILE = Path(os.environ["HOME"]) / ".campsite-checker-availability.sqlite3"
+    DEFAULT_FRESHNESS = 60
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        freshness: float = DEFAULT_FRESHNESS,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = Path(path) if path is not None else self.STORE_FILE
+        self.freshness = freshness
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            str(self.path), timeout=30, check_same_thread=False
+        )
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS availability (
+                park_id TEXT NOT NULL,
+                month TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                body BLOB NOT NULL,
+                PRIMARY KEY (park_id, month)
+            )"""
+        )
+        self._db.commit()
+
+    @staticmethod
+    def _month_key(month_date: datetime) -> str:
+        return month_date.strftime("%Y-%m")
+
+    def get(self, park_id: Any, month_date: datetime) -> Optional[CachedMonth]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, fetched_at, body FROM availability "
+                "WHERE park_id = ? AND month = ?",
+                (str(park_id), self._month_key(month_date)),
+            ).fetchone()
+        return CachedMonth(*row) if row is not None else None
+
+    def is_fresh(self, entry: CachedMonth) -> bool:
+        if entry.etag or entry.last_modified:
+            return False
+        return self._clock() - entry.fetched_at < self.freshness
+
+    def put(
+        self,
+        park_id: Any,
+        month_date: datetime,
+        body: bytes,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO availability VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    str(park_id),
+                    self._month_key(month_date),
+                    etag,
+                    last_modified,
+                    self._clock(),
+                    zlib.compress(body),
+                ),
+            )
+            self._db.commit()
+
+    def touch(self, park_id: Any, month_date: datetime) -> None:
+        """
+        Marks a cached month as just confirmed unchanged by the server.
+        """
+        with self._lock:
+            self._db.execute(
+                "UPDATE availability SET fetched_at = ? "
+                "WHERE park_id = ? AND month = ?",
+                (self._clock(), str(park_id), self._month_key(month_date)),
+            )
+            self._db.commit()
+
+    def prune(self, before: datetime) -> int:
+        """
+        Removes every month before `before`'s month. Returns the number of
+        months removed.
+        """
+        with self._lock:
+            removed = self._db.execute(
+                "DELETE FROM availability WHERE month < ?",
+                (self._month_key(before),),
+            ).rowcount
+            self._db.commit()
+        return removed
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,253 @@
+"""
+A local stand-in for recreation.gov that serves synthetic availability,
+campground and campsite data, for benchmarks and tests.
+
+    python -m benchmarks.fake_recreation_server --port 8000 --latency 0.05
+
+Then point the client at it with RecreationClient.use_base_url.
+"""
+import argparse
+import calendar
+import json
+import random
+import re
+import threading
+import time
+
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+CAMPSITE_TYPES = ("STANDARD NONELECTRIC", "STANDARD ELECTRIC", "GROUP STANDARD NONELECTRIC")
+STATES = ("Reserved", "Not Reservable", "Not Available")
+
+
+class FakeServerConfig(NamedTuple):
+    # Seconds to wait before answering each request.
+    latency: float = 0.0
+    # Fraction of requests answered with a 429.
+    rate_limited_fraction: float = 0.0
+    # Number of campsites in every campground.
+    sites_per_park: int = 50
+    # Fraction of campsite nights that are available.
+    available_fraction: float = 0.1
+    seed: int = 0
+
+
+class FakeRecreationServer:
+    """
+    Serves the recreation.gov endpoints the client uses from a background
+    thread. The data is a deterministic function of the config, the park,
+    the site and the date, so runs with the same config are reproducible.
+    """
+
+    AVAILABILITY_PATH = re.compile(r"^/api/camps/availability/campground/(\d+)/month$")
+    CAMPGROUND_PATH = re.compile(r"^/api/camps/campgrounds/(\d+)$")
+    CAMPSITE_PATH = re.compile(r"^/api/camps/campsites/(\d+)$")
+    SEARCH_PATH = "/api/search"
+
+    def __init__(self, config: FakeServerConfig = FakeServerConfig(), port: int = 0) -> None:
+        self.config = config
+        self.requests = 0
+        self.rate_limited = 0
+        self.bytes_sent = 0
+        self._random = random.Random(config.seed)
+        self._lock = threading.Lock()
+        # Encoded responses, so that generating synthetic data doesn't count
+        # against the client in benchmarks that run in the same process.
+        self._bodies: Dict[Tuple[str, str], bytes] = {}
+        self._months: Dict[Tuple[int, datetime], Dict[str, Any]] = {}
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return "http://127.0.0.1:{}".format(self._httpd.server_address[1])
+
+    def start(self) -> "FakeRecreationServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeRecreationServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.requests = 0
+            self.rate_limited = 0
+            self.bytes_sent = 0
+
+    def site_ids(self, park_id: int):
+        return range(park_id * 1000, park_id * 1000 + self.config.sites_per_park)
+
+    def availability(self, park_id: int, month_date: datetime) -> Dict[str, Any]:
+        campsites = {}
+        days = calendar.monthrange(month_date.year, month_date.month)[1]
+        for site_id in self.site_ids(park_id):
+            rng = random.Random("{}-{}-{:%Y-%m}".format(self.config.seed, site_id, month_date))
+            availabilities = {}
+            for day in range(1, days + 1):
+                date = "{:%Y-%m}-{:02d}T00:00:00Z".format(month_date, day)
+                if rng.random() < self.config.available_fraction:
+                    availabilities[date] = "Available"
+                else:
+                    availabilities[date] = rng.choice(STATES)
+            campsites[str(site_id)] = {
+                "availabilities": availabilities,
+                "campsite_id": str(site_id),
+                "campsite_reserve_type": "Site-Specific",
+                "campsite_type": CAMPSITE_TYPES[site_id % len(CAMPSITE_TYPES)],
+                "capacity_rating": "Single",
+                "loop": "LOOP {}".format(site_id % 4),
+                "max_num_people": 6,
+                "min_num_people": 1,
+                "quantities": {},
+                "site": "{:03d}".format(site_id % 1000),
+                "type_of_use": "Overnight",
+            }
+        return {"campsites": campsites, "count": len(campsites)}
+
+    def campground(self, park_id: int) -> Dict[str, Any]:
+        return {"campground": {"facility_name": "FAKE CAMPGROUND {}".format(park_id)}}
+
+    def campsite(self, site_id: int) -> Dict[str, Any]:
+        return {
+            "campsite": {
+                "campsite_id": str(site_id),
+                "campsite_name": "{:03d}".format(site_id % 1000),
+                "campsite_type": CAMPSITE_TYPES[site_id % len(CAMPSITE_TYPES)],
+            }
+        }
+
+    def search(self, park_ids, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+        first = "{:%Y-%m-%d}".format(start_date)
+        last = "{:%Y-%m-%d}".format(end_date)
+        results = []
+        for park_id in park_ids:
+            available = set()
+            month_date = start_date.replace(day=1)
+            while month_date < end_date:
+                key = (park_id, month_date)
+                if key not in self._months:
+                    self._months[key] = self.availability(park_id, month_date)
+                campsites = self._months[key]["campsites"]
+                for site_id, campsite in campsites.items():
+                    for date, state in campsite["availabilities"].items():
+                        if state == "Available" and first <= date < last:
+                            available.add(site_id)
+                month_date = (month_date + timedelta(days=32)).replace(day=1)
+            total = self.config.sites_per_park
+            results.append(
+                {
+                    "entity_id": str(park_id),
+                    "availability_counts": {
+                        "Available": len(available),
+                        "Reserved": total - len(available),
+                    },
+                }
+            )
+        return {"results": results, "size": len(results)}
+
+    def respond(self, path: str, query: Dict[str, Any]) -> Tuple[int, bytes]:
+        with self._lock:
+            self.requests += 1
+            if self._random.random() < self.config.rate_limited_fraction:
+                self.rate_limited += 1
+                return 429, b""
+            key = (path, repr(sorted(query.items())))
+            body = self._bodies.get(key)
+        if body is None:
+            status, payload = self._payload(path, query)
+            body = json.dumps(payload).encode()
+            if status != 200:
+                return status, body
+            with self._lock:
+                self._bodies[key] = body
+        return 200, body
+
+    def _payload(self, path: str, query: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        match = self.AVAILABILITY_PATH.match(path)
+        if match:
+            month_date = datetime.strptime(query["start_date"][0][:10], "%Y-%m-%d")
+            return 200, self.availability(int(match.group(1)), month_date)
+        match = self.CAMPGROUND_PATH.match(path)
+        if match:
+            return 200, self.campground(int(match.group(1)))
+        match = self.CAMPSITE_PATH.match(path)
+        if match:
+            return 200, self.campsite(int(match.group(1)))
+        if path == self.SEARCH_PATH:
+            park_ids = re.findall(r"\d+", query["fq"][0])
+            return 200, self.search(
+                [int(p) for p in park_ids],
+                datetime.strptime(query["start_date"][0][:10], "%Y-%m-%d"),
+                datetime.strptime(query["end_date"][0][:10], "%Y-%m-%d"),
+            )
+        return 404, {"error": "not found"}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                if server.config.latency:
+                    time.sleep(server.config.latency)
+                url = urlparse(self.path)
+                status, body = server.respond(url.path, parse_qs(url.query))
+                self.send_response(status)
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with server._lock:
+                    server.bytes_sent += len(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--rate-limited-fraction", type=float, default=0.0)
+    parser.add_argument("--sites-per-park", type=int, default=50)
+    parser.add_argument("--available-fraction", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    fake = FakeRecreationServer(
+        FakeServerConfig(
+            latency=args.latency,
+            rate_limited_fraction=args.rate_limited_fraction,
+            sites_per_park=args.sites_per_park,
+            available_fraction=args.available_fraction,
+            seed=args.seed,
+        ),
+        port=args.port,
+    )
+    print("Serving fake recreation.gov on {}".format(fake.base_url))
+    try:
+        fake.serve_forever()
+    except KeyboardInterrupt:
+        pass
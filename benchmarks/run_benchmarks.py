@@ -0,0 +1,210 @@
+"""
+Reproducible performance benchmarks, run against a local fake recreation.gov.
+
+    python -m benchmarks.run_benchmarks --output bench.json
+    python -m benchmarks.run_benchmarks --compare bench.json
+
+Results are written as JSON so that runs can be compared for regressions.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from datetime import date, datetime, timedelta
+from typing import Any, Dict
+
+import camping
+
+from availability import AvailabilityMatrix
+from benchmarks.fake_recreation_server import FakeRecreationServer, FakeServerConfig
+from clients.recreation_client import RecreationClient
+from watch import Watch
+
+
+START_DATE = datetime(2030, 6, 1)
+
+
+def benchmark_cycle(
+    config: FakeServerConfig, parks: int, months: int, max_concurrency: int, rate_limit: float, prefilter: bool = False,
+) -> Dict[str, Any]:
+    """
+    Times one full check of `parks` parks over `months` months, from the
+    first request to the last evaluated park.
+    """
+    end_date = START_DATE + timedelta(days=30 * months - 1)
+    watch = Watch("benchmark", list(range(1, parks + 1)), START_DATE, end_date, nights=2)
+
+    # Everything this changes is put back afterwards, so that it can be run
+    # from tests without affecting the ones after it.
+    base_url = RecreationClient.BASE_URL
+    metadata_cache = RecreationClient._METADATA_CACHE
+    availability_cache = RecreationClient._AVAILABILITY_CACHE
+    pool_size = RecreationClient.POOL_SIZE
+    rate_limiter = RecreationClient.rate_limiter
+    rate_limit_setting = RecreationClient.RATE_LIMIT
+    with FakeRecreationServer(config) as fake:
+        RecreationClient.use_base_url(fake.base_url)
+        RecreationClient.use_metadata_cache(None)
+        RecreationClient.use_availability_cache(None)
+        RecreationClient.configure_pool(max_concurrency)
+        RecreationClient.configure_rate_limit(rate_limit)
+        try:
+            tracemalloc.start()
+            wall_started = time.perf_counter()
+            cpu_started = time.process_time()
+            info_by_watch = camping.check_watches(
+                [watch], max_concurrency=max_concurrency, prefilter=prefilter
+            )
+            wall_seconds = time.perf_counter() - wall_started
+            cpu_seconds = time.process_time() - cpu_started
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            RecreationClient.use_base_url(base_url)
+            RecreationClient.use_metadata_cache(metadata_cache)
+            RecreationClient.use_availability_cache(availability_cache)
+            RecreationClient.configure_pool(pool_size)
+            RecreationClient.RATE_LIMIT = rate_limit_setting
+            RecreationClient.rate_limiter = rate_limiter
+
+    available_sites = sum(info[0] for info in info_by_watch[watch.name].values())
+    return {
+        "parks": parks,
+        "months": months,
+        "max_concurrency": max_concurrency,
+        "prefilter": prefilter,
+        "wall_seconds": wall_seconds,
+        "cpu_seconds": cpu_seconds,
+        "requests": fake.requests,
+        "rate_limited": fake.rate_limited,
+        "requests_per_second": fake.requests / wall_seconds,
+        "bytes_downloaded": fake.bytes_sent,
+        "peak_memory_bytes": peak_memory,
+        "available_sites": available_sites,
+    }
+
+
+def synthetic_park_information(sites: int, days: int, available_fraction: float, seed: int):
+    rng = random.Random(seed)
+    first_day = START_DATE.date()
+    return {
+        str(site_id): [
+            (first_day + timedelta(days=day)).strftime("%Y-%m-%dT00:00:00Z")
+            for day in range(days)
+            if rng.random() < available_fraction
+        ]
+        for site_id in range(sites)
+    }
+
+
+def benchmark_evaluation(
+    sites: int, days: int, nights: int, available_fraction: float, repeats: int, seed: int
+) -> Dict[str, Any]:
+    """
+    Measures the CPU time spent finding stays in already fetched data.
+    """
+    park_information = synthetic_park_information(sites, days, available_fraction, seed)
+    matrix = AvailabilityMatrix.from_park_information(park_information)
+    end_date = START_DATE + timedelta(days=days)
+
+    started = time.process_time()
+    for _ in range(repeats):
+        camping.get_num_available_sites(matrix, START_DATE, end_date, nights=nights)
+    num_available_seconds = (time.process_time() - started) / repeats
+
+    started = time.process_time()
+    for _ in range(repeats):
+        for dates in park_information.values():
+            camping.consecutive_nights(dates, nights)
+    consecutive_nights_seconds = (time.process_time() - started) / repeats
+
+    return {
+        "sites": sites,
+        "days": days,
+        "nights": nights,
+        "get_num_available_sites_cpu_seconds": num_available_seconds,
+        "consecutive_nights_cpu_seconds": consecutive_nights_seconds,
+    }
+
+
+def run(args) -> Dict[str, Any]:
+    config = FakeServerConfig(
+        latency=args.latency,
+        rate_limited_fraction=args.rate_limited_fraction,
+        sites_per_park=args.sites_per_park,
+        available_fraction=args.available_fraction,
+        seed=args.seed,
+    )
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": date.today().isoformat(),
+            "config": config._asdict(),
+        },
+        "benchmarks": {
+            "cycle": benchmark_cycle(
+                config, args.parks, args.months, args.max_concurrency, args.rate_limit,
+                prefilter=args.prefilter_search,
+            ),
+            "evaluation": benchmark_evaluation(
+                args.eval_sites,
+                args.eval_days,
+                args.nights,
+                args.available_fraction,
+                args.repeats,
+                args.seed,
+            ),
+        },
+    }
+
+
+def compare(baseline: Dict[str, Any], results: Dict[str, Any]) -> str:
+    lines = []
+    for name, values in results["benchmarks"].items():
+        for key, value in values.items():
+            old = baseline.get("benchmarks", {}).get(name, {}).get(key)
+            if not isinstance(value, float) or not old:
+                continue
+            lines.append(
+                "{:<50} {:>14.6f} {:>14.6f} {:>+8.1%}".format(
+                    "{}.{}".format(name, key), old, value, value / old - 1
+                )
+            )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--parks", type=int, default=40)
+    parser.add_argument("--months", type=int, default=3)
+    parser.add_argument("--sites-per-park", type=int, default=100)
+    parser.add_argument("--available-fraction", type=float, default=0.1)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per request.")
+    parser.add_argument("--rate-limited-fraction", type=float, default=0.0)
+    parser.add_argument("--max-concurrency", type=int, default=camping.DEFAULT_MAX_CONCURRENCY)
+    parser.add_argument("--rate-limit", type=float, default=1000.0)
+    parser.add_argument("--prefilter-search", action="store_true")
+    parser.add_argument("--eval-sites", type=int, default=500)
+    parser.add_argument("--eval-days", type=int, default=180)
+    parser.add_argument("--nights", type=int, default=2)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results to this file instead of stdout.")
+    parser.add_argument("--compare", help="Compare against the results in this file.")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            print(compare(json.load(baseline_file), results))
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+    elif not args.compare:
+        json.dump(results, sys.stdout, indent=2)
+        print()
@@ -1,27 +1,56 @@
 # -*- coding: utf-8 -*-
 #!/usr/bin/env python3
 
+import atexit
 import json
 import logging
 import os
+import signal
 import smtplib
 import ssl
+import sys
+import threading
+import time
 import yaml
 
 from collections import defaultdict
-from datetime import datetime, timedelta
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from concurrent.futures import wait as futures_wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import date, datetime, timedelta
 from itertools import count, groupby
-from typing import Any, Callable, Dict, Iterable, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
 
 from dateutil import rrule
 
 import formatters as f
 
+from availability import (
+    AvailabilityMatrix,
+    ParkResult,
+    StayRun,
+    StayWindows,
+    iter_bits,
+    parse_date_ordinal,
+    window_starts,
+)
+from availability_cache import AvailabilityCache
+from clients.availability_parser import select_campsites
 from clients.recreation_client import RecreationClient
+from clients.replay import RecordingAdapter, ReplayAdapter
 from enums.date_format import DateFormat
 from enums.emoji import Emoji
+from events import EventStream
+from hash_store import HashStore
+from history_store import HistoryStore
+from metadata_cache import MetadataCache
+from metrics import Metrics
+from queries import StayQuery, find_stays, merge_stays, ordinal_weekday
+from scheduler import PollScheduler
 from utils import formatter
 from utils.camping_argparser import CampingArgumentParser
+from watch import Watch, WatchConfigError, watches_from_settings
+from work_queue import FetchTask, WorkQueue
 
 
 SETTINGS_FILE = os.path.join(os.environ["HOME"], ".campsite-checker.yml")
@@ -35,21 +64,128 @@ sh = logging.StreamHandler()
 sh.setFormatter(log_formatter)
 LOG.addHandler(sh)
 
+DEFAULT_MAX_CONCURRENCY = 8
+# Seconds a coordinator waits for its workers to fetch a round of pages.
+DEFAULT_QUEUE_TIMEOUT = 600
+# Share of --rate-limit the daemon plans to spend polling availability,
+# leaving the rest for park names, campsite pages and retries.
+POLL_BUDGET_SHARE = 0.8
+
+
+def get_months(
+    start_date, end_date, today: Optional[datetime] = None
+) -> List[datetime]:
+    """
+    Returns the first of each month in the range we care about. The
+    availability endpoint must be queried with the first of the month.
+
+    If `today` is given, months that are entirely in the past are skipped,
+    since nothing in them can be available anymore. The last month is always
+    kept so that we still learn how many sites the park has.
+    """
+    start_of_month = datetime(start_date.year, start_date.month, 1)
+    months = list(
+        rrule.rrule(rrule.MONTHLY, dtstart=start_of_month, until=end_date)
+    )
+    if today is not None:
+        start_of_this_month = datetime(today.year, today.month, 1)
+        months = [m for m in months if m >= start_of_this_month] or months[-1:]
+    return months
+
+
+def plan_months(
+    start_date, end_date, nights=None, weekends_only=False, stays=(), today: Optional[datetime] = None,
+) -> List[datetime]:
+    """
+    Returns the first of each month that has to be fetched to find every
+    stay a search could match. Unlike `get_months`, this only looks at the
+    nights up to (but not including) the checkout day, and of those only at
+    the ones a stay of `nights` nights, or one of `stays`, could cover after
+    `weekends_only` is applied. Nights before `today` are left out too.
+
+    If no stay is possible at all, only the month of the last night is
+    returned, so that we still learn how many sites the park has.
+    """
+    first = start_date.toordinal()
+    num_days = (end_date - start_date).days
+    last_night = start_date + timedelta(days=max(num_days - 1, 0))
+    fallback = [datetime(last_night.year, last_night.month, 1)]
+    if num_days <= 0:
+        return fallback
+
+    mask = AvailabilityMatrix(first, {}).nights_mask(
+        start_date, end_date, weekends_only=weekends_only
+    )
+    if today is not None and today.toordinal() > first:
+        mask &= ~((1 << (today.toordinal() - first)) - 1)
+
+    covered = 0
+    if stays:
+        for query in stays:
+            for window_first, window_last in query.window_ordinals(start_date, end_date):
+                for arrival in range(window_first, window_last - query.min_nights + 1):
+                    if (
+                        query.arrival_weekdays is not None
+                        and ordinal_weekday(arrival) not in query.arrival_weekdays
+                    ):
+                        continue
+                    longest = min(query.max_nights, window_last - arrival)
+                    covered |= ((1 << longest) - 1) << (arrival - first)
+        covered &= mask
+    else:
+        if nights not in range(1, num_days + 1):
+            nights = num_days
+        # Spread every possible start over the nights its stay covers,
+        # doubling the span on every step like `window_starts`.
+        covered = window_starts(mask, nights)
+        span = 1
+        while span < nights:
+            step = min(span, nights - span)
+            covered |= covered << step
+            span += step
+
+    months = []
+    for i in iter_bits(covered):
+        night = date.fromordinal(first + i)
+        month_date = datetime(night.year, night.month, 1)
+        if not months or months[-1] != month_date:
+            months.append(month_date)
+    return months or fallback
+
+
 def get_park_information(
     park_id, start_date, end_date, campsite_type=None, campsite_ids=()
 ):
     """
     This function consumes the user intent, collects the necessary information
     from the recreation.gov API, and then presents it in a nice format for the
-    rest of the program to work with. If the API changes in the future, this is
-    the only function you should need to change.
+    rest of the program to work with. If the API changes in the future, this
+    and `collapse_park_information` are the only functions you should need to
+    change.
 
     The only API to get availability information is the `month?` query param
     on the availability endpoint. You must query with the first of the month.
     This means if `start_date` and `end_date` cross a month boundary, we must
     hit the endpoint multiple times.
 
-    The output of this function looks like this:
+    See `collapse_park_information` for the output format.
+    """
+    api_data = [
+        RecreationClient.get_availability(
+            park_id, month_date, campsite_type, campsite_ids
+        )
+        for month_date in plan_months(start_date, end_date)
+    ]
+    return collapse_park_information(api_data, campsite_type, campsite_ids)
+
+
+def collapse_park_information(
+    api_data, campsite_type=None, campsite_ids=()
+) -> AvailabilityMatrix:
+    """
+    Collapses the monthly availability responses for a single park into an
+    `AvailabilityMatrix`, which is what the rest of the program works with.
+    Its `to_park_information` method gives the same data in this format:
 
     {"<campsite_id>": [<date>, <date>]}
 
@@ -59,163 +195,428 @@ def get_park_information(
     Notably, the output doesn't tell you which sites are available. The rest of
     the script doesn't need to know this to determine whether sites are available.
     """
-
-    # Get each first of the month for months in the range we care about.
-    start_of_month = datetime(start_date.year, start_date.month, 1)
-    months = list(
-        rrule.rrule(rrule.MONTHLY, dtstart=start_of_month, until=end_date)
-    )
-
-    # Get data for each month.
-    api_data = []
-    for month_date in months:
-        api_data.append(RecreationClient.get_availability(park_id, month_date))
-
-    # Collapse the data into the described output format.
     # Filter by campsite_type if necessary.
-    data = {}
+    ordinals_by_site: Dict[str, List[int]] = {}
 
     for month_data in api_data:
         for campsite_id, campsite_data in month_data["campsites"].items():
-            available = []
-            a = data.setdefault(campsite_id, [])
-            for date, availability_value in campsite_data[
+            a = ordinals_by_site.setdefault(campsite_id, [])
+            if campsite_type and campsite_type != campsite_data["campsite_type"]:
+                continue
+            if (
+                len(campsite_ids) > 0
+                and int(campsite_data["campsite_id"]) not in campsite_ids
+            ):
+                continue
+            for date_string, availability_value in campsite_data[
                 "availabilities"
             ].items():
-                if availability_value != "Available":
-                    continue
+                if availability_value == "Available":
+                    a.append(parse_date_ordinal(date_string))
 
-                if (
-                    campsite_type
-                    and campsite_type != campsite_data["campsite_type"]
-                ):
-                    continue
+    return AvailabilityMatrix.from_ordinals(ordinals_by_site)
 
-                if (
-                    len(campsite_ids) > 0
-                    and int(campsite_data["campsite_id"]) not in campsite_ids
-                ):
-                    continue
 
-                available.append(date)
-            if available:
-                a += available
+def fetch_parks(
+    park_ids, months, max_concurrency=DEFAULT_MAX_CONCURRENCY, campsite_type=None, campsite_ids=(),
+) -> Tuple[Dict[Tuple[Any, datetime], Dict[str, Any]], Dict[Any, str]]:
+    """
+    Fetches the availability of every (park, month) pair and the name of
+    every park at once, with at most `max_concurrency` requests in flight.
+
+    Returns the availability responses keyed by (park_id, month) and the
+    park names keyed by park_id.
+    """
+    keys = [(park_id, month_date) for park_id in park_ids for month_date in months]
+    return fetch_park_months(
+        keys,
+        park_ids,
+        max_concurrency=max_concurrency,
+        filters={key: (campsite_type, tuple(campsite_ids)) for key in keys},
+    )
 
-    return data
 
+def fetch_park_months(
+    keys, name_park_ids=(), max_concurrency=DEFAULT_MAX_CONCURRENCY, filters=None, queue=None, on_park=None,
+) -> Tuple[Dict[Tuple[Any, datetime], Dict[str, Any]], Dict[Any, str]]:
+    """
+    Like `fetch_parks`, but for an arbitrary set of (park_id, month) keys.
+    Only the parks in `name_park_ids` have their names looked up.
 
-def is_weekend(date):
-    weekday = date.weekday()
+    `filters` maps keys to the (campsite_type, campsite_ids) whose other
+    campsites can be thrown away while the response is parsed.
 
-    return weekday == 4 or weekday == 5
+    With a `queue`, the pages are fetched by workers instead, see
+    `fetch_from_queue`.
+
+    `on_park(park_id, pages, name)` is called, from this thread, as soon as
+    all of a park's pages and its name (if looked up) are in, without
+    waiting for the other parks.
+    """
+    filters = filters or {}
+    if queue is not None:
+        return fetch_from_queue(
+            queue, keys, name_park_ids, filters=filters, on_park=on_park
+        )
+    with Metrics.shared().timed("fetch"), ThreadPoolExecutor(
+        max_workers=max_concurrency
+    ) as executor:
+        month_futures = {
+            (park_id, month_date): executor.submit(
+                RecreationClient.get_availability,
+                park_id,
+                month_date,
+                *filters.get((park_id, month_date), (None, ())),
+            )
+            for park_id, month_date in keys
+        }
+        name_futures = {
+            park_id: executor.submit(RecreationClient.get_park_name, park_id)
+            for park_id in name_park_ids
+        }
+        try:
+            if on_park is not None:
+                _report_fetched_parks(month_futures, name_futures, on_park)
+            availability = {
+                key: future.result() for key, future in month_futures.items()
+            }
+            names = {
+                park_id: future.result()
+                for park_id, future in name_futures.items()
+            }
+        except Exception:
+            # Don't keep hammering the API once the run has already failed.
+            for future in list(month_futures.values()) + list(
+                name_futures.values()
+            ):
+                future.cancel()
+            raise
+
+    return availability, names
+
+
+def _report_fetched_parks(month_futures, name_futures, on_park) -> None:
+    keys_by_park: Dict[Any, list] = defaultdict(list)
+    for key in month_futures:
+        keys_by_park[key[0]].append(key)
+    remaining: Dict[Any, set] = defaultdict(set)
+    for (park_id, _), future in month_futures.items():
+        remaining[park_id].add(future)
+    for park_id, future in name_futures.items():
+        remaining[park_id].add(future)
+    park_of = {
+        future: park_id for park_id, futures in remaining.items() for future in futures
+    }
+    for future in as_completed(park_of):
+        # Stop at the first failure, like waiting on every future would.
+        future.result()
+        park_id = park_of[future]
+        remaining[park_id].discard(future)
+        if remaining[park_id]:
+            continue
+        name_future = name_futures.get(park_id)
+        on_park(
+            park_id,
+            {key: month_futures[key].result() for key in keys_by_park[park_id]},
+            name_future.result() if name_future is not None else None,
+        )
+
+
+def fetch_from_queue(
+    queue: WorkQueue, keys, name_park_ids=(), filters=None, timeout=DEFAULT_QUEUE_TIMEOUT, on_park=None,
+) -> Tuple[Dict[Tuple[Any, datetime], Dict[str, Any]], Dict[Any, str]]:
+    """
+    Like `fetch_park_months`, but puts the pages on `queue` for workers
+    (see worker.py) to fetch, and waits up to `timeout` seconds for them.
+    Pages already queued by someone else are fetched only once. Workers
+    fetch whole pages, and the campsites `filters` leave out are thrown
+    away here.
+
+    Parks that none of the pages belong to have their names looked up here.
+    `on_park` is called like `fetch_park_months` does, as soon as a park's
+    pages have been seen in the queue.
+    """
+    filters = filters or {}
+    tasks = {
+        (park_id, month_date): FetchTask(park_id, month_date)
+        for park_id, month_date in keys
+    }
+    keys_by_task = {task.key: key for key, task in tasks.items()}
+    remaining: Dict[Any, set] = defaultdict(set)
+    for key in tasks:
+        remaining[key[0]].add(key)
+    availability = {}
+    names = {}
+    wanted_names = set(name_park_ids)
+
+    def take(results) -> None:
+        for task_key, result in results.items():
+            key = keys_by_task[task_key]
+            campsite_type, campsite_ids = filters.get(key, (None, ()))
+            data = select_campsites(result.data, campsite_type, campsite_ids)
+            RecreationClient.remember_site_summaries(data)
+            RecreationClient.record_history(
+                key[0], key[1], data, campsite_type, campsite_ids
+            )
+            availability[key] = data
+            names[key[0]] = result.park_name
+            remaining[key[0]].discard(key)
+            if on_park is not None and not remaining[key[0]]:
+                park_id = key[0]
+                on_park(
+                    park_id,
+                    {k: availability[k] for k in tasks if k[0] == park_id},
+                    names[park_id] if park_id in wanted_names else None,
+                )
+
+    with Metrics.shared().timed("fetch"):
+        submitted_at = queue.submit(tasks.values())
+        LOG.debug("Queued {} page(s) for workers".format(len(tasks)))
+        queue.wait(tasks.values(), submitted_at, timeout, on_results=take)
+        for park_id in name_park_ids:
+            if park_id not in names:
+                names[park_id] = RecreationClient.get_park_name(park_id)
+                if on_park is not None:
+                    on_park(park_id, {}, names[park_id])
+    return availability, {park_id: names[park_id] for park_id in name_park_ids}
 
 
 def get_num_available_sites(
     park_information, start_date: datetime, end_date: datetime, nights: Optional[int] = None, weekends_only: bool = False,
 ) -> f.AVAILABLE_SITES_BY_DATE:
+    """
+    Finds the sites with stays of `nights` consecutive nights between
+    `start_date` and `end_date`. `park_information` is either an
+    `AvailabilityMatrix` or the {"<campsite_id>": [<date>, ...]} format.
+    """
+    if not isinstance(park_information, AvailabilityMatrix):
+        park_information = AvailabilityMatrix.from_park_information(
+            park_information
+        )
     maximum = len(park_information)
 
     num_available = 0
     num_days = (end_date - start_date).days
-    raw_dates: Iterable[datetime] = [end_date - timedelta(days=i) for i in range(1, num_days + 1)]
-    if weekends_only:
-        raw_dates = filter(is_weekend, raw_dates)
-    dates: Iterable[str] = set(
-        formatter.format_date(
-            i, format_string=DateFormat.ISO_DATE_FORMAT_RESPONSE.value
-        )
-        for i in raw_dates
+    nights_mask = park_information.nights_mask(
+        start_date, end_date, weekends_only=weekends_only
     )
 
     if nights not in range(1, num_days + 1):
         nights = num_days
         LOG.debug("Setting number of nights to {}.".format(nights))
 
-    available_dates_by_campsite_id: Dict[int, List[Dict[str, str]]] = defaultdict(list)
-    for site, availabilities in park_information.items():
-        # List of dates that are in the desired range for this site.
-        desired_available = []
+    available_dates_by_campsite_id: Dict[int, StayWindows] = {}
+    for site, stays in park_information.stay_runs(nights_mask, nights):
+        num_available += 1
+        LOG.debug("Available site {}: {}".format(num_available, site))
+        available_dates_by_campsite_id[int(site)] = stays
 
-        for date in availabilities:
-            if date not in dates:
-                continue
-            desired_available.append(date)
+    return num_available, maximum, available_dates_by_campsite_id
 
-        if not desired_available:
-            continue
 
-        appropriate_consecutive_ranges = consecutive_nights(
-            desired_available, nights
+def get_available_stays(
+    park_information, start_date: datetime, end_date: datetime, stays: Iterable[StayQuery],
+) -> f.AVAILABLE_SITES_BY_DATE:
+    """
+    Like `get_num_available_sites`, but finds the sites with a stay matching
+    any of `stays` between `start_date` and `end_date`.
+    """
+    if not isinstance(park_information, AvailabilityMatrix):
+        park_information = AvailabilityMatrix.from_park_information(
+            park_information
         )
-
-        if appropriate_consecutive_ranges:
-            num_available += 1
-            LOG.debug("Available site {}: {}".format(num_available, site))
-
-        for r in appropriate_consecutive_ranges:
-            start, end = r
-            available_dates_by_campsite_id[int(site)].append(
-                {"start": start, "end": end}
-            )
-
-    return num_available, maximum, available_dates_by_campsite_id
+    stays_by_site = merge_stays(
+        find_stays(park_information, stays, start_date, end_date)
+    )
+    return (
+        len(stays_by_site),
+        len(park_information),
+        {int(site): s for site, s in stays_by_site.items()},
+    )
 
 
-def consecutive_nights(available, nights):
+def consecutive_nights(available, nights) -> StayWindows:
     """
-    Returns a list of dates from which you can start that have
-    enough consecutive nights.
+    Returns the stays of `nights` consecutive nights within the sorted
+    `available` dates, as `DateRange`s.
 
-    If there is one or more entries in this list, there is at least one
-    date range for this site that is available.
+    Each run of consecutive dates is only looked at once and kept as a
+    single `StayRun`; the individual stays are produced when iterated over.
+    If there is one or more entries, there is at least one date range for
+    this site that is available.
     """
-    ordinal_dates = [
-        datetime.strptime(
-            dstr, DateFormat.ISO_DATE_FORMAT_RESPONSE.value
-        ).toordinal()
-        for dstr in available
-    ]
+    ordinal_dates = [parse_date_ordinal(dstr) for dstr in available]
     c = count()
 
-    consecutive_ranges = list(
-        list(g) for _, g in groupby(ordinal_dates, lambda x: x - next(c))
-    )
-
-    long_enough_consecutive_ranges = []
-    for r in consecutive_ranges:
+    runs = []
+    for _, group in groupby(ordinal_dates, lambda x: x - next(c)):
+        r = list(group)
         # Skip ranges that are too short.
         if len(r) < nights:
             continue
-        for start_index in range(0, len(r) - nights + 1):
-            start_nice = formatter.format_date(
-                datetime.fromordinal(r[start_index]),
-                format_string=DateFormat.INPUT_DATE_FORMAT.value,
-            )
-            end_nice = formatter.format_date(
-                datetime.fromordinal(r[start_index + nights - 1] + 1),
-                format_string=DateFormat.INPUT_DATE_FORMAT.value,
-            )
-            long_enough_consecutive_ranges.append((start_nice, end_nice))
+        runs.append(StayRun(r[0], len(r) - nights + 1, nights))
 
-    return long_enough_consecutive_ranges
+    return StayWindows(runs)
 
 
 def check_park(
     park_id, start_date, end_date, campsite_type, campsite_ids=(), nights=None, weekends_only=False, excluded_site_ids=[],
 ) -> f.AVAILABLE_PARK_SITES_BY_DATE:
-    park_information = get_park_information(
-        park_id, start_date, end_date, campsite_type, campsite_ids
+    return check_parks(
+        [park_id], start_date, end_date, campsite_type, campsite_ids, nights=nights, weekends_only=weekends_only, max_concurrency=1,
+    )[park_id]
+
+
+def check_parks(
+    park_ids, start_date, end_date, campsite_type, campsite_ids=(), nights=None, weekends_only=False, max_concurrency=DEFAULT_MAX_CONCURRENCY, today=None,
+) -> Dict[int, f.AVAILABLE_PARK_SITES_BY_DATE]:
+    """
+    Checks every park in `park_ids`, fetching all of the months and park names
+    concurrently. The result is ordered like `park_ids`.
+
+    Only the months `plan_months` says could hold a stay are fetched. Pass
+    `today` to skip fetching months that are already over.
+    """
+    months = plan_months(
+        start_date, end_date, nights=nights, weekends_only=weekends_only, today=today
+    )
+    api_data_by_key, park_names = fetch_parks(
+        park_ids, months, max_concurrency=max_concurrency, campsite_type=campsite_type, campsite_ids=campsite_ids,
+    )
+    return evaluate_parks(
+        park_ids, months, api_data_by_key, park_names, start_date, end_date, campsite_type, campsite_ids, nights=nights, weekends_only=weekends_only,
+    )
+
+
+def evaluate_parks(
+    park_ids, months, api_data_by_key, park_names, start_date, end_date, campsite_type, campsite_ids=(), nights=None, weekends_only=False, stays=(),
+) -> Dict[int, f.AVAILABLE_PARK_SITES_BY_DATE]:
+    """
+    Works out the availability of every park in `park_ids` from already
+    fetched data, as returned by `fetch_parks`. If `stays` are given, they
+    are looked for instead of `nights` and `weekends_only`.
+    """
+    metrics = Metrics.shared()
+    info_by_park_id: Dict[int, f.AVAILABLE_PARK_SITES_BY_DATE] = {}
+    for park_id in park_ids:
+        with metrics.timed("filter"):
+            park_information = collapse_park_information(
+                [api_data_by_key[(park_id, month_date)] for month_date in months],
+                campsite_type,
+                campsite_ids,
+            )
+        if LOG.isEnabledFor(logging.DEBUG):
+            LOG.debug(
+                "Information for park {}: {}".format(
+                    park_id,
+                    json.dumps(park_information.to_park_information(), indent=2),
+                )
+            )
+        with metrics.timed("evaluate"):
+            if stays:
+                current, maximum, availabilities_filtered = get_available_stays(
+                    park_information, start_date, end_date, stays
+                )
+            else:
+                current, maximum, availabilities_filtered = get_num_available_sites(
+                    park_information, start_date, end_date, nights=nights, weekends_only=weekends_only,
+                )
+        info_by_park_id[park_id] = ParkResult(
+            current, maximum, availabilities_filtered, park_names[park_id]
+        )
+    return info_by_park_id
+
+
+def watch_months(watch: Watch, today: Optional[datetime] = None) -> List[datetime]:
+    return plan_months(
+        watch.start_date,
+        watch.end_date,
+        nights=watch.nights,
+        weekends_only=watch.weekends_only,
+        stays=watch.stays,
+        today=today,
     )
+
+
+def log_fetch_plan(watch: Watch, today: Optional[datetime] = None) -> None:
+    if not LOG.isEnabledFor(logging.DEBUG):
+        return
+    planned = watch_months(watch, today)
     LOG.debug(
-        "Information for park {}: {}".format(
-            park_id, json.dumps(park_information, indent=2)
+        "Fetch plan for watch {}: {} of {} month(s) for {} park(s): {}".format(
+            watch.name,
+            len(planned),
+            len(get_months(watch.start_date, watch.end_date)),
+            len(watch.parks),
+            ", ".join("{:%Y-%m}".format(m) for m in planned),
         )
     )
-    park_name = RecreationClient.get_park_name(park_id)
-    current, maximum, availabilities_filtered = get_num_available_sites(
-        park_information, start_date, end_date, nights=nights, weekends_only=weekends_only,
+
+
+def page_fingerprint(data: Dict[str, Any], watches: Iterable[Watch]) -> int:
+    """
+    Hashes the part of an availability page that `watches` could report on:
+    the available nights of the campsites they filter to, within their
+    dates. Changes anywhere else on the page don't change the fingerprint.
+    """
+    parts = []
+    for watch in watches:
+        matrix = collapse_park_information(
+            [data], watch.campsite_type, watch.campsite_ids
+        )
+        nights = matrix.nights_mask(
+            watch.start_date, watch.end_date, weekends_only=watch.weekends_only
+        )
+        # Count nights from the watch's start, so that dates outside of it
+        # moving the start of the matrix don't matter either.
+        shift = watch.start_date.toordinal() - matrix.first_day
+        parts.append(
+            tuple(
+                sorted(
+                    (site, (mask & nights) >> shift if shift >= 0 else (mask & nights) << -shift)
+                    for site, mask in matrix.sites.items()
+                )
+            )
+        )
+    return hash(tuple(parts))
+
+
+def ingest_filters(
+    watches: List[Watch], today: Optional[datetime] = None
+) -> Dict[Tuple[Any, datetime], Tuple[Optional[str], Tuple[int, ...]]]:
+    """
+    Works out which campsites can be thrown away while parsing each page.
+    That's only safe when every watch that needs the page filters campsites
+    the same way.
+    """
+    filters_by_key: Dict[Tuple[Any, datetime], set] = defaultdict(set)
+    for watch in watches:
+        campsite_filter = (watch.campsite_type, tuple(watch.campsite_ids))
+        for park_id in watch.parks:
+            for month_date in watch_months(watch, today):
+                filters_by_key[(park_id, month_date)].add(campsite_filter)
+    return {
+        key: next(iter(filters)) if len(filters) == 1 else (None, ())
+        for key, filters in filters_by_key.items()
+    }
+
+
+def evaluate_watch(
+    watch: Watch, api_data_by_key, park_names, today: Optional[datetime] = None
+) -> Dict[int, f.AVAILABLE_PARK_SITES_BY_DATE]:
+    return evaluate_parks(
+        watch.parks,
+        watch_months(watch, today),
+        api_data_by_key,
+        park_names,
+        watch.start_date,
+        watch.end_date,
+        watch.campsite_type,
+        watch.campsite_ids,
+        nights=watch.nights,
+        weekends_only=watch.weekends_only,
+        stays=watch.stays,
     )
-    return current, maximum, availabilities_filtered, park_name
 
 
 def generate_human_output(
@@ -273,10 +674,11 @@ def generate_json_output(info_by_park_id: Dict[int, f.AVAILABLE_PARK_SITES_BY_DA
     availabilities_by_park_id = {}
     has_availabilities = False
     for park_id, info in info_by_park_id.items():
-        current, _, available_dates_by_site_id, _ = info
-        if current:
+        if not isinstance(info, ParkResult):
+            info = ParkResult(*info)
+        if info.available:
             has_availabilities = True
-            availabilities_by_park_id[park_id] = available_dates_by_site_id
+            availabilities_by_park_id[park_id] = info.to_json()
 
     return json.dumps(availabilities_by_park_id), has_availabilities
 
@@ -291,9 +693,165 @@ def parse_settings() -> Dict[str, Any]:
 
 REPORTER = Callable[[Dict[int, f.AVAILABLE_PARK_SITES_BY_DATE], bool], None]
 
+DEFAULT_REPORTER_TIMEOUT = 60.0
+
+
+class Reporter(NamedTuple):
+    """
+    A configured reporter: what it's called and how long `dispatch_reports`
+    waits for it before moving on.
+    """
+
+    name: str
+    report: REPORTER
+    timeout: float = DEFAULT_REPORTER_TIMEOUT
+
+    def __call__(self, info_by_park_id: Dict[int, f.AVAILABLE_PARK_SITES_BY_DATE], has_availabilities: bool) -> None:
+        with Metrics.shared().timed("report"):
+            self.report(info_by_park_id, has_availabilities)
+
+
+_REPORTER_POOL: Optional[ThreadPoolExecutor] = None
+# The last run of every reporter, by name, until it has finished.
+_PENDING_REPORTS: Dict[str, Future] = {}
+_PENDING_REPORTS_LOCK = threading.Lock()
+
+
+def dispatch_reports(
+    reporters: Iterable[REPORTER], info_by_park_id: Dict[int, f.AVAILABLE_PARK_SITES_BY_DATE], has_availabilities: bool,
+) -> None:
+    """
+    Runs every reporter at once and waits for each of them for at most its
+    timeout. A reporter that takes longer keeps running in the background
+    but no longer holds up the caller, and a reporter that fails doesn't
+    stop the others. A reporter still busy with its previous report is
+    skipped, so that it never sends the same alert twice; whatever it
+    didn't get to is still new the next time. See `wait_for_reporters`.
+    """
+    global _REPORTER_POOL
+    if _REPORTER_POOL is None:
+        _REPORTER_POOL = ThreadPoolExecutor(thread_name_prefix="reporter")
+
+    started = time.monotonic()
+    futures = []
+    with _PENDING_REPORTS_LOCK:
+        for reporter in reporters:
+            name = getattr(reporter, "name", repr(reporter))
+            previous = _PENDING_REPORTS.get(name)
+            if previous is not None and not previous.done():
+                LOG.warning(
+                    "Reporter {} is still busy with its last report, skipping it".format(
+                        name
+                    )
+                )
+                continue
+            future = _REPORTER_POOL.submit(reporter, info_by_park_id, has_availabilities)
+            _PENDING_REPORTS[name] = future
+            futures.append((reporter, name, future))
+    for reporter, name, future in futures:
+        timeout = getattr(reporter, "timeout", DEFAULT_REPORTER_TIMEOUT)
+        try:
+            future.result(timeout=max(started + timeout - time.monotonic(), 0))
+        except FutureTimeoutError:
+            LOG.warning(
+                "Reporter {} did not finish within {}s, not waiting for it".format(
+                    name, timeout
+                )
+            )
+        except Exception:
+            LOG.exception("Reporter {} failed".format(name))
+
+
+def wait_for_reporters(timeout: Optional[float] = None) -> int:
+    """
+    Waits for reporters that `dispatch_reports` stopped waiting for, e.g.
+    before their changes to the hash store are flushed or their SMTP
+    connections are closed. Returns the number that were still running.
+    """
+    with _PENDING_REPORTS_LOCK:
+        pending = [
+            future for future in _PENDING_REPORTS.values() if not future.done()
+        ]
+        _PENDING_REPORTS.clear()
+    if pending:
+        LOG.info("Waiting for {} reporter(s) to finish".format(len(pending)))
+        futures_wait(pending, timeout=timeout)
+    return len(pending)
+
+
+class SmtpConnection:
+    """
+    An authenticated SMTP connection that is kept open and reused for every
+    message, and reopened if the server has dropped it in the meantime.
+    """
+
+    _connections: Dict[Tuple[str, int, Optional[str]], "SmtpConnection"] = {}
+    _connections_lock = threading.Lock()
+
+    def __init__(self, settings: Dict[str, Any]) -> None:
+        self.settings = settings
+        self._server: Optional[smtplib.SMTP] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_settings(cls, settings: Dict[str, Any]) -> "SmtpConnection":
+        """
+        Returns the connection for these settings, shared by every reporter
+        that sends through the same server as the same user.
+        """
+        key = (str(settings["host"]), int(settings["port"]), settings.get("user"))
+        with cls._connections_lock:
+            if key not in cls._connections:
+                cls._connections[key] = cls(settings)
+            return cls._connections[key]
+
+    @classmethod
+    def close_all(cls) -> None:
+        with cls._connections_lock:
+            for connection in cls._connections.values():
+                connection.close()
+            cls._connections.clear()
+
+    def _connect(self) -> smtplib.SMTP:
+        settings = self.settings
+        server = smtplib.SMTP(str(settings["host"]), int(settings["port"]))
+        server.ehlo()
+        if bool(settings.get("tls", True)):
+            server.starttls(context=ssl.create_default_context())
+            server.ehlo()
+        if settings.get("user", None):
+            assert settings.get("password", None) is not None
+            server.login(settings.get("user", None), settings.get("password", None))
+        return server
+
+    def sendmail(self, from_addr: str, to_addrs: List[str], body: str) -> None:
+        with self._lock, Metrics.shared().timed("smtp"):
+            reconnected = False
+            while True:
+                if self._server is None:
+                    self._server = self._connect()
+                    reconnected = True
+                try:
+                    self._server.sendmail(from_addr, to_addrs, body)
+                    return
+                except smtplib.SMTPServerDisconnected:
+                    self._server = None
+                    if reconnected:
+                        raise
+
+    def close(self) -> None:
+        with self._lock:
+            if self._server is not None:
+                try:
+                    self._server.quit()
+                except smtplib.SMTPException:
+                    pass
+                self._server = None
+
 
 def mail_reporter(settings: Dict[str, Any], formatter: f.FORMATTER) -> REPORTER:
     SUBJECT = "Campsite Watcher"
+    connection = SmtpConnection.for_settings(settings)
 
     def report(info_by_park_id: Dict[int, f.AVAILABLE_PARK_SITES_BY_DATE], has_availabilities: bool) -> None:
         message_ascii = formatter(info_by_park_id, has_availabilities)
@@ -304,23 +862,27 @@ From: {str(settings["from_name"])} <{str(settings["from_email"])}>
 To: {", ".join(settings["recipients"])}
 
 {message_ascii}"""
-        context = ssl.create_default_context()
-        with smtplib.SMTP(str(settings["host"]), int(settings["port"])) as server:
-            server.ehlo()
-            if bool(settings.get("tls", True)):
-                server.starttls(context=context)
-                server.ehlo()
-            if settings.get("user", None):
-                assert settings.get("password", None) is not None
-                server.login(settings.get("user", None), settings.get("password", None))
-            server.sendmail(str(settings["from_email"]), settings["recipients"], body)
+        connection.sendmail(str(settings["from_email"]), settings["recipients"], body)
 
     return report
 
 
-def get_reporters(settings: Dict[str, Any], start_date: datetime, end_date: datetime, show_campsite_info=False) -> Iterable[REPORTER]:
+def get_reporters(settings: Dict[str, Any], start_date: datetime, end_date: datetime, show_campsite_info=False, watch_name="default", print_reports=True) -> Iterable[REPORTER]:
+    """
+    Builds the reporters configured in `settings`. Each one remembers what it
+    last reported in its own namespace of the hash store, so watches and
+    reporters using the same format don't overwrite each other.
+
+    Without `print_reports`, nothing is printed to stdout even if `settings`
+    says to, e.g. because stdout carries the event stream.
+    """
     reporters: List[REPORTER] = []
 
+    def namespace(reporter_name: str, reporter_settings: Dict[str, Any]) -> str:
+        return "{}/{}/{}".format(
+            watch_name, reporter_name, reporter_settings.get("format", "classic")
+        )
+
     # if "print" in settings and settings["print"].get("enabled", True):
     #     def printer(info_by_park_id: Dict[int, AVAILABLE_PARK_SITES_BY_DATE], _: bool) -> None:
     #         output, has_availabilities = generate_human_output(
@@ -333,41 +895,372 @@ def get_reporters(settings: Dict[str, Any], start_date: datetime, end_date: date
     #             print(output)
     #     reporters.append(printer)
 
-    if "print" in settings and settings["print"].get("enabled", True):
+    if print_reports and "print" in settings and settings["print"].get("enabled", True):
         print_settings = settings["print"]
         def printer(info_by_park_id: Dict[int, f.AVAILABLE_PARK_SITES_BY_DATE], has_availabilities: bool) -> None:
-            formatter = f.make_formatter(print_settings)
+            formatter = f.make_formatter(
+                print_settings, namespace("print", print_settings)
+            )
             formatted = formatter(info_by_park_id, has_availabilities)
             if formatted is not None:
                 print(formatted)
-        reporters.append(printer)
+        reporters.append(
+            Reporter(
+                "{}/print".format(watch_name),
+                printer,
+                float(print_settings.get("timeout", DEFAULT_REPORTER_TIMEOUT)),
+            )
+        )
 
 
     if "smtp" in settings and settings["smtp"].get("enabled", True):
         smtp_settings = settings["smtp"]
-        formatter = f.make_formatter(smtp_settings)
-        reporters.append(mail_reporter(smtp_settings, formatter))
+        formatter = f.make_formatter(smtp_settings, namespace("smtp", smtp_settings))
+        reporters.append(
+            Reporter(
+                "{}/smtp".format(watch_name),
+                mail_reporter(smtp_settings, formatter),
+                float(smtp_settings.get("timeout", DEFAULT_REPORTER_TIMEOUT)),
+            )
+        )
 
     return reporters
 
-def main(parks, json_output=False, reporters: Iterable[REPORTER] = [print]) -> bool:
-    info_by_park_id: Dict[int, f.AVAILABLE_PARK_SITES_BY_DATE] = {}
-    for park_id in parks:
-        info_by_park_id[park_id] = check_park(
-            park_id,
-            args.start_date,
-            args.end_date,
-            args.campsite_type,
-            args.campsite_ids,
-            nights=args.nights,
-            weekends_only=args.weekends_only,
+def sold_out_parks(watches: List[Watch]) -> Dict[str, Dict[Any, int]]:
+    """
+    Uses the search endpoint to find the parks of each watch that have
+    nothing available at all in its dates, so that their months don't need
+    to be fetched. Watches over the same dates share the search.
+
+    Returns the number of campsites of each sold out park, keyed by watch
+    name. The search's own total isn't always what a full check counts, so
+    the count is the one from the park's last full check, and parks that
+    haven't had one yet are checked in full. If the search fails, nothing
+    is considered sold out.
+    """
+    parks_by_dates: Dict[Tuple[datetime, datetime], List[Any]] = defaultdict(list)
+    for watch in watches:
+        parks_by_dates[(watch.start_date, watch.end_date)].extend(watch.parks)
+
+    counts_by_dates = {}
+    with Metrics.shared().timed("prefilter"):
+        for (start_date, end_date), park_ids in parks_by_dates.items():
+            try:
+                counts_by_dates[(start_date, end_date)] = (
+                    RecreationClient.get_availability_counts(
+                        list(dict.fromkeys(park_ids)), start_date, end_date
+                    )
+                )
+            except Exception:
+                LOG.warning(
+                    "Search failed, checking every park in full", exc_info=True
+                )
+                counts_by_dates[(start_date, end_date)] = {}
+
+    sold_out: Dict[str, Dict[Any, int]] = {}
+    for watch in watches:
+        counts = counts_by_dates[(watch.start_date, watch.end_date)]
+        sold_out[watch.name] = {}
+        for park_id in watch.parks:
+            if park_id not in counts or counts[park_id].available:
+                continue
+            sites = RecreationClient.get_site_count(
+                park_id, watch.campsite_type, watch.campsite_ids
+            )
+            if sites is not None:
+                sold_out[watch.name][park_id] = sites
+        LOG.debug(
+            "Skipping {} sold out park(s) of {} for watch {}".format(
+                len(sold_out[watch.name]), len(watch.parks), watch.name
+            )
+        )
+    return sold_out
+
+
+def check_watches(
+    watches: List[Watch], max_concurrency=DEFAULT_MAX_CONCURRENCY, today=None, prefilter=False, queue=None, events: Optional[EventStream] = None,
+) -> Dict[str, Dict[int, f.AVAILABLE_PARK_SITES_BY_DATE]]:
+    """
+    Checks every watch against one shared download: each (park, month) page
+    and each park name is fetched once, however many watches need it.
+    Returns the availability of each watch's parks keyed by watch name.
+
+    With `prefilter`, parks that the search endpoint says are sold out are
+    reported as such without fetching their months. With a `queue`, the
+    pages are fetched by workers. With `events`, each park is evaluated and
+    written to the event stream as soon as its pages are in.
+    """
+    sold_out = sold_out_parks(watches) if prefilter else {}
+    searched = [
+        watch._replace(
+            parks=[p for p in watch.parks if p not in sold_out.get(watch.name, {})]
+        )
+        for watch in watches
+    ]
+    keys = list(
+        dict.fromkeys(
+            (park_id, month_date)
+            for watch in searched
+            for park_id in watch.parks
+            for month_date in watch_months(watch, today)
+        )
+    )
+    park_ids = list(
+        dict.fromkeys(park_id for watch in watches for park_id in watch.parks)
+    )
+    for watch in searched:
+        log_fetch_plan(watch, today)
+    LOG.debug(
+        "Fetching {} page(s) for {} watch(es)".format(len(keys), len(watches))
+    )
+    def park_result(watch, searched_watch, park_id, pages, park_names):
+        skipped = sold_out.get(watch.name, {})
+        if park_id in skipped:
+            return ParkResult(0, skipped[park_id], {}, park_names[park_id])
+        result = evaluate_watch(
+            searched_watch._replace(parks=[park_id]), pages, park_names, today
+        )[park_id]
+        RecreationClient.remember_site_count(
+            park_id, watch.campsite_type, watch.campsite_ids, result.maximum
         )
+        return result
+
+    checked: Dict[Tuple[str, Any], ParkResult] = {}
+
+    def on_park(park_id, pages, name):
+        for watch, searched_watch in zip(watches, searched):
+            if park_id not in watch.parks:
+                continue
+            result = park_result(watch, searched_watch, park_id, pages, {park_id: name})
+            checked[(watch.name, park_id)] = result
+            events.park_checked(watch.name, park_id, result)
+
+    api_data_by_key, park_names = fetch_park_months(
+        keys,
+        park_ids,
+        max_concurrency=max_concurrency,
+        filters=ingest_filters(searched, today),
+        queue=queue,
+        on_park=on_park if events is not None else None,
+    )
+
+    info_by_watch = {}
+    for watch, searched_watch in zip(watches, searched):
+        info_by_watch[watch.name] = {
+            park_id: checked[(watch.name, park_id)]
+            if (watch.name, park_id) in checked
+            else park_result(watch, searched_watch, park_id, api_data_by_key, park_names)
+            for park_id in watch.parks
+        }
+    return info_by_watch
+
+
+def run_watches(
+    watches: List[Watch], reporters_by_watch: Dict[str, Iterable[REPORTER]], max_concurrency=DEFAULT_MAX_CONCURRENCY, prefilter=False, queue=None, events: Optional[EventStream] = None,
+) -> bool:
+    metrics = Metrics.shared()
+    with metrics.timed("cycle"):
+        try:
+            info_by_watch = check_watches(
+                watches,
+                max_concurrency=max_concurrency,
+                today=datetime.now(),
+                prefilter=prefilter,
+                queue=queue,
+                events=events,
+            )
+        except Exception as e:
+            if events is not None:
+                events.error("Failed to check watches: {!r}".format(e))
+            raise
+
+        any_availabilities = False
+        for watch in watches:
+            info_by_park_id = info_by_watch[watch.name]
+            _, has_availabilities = generate_json_output(info_by_park_id)
+            any_availabilities = any_availabilities or has_availabilities
+            dispatch_reports(
+                reporters_by_watch[watch.name], info_by_park_id, has_availabilities
+            )
+        HashStore.shared().flush()
+    metrics.inc("cycles_total")
+    # Slow reporters save what they reported once they're done.
+    if wait_for_reporters():
+        HashStore.shared().flush()
+
+    LOG.debug("Connection stats: {}".format(RecreationClient.connection_stats()))
+    return any_availabilities
+
 
-    _, has_availabilities = generate_json_output(info_by_park_id)
+def run_daemon(
+    watches: List[Watch], reporters_by_watch: Dict[str, Iterable[REPORTER]], max_concurrency=DEFAULT_MAX_CONCURRENCY, metrics_file: Optional[str] = None, queue=None, budget: Optional[float] = None, events: Optional[EventStream] = None,
+) -> None:
+    """
+    Polls `watches` until interrupted, reusing the same sessions, caches and
+    reporters throughout. Each cycle fetches whichever (park, month) pages
+    the scheduler says are due, once no matter how many watches need them,
+    and then reports on every watch that was affected.
+
+    If `metrics_file` is given, the metrics are written to it in the
+    Prometheus text format after every cycle. With a `queue`, the pages are
+    fetched by workers.
+
+    Pages are polled more often the more often they change in a way a
+    watch would report, within a `budget` of requests per second if given
+    (see `PollScheduler`). With `events`, every park of an affected watch is
+    written to the event stream, each as soon as its pages are in.
+    """
+    metrics = Metrics.shared()
+    scheduler = PollScheduler(budget=budget)
+    api_data_by_key: Dict[Tuple[Any, datetime], Dict[str, Any]] = {}
+    park_names: Dict[Any, str] = {}
+    planned_keys: Dict[str, List[Tuple[Any, datetime]]] = {}
+
+    while True:
+        today = datetime.now()
+        keys_by_watch = {}
+        for watch in watches:
+            keys_by_watch[watch.name] = [
+                (park_id, month_date)
+                for park_id in watch.parks
+                for month_date in watch_months(watch, today)
+            ]
+            if keys_by_watch[watch.name] != planned_keys.get(watch.name):
+                log_fetch_plan(watch, today)
+                planned_keys[watch.name] = keys_by_watch[watch.name]
+            scheduler.set_watch(watch.name, keys_by_watch[watch.name], watch.interval)
+
+        due = scheduler.due()
+        if due:
+            cycle_started = time.perf_counter()
+            new_parks = list(
+                dict.fromkeys(p for p, _ in due if p not in park_names)
+            )
+            LOG.debug(
+                "Fetching {} page(s) and {} park name(s)".format(
+                    len(due), len(new_parks)
+                )
+            )
+            # Pages and names as they arrive, so that each park is evaluated
+            # as soon as it's in, and a failed cycle keeps what it got.
+            arrived: Dict[Tuple[Any, datetime], Dict[str, Any]] = {}
+            arrived_names: Dict[Any, str] = {}
+            checked: Dict[Tuple[str, Any], ParkResult] = {}
+
+            def on_park(park_id, pages, name):
+                arrived.update(pages)
+                if name is not None:
+                    arrived_names[park_id] = name
+                if events is None:
+                    return
+                for watch in watches:
+                    if park_id not in watch.parks or not any(
+                        k in pages for k in keys_by_watch[watch.name]
+                    ):
+                        continue
+                    park_keys = [k for k in keys_by_watch[watch.name] if k[0] == park_id]
+                    park_pages = {
+                        k: arrived[k] if k in arrived else api_data_by_key.get(k)
+                        for k in park_keys
+                    }
+                    name = arrived_names.get(park_id, park_names.get(park_id))
+                    if name is None or any(v is None for v in park_pages.values()):
+                        # Wait until every page has been fetched at least once.
+                        continue
+                    result = evaluate_watch(
+                        watch._replace(parks=[park_id]), park_pages, {park_id: name}, today
+                    )[park_id]
+                    checked[(watch.name, park_id)] = result
+                    events.park_checked(watch.name, park_id, result)
+
+            try:
+                fetched, names = fetch_park_months(
+                    due,
+                    new_parks,
+                    max_concurrency=max_concurrency,
+                    filters=ingest_filters(watches, today),
+                    queue=queue,
+                    on_park=on_park,
+                )
+            except Exception as e:
+                LOG.exception("Failed to fetch availability, will try again")
+                if events is not None:
+                    events.error("Failed to fetch availability: {!r}".format(e))
+                fetched, names = arrived, arrived_names
+            watches_by_key: Dict[Tuple[Any, datetime], List[Watch]] = defaultdict(list)
+            for watch in watches:
+                for key in keys_by_watch[watch.name]:
+                    watches_by_key[key].append(watch)
+            changed = [
+                key
+                for key, data in fetched.items()
+                if scheduler.record(key, page_fingerprint(data, watches_by_key[key]))
+            ]
+            if changed:
+                LOG.debug(
+                    "{} of {} page(s) changed".format(len(changed), len(fetched))
+                )
+            metrics.inc("page_changes_total", len(changed))
+            scheduler.mark_fetched(fetched.keys(), today)
+            scheduler.mark_failed(due - fetched.keys(), today)
+            api_data_by_key.update(fetched)
+            park_names.update(names)
+
+            updated = scheduler.watches_for(fetched.keys())
+            for watch in watches:
+                if watch.name not in updated:
+                    continue
+                # Wait until every page has been fetched at least once.
+                ready = all(
+                    k in api_data_by_key for k in keys_by_watch[watch.name]
+                ) and all(p in park_names for p in watch.parks)
+                if not ready:
+                    continue
+                unchecked = watch._replace(
+                    parks=[p for p in watch.parks if (watch.name, p) not in checked]
+                )
+                evaluated = evaluate_watch(unchecked, api_data_by_key, park_names, today)
+                info_by_park_id = {}
+                for park_id in watch.parks:
+                    if (watch.name, park_id) in checked:
+                        info_by_park_id[park_id] = checked[(watch.name, park_id)]
+                        continue
+                    info_by_park_id[park_id] = evaluated[park_id]
+                    if events is not None:
+                        events.park_checked(watch.name, park_id, evaluated[park_id])
+                _, has_availabilities = generate_json_output(info_by_park_id)
+                dispatch_reports(
+                    reporters_by_watch[watch.name],
+                    info_by_park_id,
+                    has_availabilities,
+                )
+            HashStore.shared().flush()
+
+            # Forget pages no watch needs anymore, e.g. months that are over.
+            wanted = set(k for keys in keys_by_watch.values() for k in keys)
+            for key in list(api_data_by_key):
+                if key not in wanted:
+                    del api_data_by_key[key]
 
-    for reporter in reporters:
-        reporter(info_by_park_id, has_availabilities)
-    return has_availabilities
+            LOG.debug(
+                "Connection stats: {}".format(RecreationClient.connection_stats())
+            )
+            metrics.observe(
+                "stage_seconds", time.perf_counter() - cycle_started, stage="cycle"
+            )
+            metrics.inc("cycles_total")
+            if metrics_file:
+                try:
+                    metrics.write_prometheus(metrics_file)
+                except OSError:
+                    LOG.exception("Failed to write metrics to {}".format(metrics_file))
+
+        time.sleep(
+            min(
+                scheduler.seconds_until_due(),
+                min(watch.interval for watch in watches),
+            )
+        )
 
 
 if __name__ == "__main__":
@@ -377,7 +1270,112 @@ if __name__ == "__main__":
     if args.debug:
         LOG.setLevel(logging.DEBUG)
 
-    settings = parse_settings()
-    reporters = get_reporters(settings, args.start_date, args.end_date, args.show_campsite_info)
+    RecreationClient.configure_pool(args.max_concurrency)
+    RecreationClient.configure_rate_limit(args.rate_limit)
+    if args.record:
+        recorder = RecordingAdapter(
+            args.record,
+            pool_connections=1,
+            pool_maxsize=args.max_concurrency,
+            pool_block=True,
+        )
+        RecreationClient.use_adapter(recorder)
+        # Finish the archive however the run ends, including when a check
+        # fails or we're terminated.
+        atexit.register(recorder.close_archive)
+        signal.signal(signal.SIGTERM, lambda signum, _: sys.exit(128 + signum))
+    elif args.replay:
+        RecreationClient.use_adapter(
+            ReplayAdapter(args.replay, timing=args.replay_timing)
+        )
+        if not args.replay_timing:
+            # Nothing to protect, so go as fast as possible.
+            RecreationClient.configure_rate_limit(1e9)
+    if args.history:
+        RecreationClient.use_history_store(HistoryStore(args.history))
+    # Recording or replaying only works if every request is actually sent.
+    recording_or_replaying = args.record or args.replay
+    if not args.no_metadata_cache and not recording_or_replaying:
+        RecreationClient.use_metadata_cache(MetadataCache())
+    if not args.no_availability_cache and not recording_or_replaying:
+        availability_cache = AvailabilityCache(freshness=args.availability_freshness)
+        availability_cache.prune(datetime.now())
+        RecreationClient.use_availability_cache(availability_cache)
 
-    main(args.parks, json_output=args.json_output, reporters=reporters)
+    settings = parse_settings()
+    if args.watches is not None:
+        try:
+            configured = watches_from_settings(settings, args.watches)
+        except WatchConfigError as e:
+            parser.error(str(e))
+        if not configured:
+            parser.error("No watches are configured in {}.".format(SETTINGS_FILE))
+        watches = [watch for watch, _ in configured]
+        reporters_by_watch = {
+            watch.name: get_reporters(
+                reporter_settings,
+                watch.start_date,
+                watch.end_date,
+                args.show_campsite_info,
+                watch_name=watch.name,
+                # The events are written to stdout, so nothing else can be.
+                print_reports=not args.events,
+            )
+            for watch, reporter_settings in configured
+        }
+    else:
+        watches = [Watch.from_args(args)]
+        reporters_by_watch = {
+            watches[0].name: get_reporters(
+                settings,
+                args.start_date,
+                args.end_date,
+                args.show_campsite_info,
+                watch_name=watches[0].name,
+                print_reports=not args.events,
+            )
+        }
+
+    events = EventStream() if args.events else None
+
+    queue = None
+    if args.coordinator:
+        queue = WorkQueue(args.coordinator)
+        if args.serve_queue:
+            host, port = args.serve_queue
+            queue.serve(port, host=host)
+
+    if args.daemon:
+        if args.metrics_port:
+            Metrics.shared().serve_prometheus(args.metrics_port)
+        try:
+            run_daemon(
+                watches,
+                reporters_by_watch,
+                max_concurrency=args.max_concurrency,
+                metrics_file=args.metrics_file,
+                queue=queue,
+                # Workers keep to their own rate limits.
+                budget=None if queue else args.rate_limit * POLL_BUDGET_SHARE,
+                events=events,
+            )
+        except KeyboardInterrupt:
+            pass
+    else:
+        run_watches(
+            watches,
+            reporters_by_watch,
+            max_concurrency=args.max_concurrency,
+            prefilter=args.prefilter_search,
+            queue=queue,
+            events=events,
+        )
+        if args.metrics_file:
+            Metrics.shared().write_prometheus(args.metrics_file)
+    if wait_for_reporters():
+        HashStore.shared().flush()
+    SmtpConnection.close_all()
+    if queue is not None:
+        queue.close()
+    if args.profile:
+        print(Metrics.shared().summary(), file=sys.stderr)
@@ -0,0 +1,179 @@
+from datetime import date
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Sequence, Set, Tuple
+
+from availability import ParkResult, StayRun, StayWindows, date_range_ordinals
+
+if TYPE_CHECKING:
+    from formatters import AVAILABLE_PARK_SITES_BY_DATE
+
+
+# (park_id, site_id, first_start, starts, nights): every stay of `nights`
+# nights at a site that starts on one of `starts` consecutive days from day
+# ordinal `first_start`, i.e. a maximal run like `StayRun`. A site that is
+# open for months is a handful of these rather than one per stay. They're
+# only turned into dates when saved, see `to_json`.
+OPENING = Tuple[str, int, int, int, int]
+
+# Consecutive start days [first, end) of the stays of one length at a site.
+_SPAN = Tuple[int, int]
+
+
+def snapshot(info_by_park_id: "Dict[int, AVAILABLE_PARK_SITES_BY_DATE]") -> Set[OPENING]:
+    """
+    Flattens the availability of a run into the set of openings it found.
+    """
+    openings: List[OPENING] = []
+    for park_id, (_, _, available_dates_by_site_id, _) in info_by_park_id.items():
+        for site_id, dates in available_dates_by_site_id.items():
+            key = (str(park_id), int(site_id))
+            if isinstance(dates, StayWindows):
+                openings.extend(
+                    key + (run.first_start, run.starts, run.nights) for run in dates.runs
+                )
+                continue
+            for entry in dates:
+                first, last = date_range_ordinals(entry)
+                openings.append(key + (first, 1, last - first))
+    return _openings(_spans(openings))
+
+
+def diff(old: Set[OPENING], new: Set[OPENING]) -> Tuple[Set[OPENING], Set[OPENING]]:
+    """
+    Returns the openings that were added and removed since `old`. A run that
+    grew or shrank only adds or removes the stays it gained or lost.
+    """
+    old_spans, new_spans = _spans(old), _spans(new)
+    return (
+        _openings(_difference(new_spans, old_spans)),
+        _openings(_difference(old_spans, new_spans)),
+    )
+
+
+def only_openings(
+    info_by_park_id: "Dict[int, AVAILABLE_PARK_SITES_BY_DATE]", openings: Set[OPENING]
+) -> "Dict[int, AVAILABLE_PARK_SITES_BY_DATE]":
+    """
+    Narrows the availability of a run down to `openings`, e.g. to report
+    only what is new. Parks without any of the openings are left out.
+    """
+    runs_by_site: Dict[Tuple[str, int], List[StayRun]] = {}
+    for park_id, site_id, first, starts, nights in sorted(openings):
+        runs_by_site.setdefault((park_id, site_id), []).append(
+            StayRun(first, starts, nights)
+        )
+
+    delta: "Dict[int, AVAILABLE_PARK_SITES_BY_DATE]" = {}
+    for park_id, (_, maximum, available_dates_by_site_id, park_name) in info_by_park_id.items():
+        sites: Dict[int, Sequence] = {}
+        for site_id, dates in available_dates_by_site_id.items():
+            runs = runs_by_site.get((str(park_id), int(site_id)))
+            if not runs:
+                continue
+            if isinstance(dates, StayWindows):
+                sites[site_id] = StayWindows(runs)
+                continue
+            new_dates = [entry for entry in dates if _in_runs(entry, runs)]
+            if new_dates:
+                sites[site_id] = new_dates
+        if sites:
+            delta[park_id] = ParkResult(len(sites), maximum, sites, park_name)
+    return delta
+
+
+def stays(openings: Iterable[OPENING]) -> Iterator[Tuple[str, int, int, int]]:
+    """
+    Expands `openings` into (park_id, site_id, first, last) of each stay, in
+    order, e.g. to list only the ones that changed.
+    """
+    expanded = (
+        (park_id, site_id, start, start + nights)
+        for park_id, site_id, first, starts, nights in openings
+        for start in range(first, first + starts)
+    )
+    return iter(sorted(expanded))
+
+
+def to_json(openings: Iterable[OPENING]) -> List[List]:
+    return [
+        [p, s, date.fromordinal(first).isoformat(), starts, nights]
+        for p, s, first, starts, nights in sorted(openings)
+    ]
+
+
+def from_json(openings: Iterable[List]) -> Set[OPENING]:
+    loaded: List[OPENING] = []
+    for saved in openings:
+        if len(saved) == 4:
+            # One stay per opening, as saved before openings were runs.
+            p, s, start, end = saved
+            first = date.fromisoformat(start).toordinal()
+            loaded.append((str(p), int(s), first, 1, date.fromisoformat(end).toordinal() - first))
+        else:
+            p, s, start, starts, nights = saved
+            loaded.append((str(p), int(s), date.fromisoformat(start).toordinal(), starts, nights))
+    return _openings(_spans(loaded))
+
+
+def _in_runs(entry, runs: List[StayRun]) -> bool:
+    first, last = date_range_ordinals(entry)
+    return any(
+        run.first_start <= first < run.first_start + run.starts
+        and last - first == run.nights
+        for run in runs
+    )
+
+
+def _spans(openings: Iterable[OPENING]) -> Dict[Tuple[str, int, int], List[_SPAN]]:
+    """
+    Groups `openings` by (park_id, site_id, nights), merging runs that
+    overlap or touch into maximal spans of start days.
+    """
+    grouped: Dict[Tuple[str, int, int], List[_SPAN]] = {}
+    for park_id, site_id, first, starts, nights in openings:
+        grouped.setdefault((park_id, site_id, nights), []).append((first, first + starts))
+    spans: Dict[Tuple[str, int, int], List[_SPAN]] = {}
+    for key, unmerged in grouped.items():
+        merged: List[List[int]] = []
+        for first, end in sorted(unmerged):
+            if merged and first <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([first, end])
+        spans[key] = [(first, end) for first, end in merged]
+    return spans
+
+
+def _difference(
+    spans: Dict[Tuple[str, int, int], List[_SPAN]],
+    other: Dict[Tuple[str, int, int], List[_SPAN]],
+) -> Dict[Tuple[str, int, int], List[_SPAN]]:
+    """
+    Returns the start days of `spans` that aren't in `other`.
+    """
+    result: Dict[Tuple[str, int, int], List[_SPAN]] = {}
+    for key, mine in spans.items():
+        theirs = other.get(key, [])
+        left: List[_SPAN] = []
+        i = 0
+        for first, end in mine:
+            while i < len(theirs) and theirs[i][1] <= first:
+                i += 1
+            j = i
+            while j < len(theirs) and theirs[j][0] < end:
+                if theirs[j][0] > first:
+                    left.append((first, theirs[j][0]))
+                first = max(first, theirs[j][1])
+                j += 1
+            if first < end:
+                left.append((first, end))
+        if left:
+            result[key] = left
+    return result
+
+
+def _openings(spans: Dict[Tuple[str, int, int], List[_SPAN]]) -> Set[OPENING]:
+    return {
+        (park_id, site_id, first, end - first, nights)
+        for (park_id, site_id, nights), site_spans in spans.items()
+        for first, end in site_spans
+    }
@@ -0,0 +1,75 @@
+import json
+
+from typing import Any, Collection, Dict, List, Optional, Tuple
+
+
+# The only fields of a campsite that the rest of the program reads.
+CAMPSITE_FIELDS = ("campsite_id", "campsite_type", "site")
+AVAILABLE = "Available"
+DATE_SUFFIX = "T00:00:00Z"
+
+
+def parse_availability(
+    body: bytes,
+    campsite_type: Optional[str] = None,
+    campsite_ids: Collection[int] = (),
+) -> Dict[str, Any]:
+    """
+    Parses an availability response, throwing away everything the rest of
+    the program doesn't need while it is being decoded, rather than after
+    the whole month has been turned into dicts:
+
+    - only "Available" dates are kept, and per-date quantities are dropped,
+    - only the campsite fields in CAMPSITE_FIELDS are kept,
+    - campsites that don't match `campsite_type`/`campsite_ids` keep no
+      dates at all (they are still listed, since they count towards the
+      number of sites in the park).
+
+    The result has the same shape as the API response.
+    """
+
+    def hook(pairs: List[Tuple[str, Any]]) -> Dict[str, Any]:
+        if pairs and pairs[0][0].endswith(DATE_SUFFIX):
+            # availabilities (or quantities) for one campsite
+            return {date: value for date, value in pairs if value == AVAILABLE}
+
+        obj = dict(pairs)
+        if "availabilities" not in obj:
+            return obj
+        return _slim_campsite(obj, campsite_type, campsite_ids)
+
+    return json.loads(body, object_pairs_hook=hook)
+
+
+def select_campsites(
+    data: Dict[str, Any],
+    campsite_type: Optional[str] = None,
+    campsite_ids: Collection[int] = (),
+) -> Dict[str, Any]:
+    """
+    Applies the `campsite_type`/`campsite_ids` filters of `parse_availability`
+    to an already parsed response.
+    """
+    if not campsite_type and len(campsite_ids) == 0:
+        return data
+    selected = dict(data)
+    selected["campsites"] = {
+        campsite_id: _slim_campsite(campsite, campsite_type, campsite_ids)
+        for campsite_id, campsite in data["campsites"].items()
+    }
+    return selected
+
+
+def _slim_campsite(
+    campsite: Dict[str, Any],
+    campsite_type: Optional[str],
+    campsite_ids: Collection[int],
+) -> Dict[str, Any]:
+    slim = {k: campsite[k] for k in CAMPSITE_FIELDS if k in campsite}
+    matches = (
+        not campsite_type or campsite_type == campsite.get("campsite_type")
+    ) and (
+        len(campsite_ids) == 0 or int(campsite["campsite_id"]) in campsite_ids
+    )
+    slim["availabilities"] = campsite["availabilities"] if matches else {}
+    return slim
@@ -0,0 +1,111 @@
+import random
+import threading
+import time
+
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket shared by every request the client sends.
+
+    Tokens refill at `rate` per second up to `capacity`. The rate adapts to
+    what the server will tolerate: it is halved (down to `min_rate`) every
+    time we are told to slow down and creeps back up towards `max_rate`
+    with every successful request.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        min_rate: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.max_rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 20
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def acquire(self) -> None:
+        """
+        Blocks until a token is available and takes it.
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+    def defer(self, seconds: float) -> None:
+        """
+        Holds back every caller for at least `seconds`, e.g. when the server
+        asks us to retry later.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 1 - seconds * self.rate)
+
+    def penalize(self) -> None:
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def reward(self) -> None:
+        with self._lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 50)
+
+
+def backoff_delay(
+    attempt: int,
+    base: float,
+    cap: float,
+    rand: Callable[[], float] = random.random,
+) -> float:
+    """
+    Exponential backoff with full jitter: a random delay between zero and
+    `base * 2 ** attempt`, capped at `cap`.
+    """
+    return rand() * min(cap, base * 2 ** attempt)
+
+
+def parse_retry_after(
+    value: Optional[str], now: Optional[datetime] = None, cap: float = float("inf")
+) -> Optional[float]:
+    """
+    Parses a `Retry-After` header, which is either a number of seconds or an
+    HTTP date. Returns the number of seconds to wait, at most `cap`, or None
+    if the header is missing or can't be parsed.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return min(float(value), cap)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return min(max((retry_at - now).total_seconds(), 0.0), cap)
@@ -1,15 +1,33 @@
+import json
 import logging
+import threading
 import time
 
 import requests
 import user_agent
 
-from typing import Any, Dict
+from concurrent.futures import ThreadPoolExecutor
+
+from availability_cache import AvailabilityCache
+from clients.availability_parser import parse_availability, select_campsites
+from clients.rate_limiter import TokenBucket, backoff_delay, parse_retry_after
+from history_store import HistoryStore
+from metadata_cache import MetadataCache
+from metrics import Metrics
+from requests.adapters import BaseAdapter, HTTPAdapter
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
 from utils import formatter
 
 LOG = logging.getLogger(__name__)
 
 
+class SearchCount(NamedTuple):
+    # Campsites with availability in the searched dates.
+    available: int
+    # Campsites the search counted in any state.
+    total: int
+
+
 class RecreationClient:
 
     BASE_URL = "https://www.recreation.gov"
@@ -18,46 +36,488 @@ class RecreationClient:
     )
     MAIN_PAGE_ENDPOINT = BASE_URL + "/api/camps/campgrounds/{park_id}"
     SITE_PAGE_ENDPOINT = BASE_URL + "/api/camps/campsites/{site_id}"
+    SEARCH_ENDPOINT = BASE_URL + "/api/search"
+
+    # Number of campgrounds to ask the search endpoint about at once.
+    SEARCH_CHUNK_SIZE = 20
 
     _SITE_ATTRIBUTES: Dict[int, Any ]= {}
+    # The name and type of every campsite seen in an availability response,
+    # which is all that's needed to report on it.
+    _SITE_SUMMARIES: Dict[int, Dict[str, str]] = {}
+    # The number of campsites full checks counted in each park, keyed by
+    # `_site_count_key`.
+    _SITE_COUNTS: Dict[str, int] = {}
+    _METADATA_CACHE: Optional[MetadataCache] = None
+    _AVAILABILITY_CACHE: Optional[AvailabilityCache] = None
+    _HISTORY_STORE: Optional[HistoryStore] = None
 
     headers = {"User-Agent": user_agent.generate_user_agent() }
 
+    # Size of the keep-alive connection pool. This should be at least the
+    # number of threads making requests at once, otherwise connections get
+    # thrown away and re-opened.
+    POOL_SIZE = 8
+
+    _session: Optional[requests.Session] = None
+    _session_lock = threading.Lock()
+    # Sends the requests instead of a plain HTTPAdapter, e.g. to record or
+    # replay them.
+    _adapter: Optional[BaseAdapter] = None
+
+    # Requests per second across every endpoint and thread. The limiter slows
+    # down on its own when recreation.gov answers with 429s.
+    RATE_LIMIT = 10.0
+    MAX_ATTEMPTS = 8
+    BACKOFF_BASE = 0.5
+    BACKOFF_MAX = 30.0
+    TIMEOUT = 30
+    RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+    rate_limiter = TokenBucket(RATE_LIMIT)
+
+    @classmethod
+    def use_base_url(cls, base_url: str) -> None:
+        """
+        Points the client at another server, e.g. a local stand-in for
+        recreation.gov.
+        """
+        cls.BASE_URL = base_url
+        cls.AVAILABILITY_ENDPOINT = (
+            base_url + "/api/camps/availability/campground/{park_id}/month"
+        )
+        cls.MAIN_PAGE_ENDPOINT = base_url + "/api/camps/campgrounds/{park_id}"
+        cls.SITE_PAGE_ENDPOINT = base_url + "/api/camps/campsites/{site_id}"
+        cls.SEARCH_ENDPOINT = base_url + "/api/search"
+
+    @classmethod
+    def configure_rate_limit(cls, rate: float) -> None:
+        cls.RATE_LIMIT = rate
+        cls.rate_limiter = TokenBucket(rate)
+
+    @classmethod
+    def configure_pool(cls, pool_size: int) -> None:
+        """
+        Sets the connection pool size. Takes effect for the next session, so
+        call this before making any requests.
+        """
+        with cls._session_lock:
+            cls.POOL_SIZE = pool_size
+            if cls._session is not None:
+                cls._session.close()
+                cls._session = None
+
+    @classmethod
+    def use_adapter(cls, adapter: Optional[BaseAdapter]) -> None:
+        """
+        Sends every request through `adapter` from now on, or through a
+        regular pooled HTTPAdapter again if it is None.
+        """
+        with cls._session_lock:
+            cls._adapter = adapter
+            if cls._session is not None:
+                cls._session.close()
+                cls._session = None
+
+    @classmethod
+    def _get_session(cls) -> requests.Session:
+        """
+        Returns the shared session, creating it on first use. Every thread
+        shares the same session so that connections to recreation.gov are
+        kept alive and reused across requests.
+        """
+        with cls._session_lock:
+            if cls._session is None:
+                session = requests.Session()
+                session.headers.update(cls.headers)
+                adapter = cls._adapter or HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=cls.POOL_SIZE,
+                    pool_block=True,
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                cls._session = session
+            return cls._session
+
+    @classmethod
+    def connection_stats(cls) -> Dict[str, int]:
+        """
+        Returns how many requests were sent, how many connections had to be
+        opened for them and how many requests reused a kept-alive connection.
+        """
+        requests_sent = 0
+        new_connections = 0
+        session = cls._session
+        if session is not None:
+            adapters = set(session.adapters.values())
+            for adapter in adapters:
+                pools = getattr(adapter, "poolmanager", None)
+                if pools is None:
+                    continue
+                for key in pools.pools.keys():
+                    pool = pools.pools.get(key)
+                    if pool is None:
+                        continue
+                    requests_sent += pool.num_requests
+                    new_connections += pool.num_connections
+        return {
+            "requests": requests_sent,
+            "new_connections": new_connections,
+            "reused_connections": max(requests_sent - new_connections, 0),
+        }
+
+    @classmethod
+    def get_availability(cls, park_id, month_date, campsite_type=None, campsite_ids=()):
+        """
+        Returns the availability of every campsite in a park for a month.
+        Only "Available" dates are returned, and campsites that don't match
+        `campsite_type`/`campsite_ids` come back without any dates.
+        """
+        data = cls._get_availability(park_id, month_date, campsite_type, campsite_ids)
+        cls.remember_site_summaries(data)
+        cls.record_history(park_id, month_date, data, campsite_type, campsite_ids)
+        return data
+
     @classmethod
-    def get_availability(cls, park_id, month_date):
+    def record_history(
+        cls, park_id, month_date, data: Dict[str, Any], campsite_type=None, campsite_ids=(),
+    ) -> None:
+        """
+        Adds an availability response, e.g. one fetched by another process,
+        to the history store if there is one.
+        """
+        store = cls._HISTORY_STORE
+        if store is None:
+            return
+        recorded = store.record(park_id, month_date, data, campsite_type, campsite_ids)
+        Metrics.shared().inc("history_transitions_total", recorded)
+
+    @classmethod
+    def remember_site_summaries(cls, data: Dict[str, Any]) -> None:
+        """
+        Keeps the name and type of every campsite in an availability
+        response, e.g. one fetched by another process.
+        """
+        for campsite in data.get("campsites", {}).values():
+            if "site" in campsite and "campsite_type" in campsite:
+                cls._SITE_SUMMARIES[int(campsite["campsite_id"])] = {
+                    "campsite_name": campsite["site"],
+                    "campsite_type": campsite["campsite_type"],
+                }
+
+    @classmethod
+    def _get_availability(cls, park_id, month_date, campsite_type, campsite_ids):
         params = {"start_date": formatter.format_date(month_date)}
+        url = cls.AVAILABILITY_ENDPOINT.format(park_id=park_id)
+        metrics = Metrics.shared()
+        cache = cls._AVAILABILITY_CACHE
+        if cache is None:
+            LOG.debug(
+                "Querying for {} with these params: {}".format(park_id, params)
+            )
+            resp = cls._send_raw_request(url, params, endpoint="availability")
+            with metrics.timed("decode"):
+                return parse_availability(resp.content, campsite_type, campsite_ids)
+
+        cached = cache.get(park_id, month_date)
+        if cached is not None and cache.is_fresh(cached):
+            LOG.debug(
+                "Using cached availability for {} in {:%Y-%m}".format(
+                    park_id, month_date
+                )
+            )
+            metrics.inc("cache_requests_total", cache="availability", result="fresh")
+            with metrics.timed("decode"):
+                return parse_availability(cached.content, campsite_type, campsite_ids)
+
         LOG.debug(
             "Querying for {} with these params: {}".format(park_id, params)
         )
-        url = cls.AVAILABILITY_ENDPOINT.format(park_id=park_id)
-        resp = cls._send_request(url, params)
-        return resp
+        resp = cls._send_raw_request(
+            url,
+            params,
+            cached.validators() if cached is not None else None,
+            endpoint="availability",
+        )
+        if resp.status_code == 304 and cached is not None:
+            LOG.debug(
+                "Availability for {} in {:%Y-%m} has not changed".format(
+                    park_id, month_date
+                )
+            )
+            metrics.inc(
+                "cache_requests_total", cache="availability", result="not_modified"
+            )
+            cache.touch(park_id, month_date)
+            with metrics.timed("decode"):
+                return parse_availability(cached.content, campsite_type, campsite_ids)
+
+        metrics.inc("cache_requests_total", cache="availability", result="miss")
+        # Only cache what we'd keep anyway, so cached months are small and
+        # quick to parse again.
+        with metrics.timed("decode"):
+            data = parse_availability(resp.content)
+        cache.put(
+            park_id,
+            month_date,
+            json.dumps(data).encode(),
+            etag=resp.headers.get("ETag"),
+            last_modified=resp.headers.get("Last-Modified"),
+        )
+        return select_campsites(data, campsite_type, campsite_ids)
+
+    @classmethod
+    def get_availability_counts(
+        cls, park_ids: Iterable[Any], start_date, end_date
+    ) -> Dict[Any, SearchCount]:
+        """
+        Asks the search endpoint how many campsites each park has available
+        between `start_date` and `end_date`, a chunk of parks per request.
+        This says nothing about stays of several nights, but a park that
+        has nothing available at all can't have any of those either.
+
+        Parks the search doesn't return counts for are left out.
+        """
+        park_ids = list(park_ids)
+        by_str = {str(park_id): park_id for park_id in park_ids}
+        counts: Dict[Any, SearchCount] = {}
+        for i in range(0, len(park_ids), cls.SEARCH_CHUNK_SIZE):
+            chunk = park_ids[i : i + cls.SEARCH_CHUNK_SIZE]
+            params = {
+                "fq": "asset_id:({})".format(" OR ".join(str(p) for p in chunk)),
+                "start": 0,
+                "size": len(chunk),
+                "start_date": formatter.format_date(start_date),
+                "end_date": formatter.format_date(end_date),
+                "include_unavailable": "true",
+            }
+            LOG.debug("Searching with these params: {}".format(params))
+            resp = cls._send_request(cls.SEARCH_ENDPOINT, params, endpoint="search")
+            for result in resp.get("results") or []:
+                park_id = by_str.get(
+                    str(result.get("entity_id", result.get("id")))
+                )
+                by_status = result.get("availability_counts")
+                if park_id is None or by_status is None:
+                    continue
+                counts[park_id] = SearchCount(
+                    int(by_status.get("Available", 0)),
+                    sum(int(n) for n in by_status.values()),
+                )
+        return counts
+
+    @classmethod
+    def use_metadata_cache(cls, cache: Optional[MetadataCache]) -> None:
+        """
+        Persists campground names and campsite attributes in `cache` so that
+        they don't have to be fetched again on every run.
+        """
+        cls._METADATA_CACHE = cache
+
+    @classmethod
+    def use_availability_cache(cls, cache: Optional[AvailabilityCache]) -> None:
+        """
+        Keeps availability responses in `cache` and revalidates them with
+        conditional requests instead of downloading them again.
+        """
+        cls._AVAILABILITY_CACHE = cache
+
+    @classmethod
+    def use_history_store(cls, store: Optional[HistoryStore]) -> None:
+        """
+        Records what changed in every availability response in `store`.
+        """
+        cls._HISTORY_STORE = store
 
     @classmethod
     def get_park_name(cls, park_id):
+        cache = cls._METADATA_CACHE
+        if cache is not None:
+            name = cache.get(MetadataCache.CAMPGROUND, park_id)
+            Metrics.shared().inc(
+                "cache_requests_total",
+                cache="metadata",
+                result="hit" if name is not None else "miss",
+            )
+            if name is not None:
+                return name
         resp = cls._send_request(
-            cls.MAIN_PAGE_ENDPOINT.format(park_id=park_id), {}
+            cls.MAIN_PAGE_ENDPOINT.format(park_id=park_id), {}, endpoint="campground"
         )
-        return resp["campground"]["facility_name"]
+        name = resp["campground"]["facility_name"]
+        if cache is not None:
+            cache.put(MetadataCache.CAMPGROUND, park_id, name)
+        return name
+
+    @staticmethod
+    def _site_count_key(park_id, campsite_type=None, campsite_ids=()) -> str:
+        return json.dumps(
+            [str(park_id), campsite_type, sorted(int(i) for i in campsite_ids)]
+        )
+
+    @classmethod
+    def remember_site_count(
+        cls, park_id, campsite_type, campsite_ids, count: int
+    ) -> None:
+        """
+        Keeps the number of campsites a full check of a park counted with
+        these filters, for `get_site_count`.
+        """
+        key = cls._site_count_key(park_id, campsite_type, campsite_ids)
+        if cls._SITE_COUNTS.get(key) == count:
+            return
+        cls._SITE_COUNTS[key] = count
+        cache = cls._METADATA_CACHE
+        if cache is not None:
+            cache.put(MetadataCache.SITE_COUNT, key, count)
+
+    @classmethod
+    def get_site_count(cls, park_id, campsite_type=None, campsite_ids=()) -> Optional[int]:
+        """
+        Returns the number of campsites the last full check of a park
+        counted with these filters, or None if it hasn't been checked.
+        """
+        key = cls._site_count_key(park_id, campsite_type, campsite_ids)
+        count = cls._SITE_COUNTS.get(key)
+        cache = cls._METADATA_CACHE
+        if count is None and cache is not None:
+            count = cache.get(MetadataCache.SITE_COUNT, key)
+            if count is not None:
+                cls._SITE_COUNTS[key] = count
+        return count
 
     @classmethod
     def get_site_attributes(cls, site_id: int) -> Dict[str, Any]:
         if site_id not in cls._SITE_ATTRIBUTES:
-            resp = cls._send_request(
-                cls.SITE_PAGE_ENDPOINT.format(site_id=site_id), {}
+            cache = cls._METADATA_CACHE
+            attributes = (
+                cache.get(MetadataCache.CAMPSITE, site_id)
+                if cache is not None
+                else None
             )
-            cls._SITE_ATTRIBUTES[site_id] = resp["campsite"]
+            if cache is not None:
+                Metrics.shared().inc(
+                    "cache_requests_total",
+                    cache="metadata",
+                    result="hit" if attributes is not None else "miss",
+                )
+            if attributes is None:
+                resp = cls._send_request(
+                    cls.SITE_PAGE_ENDPOINT.format(site_id=site_id),
+                    {},
+                    endpoint="campsite",
+                )
+                attributes = resp["campsite"]
+                if cache is not None:
+                    cache.put(MetadataCache.CAMPSITE, site_id, attributes)
+            cls._SITE_ATTRIBUTES[site_id] = attributes
         return cls._SITE_ATTRIBUTES[site_id]
 
     @classmethod
-    def _send_request(cls, url, params):
-        max_attempts = 15
-        resp = requests.get(url, params=params, headers=cls.headers)
-        for i in range(0, max_attempts):
-            if resp.status_code == 200:
-                return resp.json()
-            elif resp.status_code == 429:
-                time.sleep(0.5)
+    def get_site_summary(cls, site_id: int) -> Dict[str, Any]:
+        """
+        Returns at least the `campsite_name` and `campsite_type` of a site,
+        from the availability responses if it was in one, and from its own
+        page otherwise.
+        """
+        summary = cls._SITE_SUMMARIES.get(int(site_id))
+        if summary is not None:
+            return summary
+        return cls.get_site_attributes(site_id)
+
+    @classmethod
+    def prefetch_site_attributes(
+        cls, site_ids: Iterable[int], max_concurrency: Optional[int] = None
+    ) -> None:
+        """
+        Makes sure `get_site_summary` won't have to wait for any of
+        `site_ids`, by fetching the pages of the sites that weren't in an
+        availability response, all at once.
+        """
+        missing: List[int] = [
+            site_id
+            for site_id in dict.fromkeys(int(s) for s in site_ids)
+            if site_id not in cls._SITE_SUMMARIES
+            and site_id not in cls._SITE_ATTRIBUTES
+        ]
+        if not missing:
+            return
+        LOG.debug("Fetching attributes of {} campsite(s)".format(len(missing)))
+        with ThreadPoolExecutor(
+            max_workers=min(max_concurrency or cls.POOL_SIZE, len(missing))
+        ) as executor:
+            for _ in executor.map(cls.get_site_attributes, missing):
+                pass
+
+    @classmethod
+    def _send_request(cls, url, params, endpoint: str = "other"):
+        return cls._send_raw_request(url, params, endpoint=endpoint).json()
+
+    @classmethod
+    def _send_raw_request(
+        cls, url, params, headers: Optional[Dict[str, str]] = None, endpoint: str = "other",
+    ) -> requests.Response:
+        """
+        Sends a GET request, retrying as needed, and returns the response.
+        A 304 is only expected (and returned) when `headers` makes the
+        request conditional. `endpoint` names the endpoint in the metrics.
+        """
+        metrics = Metrics.shared()
+        for attempt in range(0, cls.MAX_ATTEMPTS):
+            if attempt > 0:
+                metrics.inc("retries_total", endpoint=endpoint)
+            cls.rate_limiter.acquire()
+            started = time.perf_counter()
+            try:
+                resp = cls._get_session().get(
+                    url, params=params, headers=headers, timeout=cls.TIMEOUT
+                )
+                # Read the whole body, so that its download is timed too.
+                content_length = len(resp.content)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.observe(
+                    "request_seconds", time.perf_counter() - started, endpoint=endpoint
+                )
+                metrics.inc("requests_total", endpoint=endpoint, status="error")
+                delay = backoff_delay(attempt, cls.BACKOFF_BASE, cls.BACKOFF_MAX)
+                LOG.debug(
+                    "Request to {} failed ({}), retrying in {:.2f}s".format(
+                        url, e, delay
+                    )
+                )
+                time.sleep(delay)
+                continue
+
+            metrics.observe(
+                "request_seconds", time.perf_counter() - started, endpoint=endpoint
+            )
+            metrics.inc("requests_total", endpoint=endpoint, status=resp.status_code)
+            metrics.inc("downloaded_bytes_total", content_length, endpoint=endpoint)
+            if resp.status_code == 200 or (headers and resp.status_code == 304):
+                cls.rate_limiter.reward()
+                return resp
+            elif resp.status_code in cls.RETRY_STATUS_CODES:
+                delay = parse_retry_after(
+                    resp.headers.get("Retry-After"), cap=cls.BACKOFF_MAX
+                )
+                if delay is None:
+                    delay = backoff_delay(
+                        attempt, cls.BACKOFF_BASE, cls.BACKOFF_MAX
+                    )
+                LOG.debug(
+                    "{} code received from {}, retrying in {:.2f}s".format(
+                        resp.status_code, url, delay
+                    )
+                )
+                if resp.status_code == 429:
+                    metrics.inc("rate_limited_total", endpoint=endpoint)
+                    # Being rate limited applies to every thread, so hold
+                    # them all back rather than just this one.
+                    cls.rate_limiter.penalize()
+                    cls.rate_limiter.defer(delay)
+                else:
+                    time.sleep(delay)
                 continue
             else:
                 raise RuntimeError(
@@ -69,6 +529,6 @@ class RecreationClient:
         raise RuntimeError(
                 "failedRequest",
                 "ERROR, Failed after {attempts} attempts to retreive {url}".format(
-                    attempts=max_attempts, url=url
+                    attempts=cls.MAX_ATTEMPTS, url=url
                 ),
         )
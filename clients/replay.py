@@ -0,0 +1,172 @@
+import base64
+import gzip
+import json
+import threading
+import time
+
+import requests
+
+from collections import defaultdict
+from datetime import timedelta
+from pathlib import Path
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from typing import Any, Callable, Dict, List, Tuple
+
+
+# Request headers that change the response, and so are recorded too.
+MATCHED_HEADERS = ("If-None-Match", "If-Modified-Since")
+
+
+def _request_key(request: requests.PreparedRequest) -> Tuple[str, str, Tuple[str, ...]]:
+    return (
+        request.method or "GET",
+        request.url or "",
+        tuple(request.headers.get(h, "") for h in MATCHED_HEADERS),
+    )
+
+
+class ReplayMissError(requests.RequestException):
+    """
+    Raised when replaying a request that isn't in the archive. Unlike a
+    connection error, this isn't retried.
+    """
+
+
+class RecordingAdapter(HTTPAdapter):
+    """
+    Sends requests like a regular `HTTPAdapter`, and also appends every
+    exchange to a gzipped archive with one JSON object per line, which
+    `ReplayAdapter` can serve back later.
+    """
+
+    def __init__(self, path: Path, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._archive = gzip.open(str(self.path), "wt", encoding="utf-8")
+
+    def send(self, request, *args, **kwargs):
+        started = time.perf_counter()
+        response = super().send(request, *args, **kwargs)
+        # Read the body now, so the recorded time includes downloading it.
+        content = response.content
+        elapsed = time.perf_counter() - started
+
+        method, url, matched = _request_key(request)
+        entry: Dict[str, Any] = {
+            "method": method,
+            "url": url,
+            "request_headers": dict(zip(MATCHED_HEADERS, matched)),
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": dict(response.headers),
+            "elapsed": round(elapsed, 6),
+        }
+        try:
+            entry["body"] = content.decode("utf-8")
+        except UnicodeDecodeError:
+            entry["body_base64"] = base64.b64encode(content).decode("ascii")
+
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            if not self._archive.closed:
+                self._archive.write(line)
+                # Flush every exchange, so that `ReplayAdapter` can still
+                # load them from an archive that was never finished.
+                self._archive.flush()
+        return response
+
+    def close_archive(self) -> None:
+        """
+        Finishes the archive. This is separate from `close`, which the
+        session calls whenever its connections are reset.
+        """
+        with self._lock:
+            self._archive.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Answers requests from an archive written by `RecordingAdapter`, without
+    touching the network. A request that was recorded several times gets
+    the recorded responses in order, and then the last one again.
+
+    With `timing`, each response takes as long as it originally did.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        timing: bool = False,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        super().__init__()
+        self.path = Path(path)
+        self.timing = timing
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str, Tuple[str, ...]], List[Dict[str, Any]]] = defaultdict(list)
+        self._served: Dict[Tuple[str, str, Tuple[str, ...]], int] = defaultdict(int)
+        for line in self._read_lines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            matched = tuple(
+                entry.get("request_headers", {}).get(h, "") for h in MATCHED_HEADERS
+            )
+            self._entries[(entry["method"], entry["url"], matched)].append(entry)
+
+    def _read_lines(self) -> List[str]:
+        """
+        Returns the complete lines of the archive. If the recording was
+        killed before finishing it, the archive has no gzip trailer and may
+        end in the middle of a line; everything before that is kept.
+        """
+        lines: List[str] = []
+        with gzip.open(str(self.path), "rt", encoding="utf-8") as archive:
+            try:
+                for line in archive:
+                    lines.append(line)
+            except EOFError:
+                pass
+        if lines and not lines[-1].endswith("\n"):
+            lines.pop()
+        return lines
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        key = _request_key(request)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise ReplayMissError(
+                    "No recorded response for {} {}".format(key[0], key[1]),
+                    request=request,
+                )
+            entry = entries[min(self._served[key], len(entries) - 1)]
+            self._served[key] += 1
+
+        if self.timing:
+            self._sleep(entry["elapsed"])
+
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.reason = entry.get("reason")
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        # The body is stored decoded, so it must not be decoded again.
+        response.headers.pop("Content-Encoding", None)
+        if "body_base64" in entry:
+            response._content = base64.b64decode(entry["body_base64"])
+        else:
+            response._content = entry["body"].encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        response.elapsed = timedelta(seconds=entry["elapsed"])
+        return response
+
+    def close(self) -> None:
+        pass
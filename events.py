@@ -0,0 +1,95 @@
+import json
+import sys
+import threading
+
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Dict, Optional, Set, TextIO
+
+import change_detection
+
+from availability import ParkResult
+from hash_store import HashStore
+
+
+SITE_OPENED = "site_opened"
+SITE_CLOSED = "site_closed"
+PARK_CHECKED = "park_checked"
+ERROR = "error"
+
+
+class EventStream:
+    """
+    Writes what a check finds as newline-delimited JSON events, one park at
+    a time, as soon as the park has been evaluated:
+
+    - `site_opened`/`site_closed` for every stay that became bookable or
+      stopped being bookable since the last check of the watch,
+    - `park_checked` with the number of available sites, after a park's
+      openings and closings,
+    - `error` when a check fails.
+
+    Every event has the `event` name, the `time` it was written and, except
+    for some errors, the `watch` it's about. What was bookable is remembered
+    in the hash store under "<watch>/events", so one-off runs compare
+    against the previous run.
+    """
+
+    def __init__(
+        self,
+        out: TextIO = sys.stdout,
+        clock: Callable[[], datetime] = lambda: datetime.now(timezone.utc),
+    ) -> None:
+        self._out = out
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._openings: Dict[str, Set[change_detection.OPENING]] = {}
+
+    def emit(self, event: str, **fields: Any) -> None:
+        record = {"event": event, "time": self._clock().isoformat()}
+        record.update(fields)
+        line = json.dumps(record, separators=(",", ":"))
+        with self._lock:
+            self._out.write(line + "\n")
+            # Downstream tools read the stream as it's written.
+            self._out.flush()
+
+    @staticmethod
+    def namespace(watch_name: str) -> str:
+        return "{}/events".format(watch_name)
+
+    def park_checked(self, watch_name: str, park_id: Any, result: ParkResult) -> None:
+        """
+        Emits the events for one evaluated park of a watch.
+        """
+        hash_store = HashStore.shared()
+        key = self.namespace(watch_name)
+        with self._lock:
+            openings = self._openings.get(watch_name)
+            if openings is None:
+                openings = self._openings[watch_name] = change_detection.from_json(
+                    hash_store.get_snapshot(key) or []
+                )
+            others = {o for o in openings if o[0] != str(park_id)}
+            new = change_detection.snapshot({park_id: result})
+            added, removed = change_detection.diff(openings - others, new)
+            openings = self._openings[watch_name] = others | new
+            snapshot = change_detection.to_json(openings)
+        if added or removed:
+            hash_store.save_snapshot(key, snapshot)
+
+        park = {"watch": watch_name, "park_id": park_id, "park_name": result.name}
+        for event, changed in ((SITE_CLOSED, removed), (SITE_OPENED, added)):
+            for _, site_id, first, last in change_detection.stays(changed):
+                self.emit(
+                    event,
+                    **park,
+                    site_id=site_id,
+                    start=date.fromordinal(first).isoformat(),
+                    end=date.fromordinal(last).isoformat(),
+                )
+        self.emit(PARK_CHECKED, **park, available=result.available, total=result.maximum)
+
+    def error(self, message: str, watch_name: Optional[str] = None, **fields: Any) -> None:
+        if watch_name is not None:
+            fields["watch"] = watch_name
+        self.emit(ERROR, message=message, **fields)
@@ -1,13 +1,18 @@
 from datetime import datetime
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
+import change_detection
+
+from availability import DateRange, ParkResult, StayWindows, date_range_ordinals
 from clients.recreation_client import RecreationClient
 from enums.emoji import Emoji
 from hash_store import HashStore
+from metrics import Metrics
 
 
-AVAILABLE_PARK_SITES_BY_DATE = Tuple[int, int, Dict[int, List[Dict[str, str]]], str]
-AVAILABLE_SITES_BY_DATE = Tuple[int, int, Dict[int, List[Dict[str, str]]]]
+# Stays are `DateRange`s, or {"start": <date>, "end": <date>} dicts.
+AVAILABLE_PARK_SITES_BY_DATE = ParkResult
+AVAILABLE_SITES_BY_DATE = Tuple[int, int, Dict[int, Sequence[DateRange]]]
 FORMATTER = Callable[[Dict[int, AVAILABLE_PARK_SITES_BY_DATE], bool], Optional[str]]
 
 
@@ -59,68 +64,105 @@ def classic(settings: Dict[str, Any]) -> FORMATTER:
     return formatter
 
 
-def compress_dates(dates: List[Dict[str, str]]) -> List[Dict[str, str]]:
+def compress_dates(dates: Sequence[DateRange]) -> List[Dict[str, str]]:
+    """
+    Merges overlapping and back-to-back stays into the ranges of nights
+    they cover, as {"start": <date>, "end": <date>, "length": <nights>}.
+    """
+    if isinstance(dates, StayWindows):
+        # Already stored as maximal runs.
+        return dates.compressed()
     if len(dates) == 0:
-        return dates
+        return []
 
     compressed: List[Dict[str, str]] = []
-    start: Optional[datetime] = None
-    end: Optional[datetime] = None
-    length: Optional[int] = None
+    start: Optional[int] = None
+    end: Optional[int] = None
+
+    def finish() -> None:
+        assert start is not None and end is not None
+        compressed.append({
+            "start": datetime.fromordinal(start).strftime("%Y-%m-%d"),
+            "end": datetime.fromordinal(end).strftime("%Y-%m-%d"),
+            "length": str(end - start)
+        })
+
     for entry in dates:
-        this_start = datetime.fromisoformat(entry["start"])
-        this_end = datetime.fromisoformat(entry["end"])
-        if not start:
+        this_start, this_end = date_range_ordinals(entry)
+        if start is None or end is None:
             # New range
             start = this_start
             end = this_end
-            length = 1
-            continue
-        if end == this_start:
+        elif this_start <= end:
             # Extend the range
-            assert length is not None
-            end = this_end
-            length += 1
+            end = max(end, this_end)
         else:
-            # Finish the range
-            assert end is not None
-            compressed.append({
-                "start": start.strftime("%Y-%m-%d"),
-                "end": end.strftime("%Y-%m-%d"),
-                "length": str(length)
-            })
-            start = None
-            end = None
-            length = None
-    if start:
-        assert end is not None
-        compressed.append({
-            "start": start.strftime("%Y-%m-%d"),
-            "end": end.strftime("%Y-%m-%d"),
-            "length": str(length)
-        })
+            # Finish the range and start a new one
+            finish()
+            start = this_start
+            end = this_end
+    finish()
 
     return compressed
 
 
-def make_formatter(settings: Dict[str, Any]) -> FORMATTER:
+def make_formatter(settings: Dict[str, Any], namespace: Optional[str] = None) -> FORMATTER:
+    """
+    Builds the formatter named by the `format` setting. Unless `check_hash`
+    is false, it only returns a message when something changed since it
+    last did, as remembered in the hash store under `namespace` (by default
+    the format name):
+
+    - with `change_detection: diff` (the default) it compares the openings
+      it found against the ones it saw last time, and only reports the
+      openings that are new.
+    - with `change_detection: hash` it reports everything whenever the
+      rendered message differs from the last one.
+    """
     name = settings.get("format", "classic")
+    key = namespace or name
     check_hash = settings.get("check_hash", True)
+    change_detection_mode = settings.get("change_detection", "diff")
     factory = globals().get(name, classic)
-    formatter = factory(settings)
+    render = factory(settings)
+
+    def formatter(info_by_park_id: Dict[int, AVAILABLE_PARK_SITES_BY_DATE], has_availabilities: bool) -> Optional[str]:
+        with Metrics.shared().timed("format"):
+            return render(info_by_park_id, has_availabilities)
+
+    def diff_checker(info_by_park_id: Dict[int, AVAILABLE_PARK_SITES_BY_DATE], has_availabilities: bool) -> Optional[str]:
+        hash_store = HashStore.shared()
+        old = change_detection.from_json(hash_store.get_snapshot(key) or [])
+        new = change_detection.snapshot(info_by_park_id)
+        added, removed = change_detection.diff(old, new)
+        if added or removed:
+            hash_store.save_snapshot(key, change_detection.to_json(new))
+        if not added:
+            return None
+        return formatter(change_detection.only_openings(info_by_park_id, added), True)
 
     def hash_checker(info_by_park_id: Dict[int, AVAILABLE_PARK_SITES_BY_DATE], has_availabilities: bool) -> Optional[str]:
-        hash_store = HashStore()
+        hash_store = HashStore.shared()
         formatted = formatter(info_by_park_id, has_availabilities)
-        is_new = hash_store.check_and_save(name, formatted or "")
+        is_new = hash_store.check_and_save(key, formatted or "")
         if is_new and formatted:
             return formatted
         return None
 
-    return hash_checker if check_hash else formatter
+    if not check_hash:
+        return formatter
+    return diff_checker if change_detection_mode == "diff" else hash_checker
 
 def verbose_ascii(settings: Dict[str, Any]) -> FORMATTER:
     def formatter(info_by_park_id: Dict[int, AVAILABLE_PARK_SITES_BY_DATE], has_availabilities: bool) -> Optional[str]:
+        # Look up every site we're about to list at once, rather than one
+        # at a time while rendering.
+        RecreationClient.prefetch_site_attributes(
+            site_id
+            for num_available, _, available_dates_by_site_id, _ in info_by_park_id.values()
+            if num_available >= 1
+            for site_id in available_dates_by_site_id
+        )
         messages: List[str] = []
         first = True
         for park_id, (num_available, num_sites, available_dates_by_site_id, park_name) in info_by_park_id.items():
@@ -133,7 +175,7 @@ def verbose_ascii(settings: Dict[str, Any]) -> FORMATTER:
             messages.append(f"-=-=- {park_name}: {num_available} of {num_sites} sites available -=-=-")
 
             for site_id, dates in available_dates_by_site_id.items():
-                site_atts = RecreationClient.get_site_attributes(site_id)
+                site_atts = RecreationClient.get_site_summary(site_id)
                 messages.append(f"Site {site_atts['campsite_name']} ({site_atts['campsite_type']}):")
                 squashed_dates = compress_dates(dates)
                 for d in squashed_dates:
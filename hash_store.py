@@ -1,30 +1,128 @@
 import hashlib
 import json
 import os
+import tempfile
+import threading
 
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict
+from typing import Any, Dict, Iterator, Optional, Set
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore
+
 
 class HashStore:
+    """
+    Remembers what each reporter last reported, keyed by a namespace such
+    as "<watch>/<reporter>/<format>".
+
+    The file is read once, when the store is created, and changes are kept
+    in memory until `flush` writes them all at once. Flushing holds an
+    exclusive lock on the store, merges our changes into whatever other
+    processes have written since, and atomically replaces the file, so
+    parallel runs never corrupt it or lose each other's entries.
+    """
+
     STORE_FILE = Path(os.environ["HOME"]) / ".campsite-checker-hashes.json"
 
-    __hashes: Dict[str, Dict[str, str]]
+    _shared: Optional["HashStore"] = None
+    _shared_lock = threading.Lock()
+
+    __hashes: Dict[str, Dict[str, Any]]
+    __dirty: Set[str]
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = Path(path) if path is not None else self.STORE_FILE
+        self._lock = threading.Lock()
+        self.__dirty = set()
+        self.__hashes = self._read()
 
-    def __init__(self) -> None:
-        self.__hashes = {}
-        if self.STORE_FILE.exists():
-            self.__hashes = json.loads(self.STORE_FILE.read_text())
+    @classmethod
+    def shared(cls) -> "HashStore":
+        """
+        Returns the store for this process, loading it on first use.
+        """
+        with cls._shared_lock:
+            if cls._shared is None or cls._shared.path != cls.STORE_FILE:
+                cls._shared = cls()
+            return cls._shared
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        if not self.path.exists():
+            return {}
+        text = self.path.read_text()
+        return json.loads(text) if text.strip() else {}
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        lock_path = self.path.with_name(self.path.name + ".lock")
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def flush(self) -> None:
+        """
+        Writes every namespace changed since the last flush, if any.
+        """
+        with self._lock:
+            if not self.__dirty:
+                return
+            with self._file_lock():
+                merged = self._read()
+                for name in self.__dirty:
+                    merged[name] = self.__hashes[name]
+                fd, tmp_path = tempfile.mkstemp(
+                    dir=str(self.path.parent), prefix=self.path.name + "."
+                )
+                try:
+                    with os.fdopen(fd, "w") as tmp_file:
+                        json.dump(merged, tmp_file)
+                        tmp_file.flush()
+                        os.fsync(tmp_file.fileno())
+                    os.replace(tmp_path, str(self.path))
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+            self.__hashes = merged
+            self.__dirty.clear()
 
     def save(self) -> None:
-        self.STORE_FILE.write_text(json.dumps(self.__hashes))
+        self.flush()
 
     def check_and_save(self, name: str, content: str) -> bool:
-        old_hash = ""
-        if name in self.__hashes:
-            old_hash = self.__hashes[name].get("sha256", "")
-        else:
-            self.__hashes[name] = {}
+        """
+        Records the hash of `content` under `name`. Returns whether it
+        differs from the last one. Call `flush` to persist it.
+        """
         new_hash = hashlib.sha256(content.encode()).hexdigest()
-        self.__hashes[name]['sha256'] = new_hash
-        self.save()
-        return old_hash != new_hash
\ No newline at end of file
+        with self._lock:
+            old_hash = self.__hashes.get(name, {}).get("sha256", "")
+            if old_hash != new_hash:
+                self.__hashes.setdefault(name, {})["sha256"] = new_hash
+                self.__dirty.add(name)
+        return old_hash != new_hash
+
+    def get_snapshot(self, name: str) -> Optional[Any]:
+        with self._lock:
+            return self.__hashes.get(name, {}).get("snapshot")
+
+    def save_snapshot(self, name: str, snapshot: Any) -> bool:
+        """
+        Records the availability last reported under `name`. Returns whether
+        it changed. Call `flush` to persist it.
+        """
+        with self._lock:
+            if self.__hashes.get(name, {}).get("snapshot") == snapshot:
+                return False
+            self.__hashes.setdefault(name, {})["snapshot"] = snapshot
+            self.__dirty.add(name)
+        return True
@@ -0,0 +1,342 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Callable, Collection, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from availability import parse_date_ordinal
+
+
+UNAVAILABLE = 0
+AVAILABLE = 1
+STATE_NAMES = {UNAVAILABLE: "unavailable", AVAILABLE: "available"}
+
+# How `release_histogram` can group openings, as SQLite expressions of the
+# transitions' columns.
+HISTOGRAM_BUCKETS = {
+    # Local hour of the day the opening was seen.
+    "hour": "CAST(strftime('%H', observed_at, 'unixepoch', 'localtime') AS INTEGER)",
+    # Local day of the week the opening was seen, 0 being Monday.
+    "weekday": "(CAST(strftime('%w', observed_at, 'unixepoch', 'localtime') AS INTEGER) + 6) % 7",
+    # Days between seeing the opening and the night itself.
+    "lead_days": (
+        "night - CAST(julianday(observed_at, 'unixepoch', 'localtime') - 1721424.5 AS INTEGER)"
+    ),
+    # Month of the night that opened up.
+    "month": "strftime('%Y-%m', night + 1721424.5)",
+}
+
+
+class Transition(NamedTuple):
+    park_id: str
+    site_id: int
+    night: date
+    old_state: int
+    new_state: int
+    observed_at: float
+
+
+class HistoryStore:
+    """
+    An append-only log of availability changes: every time a campsite's
+    night is seen to go from unavailable to available or back, along with
+    when it was seen.
+
+    To tell what changed, the store keeps the last seen availability of
+    every (park, site, month) as a bitmask of its nights. The first time a
+    site and month is seen there's nothing to compare with, so that only
+    sets the baseline. All the changes in a page are written in a single
+    transaction.
+    """
+
+    STORE_FILE = Path(os.environ["HOME"]) / ".campsite-checker-history.sqlite3"
+
+    def __init__(
+        self, path: Optional[Path] = None, clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = Path(path) if path is not None else self.STORE_FILE
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            str(self.path), timeout=30, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS transitions (
+                park_id TEXT NOT NULL,
+                site_id INTEGER NOT NULL,
+                night INTEGER NOT NULL,
+                old_state INTEGER NOT NULL,
+                new_state INTEGER NOT NULL,
+                observed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS transitions_by_park
+                ON transitions (park_id, observed_at);
+            CREATE INDEX IF NOT EXISTS transitions_by_site
+                ON transitions (park_id, site_id, night);
+            CREATE TABLE IF NOT EXISTS current_state (
+                park_id TEXT NOT NULL,
+                month INTEGER NOT NULL,
+                site_id INTEGER NOT NULL,
+                available INTEGER NOT NULL,
+                observed_at REAL NOT NULL,
+                PRIMARY KEY (park_id, month, site_id)
+            ) WITHOUT ROWID;
+            """
+        )
+        self._db.commit()
+
+    def record(
+        self,
+        park_id: Any,
+        month_date: datetime,
+        data: Dict[str, Any],
+        campsite_type: Optional[str] = None,
+        campsite_ids: Collection[int] = (),
+        observed_at: Optional[float] = None,
+    ) -> int:
+        """
+        Records a month of availability as returned by `get_availability`.
+        Campsites that don't match `campsite_type`/`campsite_ids` are
+        skipped, since their dates were thrown away while parsing. Returns
+        the number of transitions recorded.
+        """
+        observed_at = self._clock() if observed_at is None else observed_at
+        park_id = str(park_id)
+        first_night = month_date.replace(day=1).toordinal()
+
+        masks: Dict[int, int] = {}
+        for campsite in data.get("campsites", {}).values():
+            if campsite_type and campsite_type != campsite.get("campsite_type"):
+                continue
+            site_id = int(campsite["campsite_id"])
+            if campsite_ids and site_id not in campsite_ids:
+                continue
+            mask = 0
+            for date_string, value in campsite.get("availabilities", {}).items():
+                if value == "Available":
+                    mask |= 1 << (parse_date_ordinal(date_string) - first_night)
+            masks[site_id] = mask
+
+        with self._lock:
+            previous = dict(
+                self._db.execute(
+                    "SELECT site_id, available FROM current_state "
+                    "WHERE park_id = ? AND month = ?",
+                    (park_id, first_night),
+                ).fetchall()
+            )
+            rows: List[Tuple[str, int, int, int, int, float]] = []
+            for site_id, mask in masks.items():
+                old_mask = previous.get(site_id)
+                if old_mask is None:
+                    continue
+                changed = old_mask ^ mask
+                while changed:
+                    low = changed & -changed
+                    bit = low.bit_length() - 1
+                    new_state = AVAILABLE if mask & low else UNAVAILABLE
+                    rows.append(
+                        (
+                            park_id,
+                            site_id,
+                            first_night + bit,
+                            AVAILABLE - new_state,
+                            new_state,
+                            observed_at,
+                        )
+                    )
+                    changed ^= low
+            updates = [
+                (park_id, first_night, site_id, mask, observed_at)
+                for site_id, mask in masks.items()
+                if previous.get(site_id) != mask
+            ]
+            with self._db:
+                self._db.executemany(
+                    "INSERT INTO transitions VALUES (?, ?, ?, ?, ?, ?)", rows
+                )
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO current_state VALUES (?, ?, ?, ?, ?)",
+                    updates,
+                )
+        return len(rows)
+
+    def transitions(
+        self,
+        park_id: Any = None,
+        site_id: Optional[int] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        new_state: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Transition]:
+        """
+        Yields the recorded transitions matching every given filter, oldest
+        first.
+        """
+        where, params = self._where(park_id, site_id, since, until, new_state)
+        query = (
+            "SELECT park_id, site_id, night, old_state, new_state, observed_at "
+            "FROM transitions{} ORDER BY observed_at, rowid".format(where)
+        )
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        for park, site, night, old_state, state, observed_at in rows:
+            yield Transition(
+                park, site, date.fromordinal(night), old_state, state, observed_at
+            )
+
+    def release_histogram(
+        self,
+        by: str = "hour",
+        park_id: Any = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ) -> Dict[Any, int]:
+        """
+        Counts the openings (nights that became available) by one of the
+        buckets in HISTOGRAM_BUCKETS, e.g. the hour of the day they were
+        seen at.
+        """
+        bucket = HISTOGRAM_BUCKETS[by]
+        where, params = self._where(park_id, None, since, until, AVAILABLE)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT {0} AS bucket, COUNT(*) FROM transitions{1} "
+                "GROUP BY bucket ORDER BY bucket".format(bucket, where),
+                params,
+            ).fetchall()
+        return dict(rows)
+
+    @staticmethod
+    def _where(
+        park_id: Any,
+        site_id: Optional[int],
+        since: Optional[float],
+        until: Optional[float],
+        new_state: Optional[int],
+    ) -> Tuple[str, List[Any]]:
+        clauses = []
+        params: List[Any] = []
+        if park_id is not None:
+            clauses.append("park_id = ?")
+            params.append(str(park_id))
+        if site_id is not None:
+            clauses.append("site_id = ?")
+            params.append(int(site_id))
+        if since is not None:
+            clauses.append("observed_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("observed_at < ?")
+            params.append(until)
+        if new_state is not None:
+            clauses.append("new_state = ?")
+            params.append(new_state)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def prune(self, before: float) -> int:
+        """
+        Removes the transitions seen before `before`. Returns the number of
+        transitions removed.
+        """
+        with self._lock, self._db:
+            return self._db.execute(
+                "DELETE FROM transitions WHERE observed_at < ?", (before,)
+            ).rowcount
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def format_histogram(histogram: Dict[Any, int], width: int = 50) -> str:
+    if not histogram:
+        return "No openings recorded."
+    label_width = max(len(str(bucket)) for bucket in histogram)
+    count_width = max(len(str(count)) for count in histogram.values())
+    most = max(histogram.values())
+    return "\n".join(
+        "{}  {}  {}".format(
+            str(bucket).rjust(label_width),
+            str(count).rjust(count_width),
+            "#" * max(round(width * count / most), 1),
+        )
+        for bucket, count in histogram.items()
+    )
+
+
+def _timestamp(date_string: str) -> float:
+    return datetime.strptime(date_string, "%Y-%m-%d").timestamp()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Query the availability history recorded with --history."
+    )
+    parser.add_argument(
+        "--file",
+        type=Path,
+        default=HistoryStore.STORE_FILE,
+        help="History file (default is {}).".format(HistoryStore.STORE_FILE),
+    )
+    parser.add_argument("--park", help="Only this park ID.")
+    parser.add_argument(
+        "--since", type=_timestamp, help="Only changes seen on or after this date [YYYY-MM-DD]."
+    )
+    parser.add_argument(
+        "--until", type=_timestamp, help="Only changes seen before this date [YYYY-MM-DD]."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    histogram_parser = commands.add_parser(
+        "histogram", help="Count the openings seen, grouped by --by."
+    )
+    histogram_parser.add_argument(
+        "--by", choices=sorted(HISTOGRAM_BUCKETS), default="hour",
+        help="What to group openings by (default is the hour they were seen at).",
+    )
+    transitions_parser = commands.add_parser(
+        "transitions", help="List the changes seen, oldest first."
+    )
+    transitions_parser.add_argument("--site", type=int, help="Only this campsite ID.")
+    transitions_parser.add_argument(
+        "--limit", type=int, default=100, help="At most this many (default is 100)."
+    )
+    args = parser.parse_args()
+
+    store = HistoryStore(args.file)
+    if args.command == "histogram":
+        print(
+            format_histogram(
+                store.release_histogram(
+                    args.by, park_id=args.park, since=args.since, until=args.until
+                )
+            )
+        )
+    else:
+        for t in store.transitions(
+            park_id=args.park,
+            site_id=args.site,
+            since=args.since,
+            until=args.until,
+            limit=args.limit,
+        ):
+            print(
+                "{:%Y-%m-%d %H:%M:%S}  park {} site {} night {}: {} -> {}".format(
+                    datetime.fromtimestamp(t.observed_at),
+                    t.park_id,
+                    t.site_id,
+                    t.night.isoformat(),
+                    STATE_NAMES[t.old_state],
+                    STATE_NAMES[t.new_state],
+                )
+            )
+    store.close()
@@ -0,0 +1,138 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class MetadataCache:
+    """
+    A persistent cache for data about campgrounds and campsites that almost
+    never changes, like campground names and campsite attributes.
+
+    Every fresh entry is loaded in one query when the cache is opened, so
+    lookups during a run never touch the disk.
+    """
+
+    STORE_FILE = Path(os.environ["HOME"]) / ".campsite-checker-metadata.sqlite3"
+    DEFAULT_TTL = 30 * 24 * 60 * 60
+
+    CAMPGROUND = "campground"
+    CAMPSITE = "campsite"
+    # Number of campsites a full check counted in a park.
+    SITE_COUNT = "site_count"
+
+    __entries: Dict[Tuple[str, str], Any]
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        ttl: float = DEFAULT_TTL,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = Path(path) if path is not None else self.STORE_FILE
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            str(self.path), timeout=30, check_same_thread=False
+        )
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS metadata (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (kind, key)
+            )"""
+        )
+        self._db.commit()
+        self.__entries = {}
+        self.prewarm()
+
+    def prewarm(self) -> None:
+        """
+        Loads every entry that hasn't expired into memory.
+        """
+        rows = self._db.execute(
+            "SELECT kind, key, value FROM metadata WHERE fetched_at >= ?",
+            (self._clock() - self.ttl,),
+        ).fetchall()
+        with self._lock:
+            self.__entries = {
+                (kind, key): json.loads(value) for kind, key, value in rows
+            }
+
+    def get(self, kind: str, key: Any) -> Optional[Any]:
+        with self._lock:
+            return self.__entries.get((kind, str(key)))
+
+    def put(self, kind: str, key: Any, value: Any) -> None:
+        with self._lock:
+            self.__entries[(kind, str(key))] = value
+            self._db.execute(
+                "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?)",
+                (kind, str(key), json.dumps(value), self._clock()),
+            )
+            self._db.commit()
+
+    def invalidate(self, kind: Optional[str] = None, key: Any = None) -> int:
+        """
+        Removes entries of the given kind, or only the one with the given key.
+        With no arguments, the whole cache is emptied. Returns the number of
+        entries removed.
+        """
+        query = "DELETE FROM metadata"
+        params: Tuple[str, ...] = ()
+        if kind is not None and key is not None:
+            query += " WHERE kind = ? AND key = ?"
+            params = (kind, str(key))
+        elif kind is not None:
+            query += " WHERE kind = ?"
+            params = (kind,)
+        with self._lock:
+            removed = self._db.execute(query, params).rowcount
+            self._db.commit()
+            self.__entries = {
+                k: v
+                for k, v in self.__entries.items()
+                if not (
+                    (kind is None or k[0] == kind)
+                    and (key is None or k[1] == str(key))
+                )
+            }
+        return removed
+
+    def close(self) -> None:
+        self._db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Invalidate the campground and campsite metadata cache."
+    )
+    parser.add_argument(
+        "--kind",
+        choices=[MetadataCache.CAMPGROUND, MetadataCache.CAMPSITE, MetadataCache.SITE_COUNT],
+        help="Only invalidate entries of this kind.",
+    )
+    parser.add_argument(
+        "ids",
+        nargs="*",
+        help="Only invalidate these campground or campsite IDs (requires --kind).",
+    )
+    args = parser.parse_args()
+    if args.ids and not args.kind:
+        parser.error("--kind is required when passing IDs")
+
+    cache = MetadataCache()
+    if args.ids:
+        removed = sum(cache.invalidate(args.kind, i) for i in args.ids)
+    else:
+        removed = cache.invalidate(args.kind)
+    cache.close()
+    print("Removed {} cached entries.".format(removed))
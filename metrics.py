@@ -0,0 +1,288 @@
+import bisect
+import os
+import tempfile
+import threading
+import time
+
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+# Names and label values of a metric, e.g.
+# ("stage_seconds", (("stage", "decode"),)).
+METRIC_KEY = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+PREFIX = "campsite_checker_"
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+HELP = {
+    "stage_seconds": "Time spent in each stage of a check.",
+    "request_seconds": "Latency of requests to recreation.gov, per endpoint.",
+    "requests_total": "Responses from recreation.gov, per endpoint and status.",
+    "retries_total": "Requests to recreation.gov that had to be retried.",
+    "rate_limited_total": "429 responses from recreation.gov.",
+    "downloaded_bytes_total": "Response bytes downloaded from recreation.gov.",
+    "cache_requests_total": "Cache lookups, per cache and result.",
+    "cycles_total": "Checks run since the process started.",
+    "page_changes_total": "Polled pages whose availability changed for a watch.",
+    "history_transitions_total": "Availability changes added to the history store.",
+}
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum", "max")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        # The last count is for values above every bucket.
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a quantile as the upper bound of the bucket it falls in.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Metrics:
+    """
+    Counters and latency histograms for each stage of a check and each
+    recreation.gov endpoint. They are kept in memory for the life of the
+    process, and can be printed as a summary table or exported in the
+    Prometheus text format.
+    """
+
+    _shared: Optional["Metrics"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, clock=time.perf_counter) -> None:
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._counters: Dict[METRIC_KEY, float] = {}
+        self._histograms: Dict[METRIC_KEY, Histogram] = {}
+
+    @classmethod
+    def shared(cls) -> "Metrics":
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, str]) -> METRIC_KEY:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timed(self, stage: str) -> Iterator[None]:
+        """
+        Records how long the body takes as the `stage` stage, even if it
+        raises.
+        """
+        started = self._clock()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", self._clock() - started, stage=stage)
+
+    def counter(self, name: str, **labels: str) -> float:
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def histogram(self, name: str, **labels: str) -> Optional[Histogram]:
+        with self._lock:
+            return self._histograms.get(self._key(name, labels))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    @staticmethod
+    def _format_labels(labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        labels = tuple(labels) + extra
+        if not labels:
+            return ""
+        return "{{{}}}".format(
+            ",".join(
+                '{}="{}"'.format(
+                    k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+                )
+                for k, v in labels
+            )
+        )
+
+    def to_prometheus(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, (list(h.counts), h.count, h.sum, h.buckets))
+                for key, h in self._histograms.items()
+            )
+
+        lines: List[str] = []
+        described = set()
+
+        def describe(name: str, kind: str) -> None:
+            if name in described:
+                return
+            described.add(name)
+            if name in HELP:
+                lines.append("# HELP {}{} {}".format(PREFIX, name, HELP[name]))
+            lines.append("# TYPE {}{} {}".format(PREFIX, name, kind))
+
+        for (name, labels), value in counters:
+            describe(name, "counter")
+            lines.append(
+                "{}{}{} {}".format(PREFIX, name, self._format_labels(labels), value)
+            )
+        for (name, labels), (counts, count, total, buckets) in histograms:
+            describe(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(
+                    "{}{}_bucket{} {}".format(
+                        PREFIX,
+                        name,
+                        self._format_labels(labels, (("le", repr(bound)),)),
+                        cumulative,
+                    )
+                )
+            lines.append(
+                "{}{}_bucket{} {}".format(
+                    PREFIX, name, self._format_labels(labels, (("le", "+Inf"),)), count
+                )
+            )
+            lines.append(
+                "{}{}_sum{} {}".format(PREFIX, name, self._format_labels(labels), total)
+            )
+            lines.append(
+                "{}{}_count{} {}".format(PREFIX, name, self._format_labels(labels), count)
+            )
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Path) -> None:
+        """
+        Atomically replaces `path` with the current metrics, e.g. for the
+        node_exporter textfile collector.
+        """
+        path = Path(path)
+        fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=path.name + ".")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(self.to_prometheus())
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, str(path))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def serve_prometheus(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """
+        Serves the metrics at http://<host>:<port>/metrics from a background
+        thread, only to this machine unless given another `host`. Call
+        `shutdown` on the returned server to stop it.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        httpd = ThreadingHTTPServer((host, port), Handler)
+        httpd.daemon_threads = True
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        return httpd
+
+    def summary(self) -> str:
+        """
+        Renders the metrics as a table for people to read.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+
+        rows = [("latency", "count", "total s", "mean ms", "p50 ms", "p95 ms", "max ms")]
+        for (name, labels), h in histograms:
+            rows.append(
+                (
+                    "{}{}".format(name, self._format_labels(labels)),
+                    str(h.count),
+                    "{:.3f}".format(h.sum),
+                    "{:.1f}".format(1000 * h.sum / h.count if h.count else 0),
+                    "{:.1f}".format(1000 * h.quantile(0.5)),
+                    "{:.1f}".format(1000 * h.quantile(0.95)),
+                    "{:.1f}".format(1000 * h.max),
+                )
+            )
+        widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+        lines = [
+            "  ".join(
+                cell.ljust(width) if i == 0 else cell.rjust(width)
+                for i, (cell, width) in enumerate(zip(row, widths))
+            )
+            for row in rows
+        ]
+
+        if counters:
+            lines.append("")
+            names = [
+                "{}{}".format(name, self._format_labels(labels))
+                for (name, labels), _ in counters
+            ]
+            width = max(len("counter"), *(len(n) for n in names))
+            lines.append("{}  {}".format("counter".ljust(width), "value"))
+            for n, (_, value) in zip(names, counters):
+                lines.append(
+                    "{}  {}".format(
+                        n.ljust(width), int(value) if value == int(value) else value
+                    )
+                )
+        return "\n".join(lines)
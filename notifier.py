@@ -43,6 +43,16 @@ def main(args, stdin):
     user = args[1].replace("@", "")
 
     first_line = next(stdin)
+    if parse_event(first_line) is not None:
+        # camping.py --events: there's no header line, so make one up.
+        lines = [first_line] + list(stdin)
+        events = [parse_event(line) for line in lines]
+        stdin = iter(lines)
+        first_line = (
+            "Something went wrong"
+            if any(e is not None and e["event"] == "error" for e in events)
+            else "there are campsites available!!!"
+        )
     first_line_hash = md5(first_line.encode("utf-8")).hexdigest()
 
     delay_file = DELAY_FILE_TEMPLATE.format(first_line_hash)
@@ -84,9 +94,33 @@ def generate_tweet_str(available_site_strings, first_line, user):
     return tweet
 
 
+def parse_event(line):
+    """
+    Returns the event on a line written by camping.py --events, or None for
+    any other line.
+    """
+    line = line.strip()
+    if not line.startswith("{"):
+        return None
+    try:
+        event = json.loads(line)
+    except ValueError:
+        return None
+    return event if isinstance(event, dict) and "event" in event else None
+
+
 def generate_availability_strings(stdin):
     available_site_strings = []
     for line in stdin:
+        event = parse_event(line)
+        if event is not None:
+            if event["event"] == "park_checked" and event.get("available"):
+                available_site_strings.append(
+                    "{} site(s) available in {} ({})".format(
+                        event["available"], event["park_name"], event["park_id"]
+                    )
+                )
+            continue
         line = line.strip()
         if Emoji.SUCCESS.value in line:
             park_name_and_id = " ".join(line.split(":")[0].split(" ")[1:])
@@ -0,0 +1,154 @@
+from datetime import datetime
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+from availability import AvailabilityMatrix, StayRun, StayWindows, run_lengths
+
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+class StayQuery(NamedTuple):
+    """
+    A pattern of stays to look for, such as "2 or 3 nights arriving on a
+    Friday or Saturday, in June or in August".
+    """
+
+    min_nights: int = 1
+    max_nights: int = 1
+    # Weekdays (0 is Monday) a stay may start on, or None for any day.
+    arrival_weekdays: Optional[FrozenSet[int]] = None
+    # (first night, departure day) ranges a stay has to fit into, or empty
+    # for the whole searched range.
+    windows: Tuple[Tuple[datetime, datetime], ...] = ()
+
+    def window_ordinals(
+        self, start_date: datetime, end_date: datetime
+    ) -> List[Tuple[int, int]]:
+        """
+        Returns the windows as [first, last) day ordinals, clipped to the
+        searched range.
+        """
+        start, end = start_date.toordinal(), end_date.toordinal()
+        windows = self.windows or ((start_date, end_date),)
+        clipped = []
+        for window_start, window_end in windows:
+            first = max(window_start.toordinal(), start)
+            last = min(window_end.toordinal(), end)
+            if last - first >= self.min_nights:
+                clipped.append((first, last))
+        return clipped
+
+
+def ordinal_weekday(ordinal: int) -> int:
+    # Day ordinal 1 (January 1st of year 1) was a Monday.
+    return (ordinal - 1) % 7
+
+
+def weekday_mask(first_day: int, num_days: int, weekdays: Iterable[int]) -> int:
+    """
+    Returns a mask with bit i set if day ordinal `first_day + i`, for the
+    next `num_days` days, is one of `weekdays`.
+    """
+    week = sum(1 << ((day - ordinal_weekday(first_day)) % 7) for day in set(weekdays))
+    weeks = num_days // 7 + 1
+    return ((1 << (7 * weeks)) - 1) // 0b1111111 * week & ((1 << num_days) - 1)
+
+
+def _stay_windows(first_day: int, starts_by_nights: Dict[int, int]) -> StayWindows:
+    """
+    Turns masks of the days stays can start on (bit i being day ordinal
+    `first_day + i`), by number of nights, into `StayWindows`.
+    """
+    return StayWindows(
+        StayRun(first_day + i, n, nights)
+        for nights, starts in sorted(starts_by_nights.items())
+        for i, n in run_lengths(starts)
+    )
+
+
+def find_stays(
+    matrix: AvailabilityMatrix,
+    queries: Iterable[StayQuery],
+    start_date: datetime,
+    end_date: datetime,
+) -> List[Dict[str, StayWindows]]:
+    """
+    Finds the stays matching each query between `start_date` and
+    `end_date`, in a single pass over the matrix.
+
+    Rather than checking every night of every site again for every query,
+    this walks each site's runs of consecutive available nights. The stays
+    of a given length that fit in one run clipped to one of the query's
+    windows start on a range of consecutive days, so each query only costs
+    a few mask operations per run, window and length, however many stays
+    there are. Ranges from overlapping windows are combined into one.
+
+    Returns, for each query, the stays of every site that has any, as
+    `StayWindows` that only list the individual stays when asked to.
+    """
+    queries = list(queries)
+    first_day = matrix.first_day
+    num_days = end_date.toordinal() - first_day + 1
+    windows = [q.window_ordinals(start_date, end_date) for q in queries]
+    arrivals = [
+        weekday_mask(first_day, num_days, q.arrival_weekdays)
+        if q.arrival_weekdays is not None and num_days > 0
+        else -1
+        for q in queries
+    ]
+    results: List[Dict[str, StayWindows]] = [{} for _ in queries]
+
+    for site, runs in matrix.runs().items():
+        for query, query_windows, arrival_mask, stays_by_site in zip(
+            queries, windows, arrivals, results
+        ):
+            starts_by_nights: Dict[int, int] = {}
+            for run_first, run_nights in runs:
+                if run_nights < query.min_nights:
+                    continue
+                run_last = run_first + run_nights
+                for window_first, window_last in query_windows:
+                    first = max(run_first, window_first)
+                    last = min(run_last, window_last)
+                    longest = min(query.max_nights, last - first)
+                    for nights in range(query.min_nights, longest + 1):
+                        starts = ((1 << (last - first - nights + 1)) - 1) << (
+                            first - first_day
+                        )
+                        starts_by_nights[nights] = (
+                            starts_by_nights.get(nights, 0) | starts
+                        )
+            for nights in list(starts_by_nights):
+                starts_by_nights[nights] &= arrival_mask
+                if not starts_by_nights[nights]:
+                    del starts_by_nights[nights]
+            if starts_by_nights:
+                stays_by_site[site] = _stay_windows(first_day, starts_by_nights)
+
+    return results
+
+
+def merge_stays(
+    results: Iterable[Dict[str, StayWindows]]
+) -> Dict[str, StayWindows]:
+    """
+    Combines the stays found for several queries, in order and without
+    duplicates.
+    """
+    merged: Dict[str, List[StayWindows]] = {}
+    for stays_by_site in results:
+        for site, stays in stays_by_site.items():
+            merged.setdefault(site, []).append(stays)
+
+    combined: Dict[str, StayWindows] = {}
+    for site, found in merged.items():
+        if len(found) == 1:
+            combined[site] = found[0]
+            continue
+        runs = [run for stays in found for run in stays.runs]
+        first_day = min(run.first_start for run in runs)
+        starts_by_nights: Dict[int, int] = {}
+        for run in runs:
+            starts = ((1 << run.starts) - 1) << (run.first_start - first_day)
+            starts_by_nights[run.nights] = starts_by_nights.get(run.nights, 0) | starts
+        combined[site] = _stay_windows(first_day, starts_by_nights)
+    return combined
@@ -0,0 +1,197 @@
+import time
+
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+
+PARK_MONTH = Tuple[Any, datetime]
+
+
+class PageStats:
+    """
+    How often polling a page has turned up a change that matters.
+    """
+
+    __slots__ = ("fingerprint", "churn", "polls", "changes")
+
+    def __init__(self, churn: float) -> None:
+        self.fingerprint: Optional[Hashable] = None
+        # Moving average of the fraction of polls that saw a change.
+        self.churn = churn
+        self.polls = 0
+        self.changes = 0
+
+
+class PollScheduler:
+    """
+    Decides which (park, month) pages are due to be fetched.
+
+    Every watch registers the pages it needs along with how often it wants
+    them polled. A page wanted by several watches is scheduled once, at the
+    shortest of their intervals, so overlapping watches share a single fetch.
+    Months further in the future are polled less often than the coming ones,
+    since that's where cancellations matter least.
+
+    The interval of each page also adapts to how often it changes, as
+    reported through `record`: a page that changed on most polls is polled
+    up to `CHURN_RANGE` times more often, and one that never changes up to
+    `CHURN_RANGE` times less often. Given a `budget` of requests per second,
+    every interval is stretched by the same factor when the pages would
+    need more than that, so each page keeps its share of the budget.
+    """
+
+    # Months this far away (or closer) are polled at the watch's interval.
+    HOT_MONTHS = 1
+    # Far-future months are polled at most this many times less often.
+    MAX_SLOWDOWN = 8
+    # How far churn can speed up or slow down polling of a page.
+    CHURN_RANGE = 4.0
+    # Weight of the latest poll in the churn average.
+    CHURN_ALPHA = 0.3
+    # Churn of a page that hasn't been seen to change or not yet, which
+    # leaves its interval alone.
+    INITIAL_CHURN = 0.5
+    # Seconds before retrying a page that failed to fetch, doubled with
+    # every failure in a row, up to the page's usual interval.
+    RETRY_BACKOFF = 5.0
+
+    def __init__(
+        self, clock: Callable[[], float] = time.monotonic, budget: Optional[float] = None,
+    ) -> None:
+        self._clock = clock
+        self.budget = budget
+        self._watches: Dict[Hashable, Tuple[Set[PARK_MONTH], float]] = {}
+        self._next_due: Dict[PARK_MONTH, float] = {}
+        self._stats: Dict[PARK_MONTH, PageStats] = {}
+        self._failures: Dict[PARK_MONTH, int] = {}
+
+    @classmethod
+    def month_slowdown(cls, month_date: datetime, today: datetime) -> int:
+        months_away = (month_date.year - today.year) * 12 + (
+            month_date.month - today.month
+        )
+        if months_away <= cls.HOT_MONTHS:
+            return 1
+        return min(2 ** (months_away - cls.HOT_MONTHS), cls.MAX_SLOWDOWN)
+
+    def set_watch(
+        self, name: Hashable, keys: Iterable[PARK_MONTH], interval: float
+    ) -> None:
+        """
+        Registers (or updates) the pages a watch needs. Pages that are new to
+        the scheduler are due immediately; pages it already knows keep their
+        schedule.
+        """
+        keys = set(keys)
+        self._watches[name] = (keys, interval)
+        now = self._clock()
+        for key in keys:
+            self._next_due.setdefault(key, now)
+        wanted = set().union(*(k for k, _ in self._watches.values()))
+        for key in list(self._next_due):
+            if key not in wanted:
+                del self._next_due[key]
+                self._stats.pop(key, None)
+                self._failures.pop(key, None)
+
+    def record(self, key: PARK_MONTH, fingerprint: Hashable) -> bool:
+        """
+        Notes what a fetch of `key` found, as a fingerprint of the part of
+        the page any watch would report on. Returns whether it changed
+        since the last fetch.
+        """
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = PageStats(self.INITIAL_CHURN)
+        changed = stats.fingerprint is not None and fingerprint != stats.fingerprint
+        if stats.fingerprint is not None:
+            stats.polls += 1
+            stats.changes += changed
+            stats.churn += self.CHURN_ALPHA * (changed - stats.churn)
+        stats.fingerprint = fingerprint
+        return changed
+
+    def churn(self, key: PARK_MONTH) -> float:
+        stats = self._stats.get(key)
+        return stats.churn if stats is not None else self.INITIAL_CHURN
+
+    def churn_factor(self, key: PARK_MONTH) -> float:
+        """
+        Returns how much longer than usual to wait before polling `key`
+        again: 1 / CHURN_RANGE if it changed on every poll, and CHURN_RANGE
+        if it never changes.
+        """
+        return self.CHURN_RANGE ** (1 - 2 * self.churn(key))
+
+    def _unscaled_interval(self, key: PARK_MONTH, today: datetime) -> float:
+        intervals = [
+            interval
+            for keys, interval in self._watches.values()
+            if key in keys
+        ]
+        return (
+            min(intervals)
+            * self.month_slowdown(key[1], today)
+            * self.churn_factor(key)
+        )
+
+    def budget_scale(self, today: datetime) -> float:
+        """
+        Returns how much every interval has to be stretched for polling all
+        of the pages to fit in the budget.
+        """
+        if not self.budget:
+            return 1.0
+        rate = sum(
+            1 / self._unscaled_interval(key, today) for key in self._next_due
+        )
+        return max(rate / self.budget, 1.0)
+
+    def interval(self, key: PARK_MONTH, today: datetime) -> float:
+        return self._unscaled_interval(key, today) * self.budget_scale(today)
+
+    def due(self) -> Set[PARK_MONTH]:
+        now = self._clock()
+        return {key for key, due in self._next_due.items() if due <= now}
+
+    def mark_fetched(self, keys: Iterable[PARK_MONTH], today: datetime) -> None:
+        now = self._clock()
+        scale = self.budget_scale(today)
+        for key in keys:
+            if key in self._next_due:
+                self._next_due[key] = (
+                    now + self._unscaled_interval(key, today) * scale
+                )
+                self._failures.pop(key, None)
+
+    def mark_failed(self, keys: Iterable[PARK_MONTH], today: datetime) -> None:
+        """
+        Reschedules pages that failed to fetch after a short backoff rather
+        than their full interval.
+        """
+        now = self._clock()
+        scale = self.budget_scale(today)
+        for key in keys:
+            if key in self._next_due:
+                failures = self._failures.get(key, 0) + 1
+                self._failures[key] = failures
+                self._next_due[key] = now + min(
+                    self.RETRY_BACKOFF * 2 ** (failures - 1),
+                    self._unscaled_interval(key, today) * scale,
+                )
+
+    def watches_for(self, keys: Iterable[PARK_MONTH]) -> Set[Hashable]:
+        """
+        Returns the watches that need any of `keys`.
+        """
+        keys = set(keys)
+        return {
+            name
+            for name, (watch_keys, _) in self._watches.items()
+            if watch_keys & keys
+        }
+
+    def seconds_until_due(self) -> float:
+        if not self._next_due:
+            return float("inf")
+        return max(min(self._next_due.values()) - self._clock(), 0.0)
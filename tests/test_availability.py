@@ -0,0 +1,129 @@
+import unittest
+from datetime import datetime
+
+import json
+
+from availability import (
+    AvailabilityMatrix,
+    DateRange,
+    ParkResult,
+    StayRun,
+    StayWindows,
+    iter_bits,
+    run_lengths,
+    window_starts,
+)
+
+
+class TestAvailability(unittest.TestCase):
+    def testWindowStarts_FindsEveryStartOfALongEnoughRun(self):
+        mask = 0b1110111110
+        self.assertEqual(list(iter_bits(window_starts(mask, 1))), [1, 2, 3, 4, 5, 7, 8, 9])
+        self.assertEqual(list(iter_bits(window_starts(mask, 3))), [1, 2, 3, 7])
+        self.assertEqual(list(iter_bits(window_starts(mask, 5))), [1])
+        self.assertEqual(window_starts(mask, 6), 0)
+
+    def testRunLengths(self):
+        self.assertEqual(run_lengths(0), [])
+        self.assertEqual(run_lengths(0b1110111110), [(1, 5), (7, 3)])
+        self.assertEqual(run_lengths(0b1011), [(0, 2), (3, 1)])
+
+    def testRuns_UseDayOrdinals(self):
+        matrix = AvailabilityMatrix(100, {"1": 0b0111, "2": 0b1101, "3": 0})
+        self.assertEqual(
+            matrix.runs(), {"1": [(100, 3)], "2": [(100, 1), (102, 2)], "3": []}
+        )
+
+    def testStayWindows_ExpandRunsLazily(self):
+        first = datetime(2022, 6, 1).toordinal()
+        stays = StayWindows([StayRun(first, 2, 3), StayRun(first + 9, 1, 3)])
+
+        self.assertEqual(len(stays), 3)
+        self.assertEqual(
+            stays,
+            [
+                {"start": "2022-06-01", "end": "2022-06-04"},
+                {"start": "2022-06-02", "end": "2022-06-05"},
+                {"start": "2022-06-10", "end": "2022-06-13"},
+            ],
+        )
+        self.assertEqual(stays[-1], {"start": "2022-06-10", "end": "2022-06-13"})
+        self.assertEqual(stays.runs[0].length, 4)
+        self.assertEqual(stays.runs[0].end, "2022-06-05")
+
+    def testDateRange_RendersDatesOnlyWhenAsked(self):
+        first = datetime(2022, 6, 1).toordinal()
+        stay = DateRange(first, first + 3)
+
+        self.assertEqual(stay.nights, 3)
+        self.assertEqual(stay["start"], "2022-06-01")
+        self.assertEqual(stay["end"], "2022-06-04")
+        self.assertEqual(stay, {"start": "2022-06-01", "end": "2022-06-04"})
+        self.assertEqual(stay, DateRange(first, first + 3))
+        self.assertEqual(len({stay, DateRange(first, first + 3)}), 1)
+        with self.assertRaises(KeyError):
+            stay["length"]
+        with self.assertRaises(AttributeError):
+            stay.extra = 1
+
+    def testParkResult_UnpacksLikeATuple(self):
+        first = datetime(2022, 6, 1).toordinal()
+        result = ParkResult(1, 5, {42: StayWindows([StayRun(first, 2, 1)])}, "PARK")
+
+        available, maximum, sites, name = result
+        self.assertEqual((available, maximum, name), (1, 5, "PARK"))
+        self.assertEqual(result[0], 1)
+        self.assertEqual(result, (1, 5, sites, "PARK"))
+        self.assertEqual(
+            json.dumps(result.to_json()),
+            json.dumps(
+                {
+                    42: [
+                        {"start": "2022-06-01", "end": "2022-06-02"},
+                        {"start": "2022-06-02", "end": "2022-06-03"},
+                    ]
+                }
+            ),
+        )
+
+    def testStayRuns_MatchStayStarts(self):
+        matrix = AvailabilityMatrix(100, {"1": 0b1110111, "2": 0b0101, "3": 0})
+        mask = (1 << 7) - 1
+        self.assertEqual(
+            dict(matrix.stay_runs(mask, 2)),
+            {"1": StayWindows([StayRun(100, 2, 2), StayRun(104, 2, 2)])},
+        )
+
+    def testMatrix_RoundTripsParkInformation(self):
+        park_info = {
+            "1": [],
+            "2": ["2022-06-22T00:00:00Z", "2022-06-23T00:00:00Z"],
+            "3": ["2022-06-21T00:00:00Z", "2022-07-01T00:00:00Z"],
+        }
+        matrix = AvailabilityMatrix.from_park_information(park_info)
+
+        self.assertEqual(len(matrix), 3)
+        self.assertEqual(matrix.first_day, datetime(2022, 6, 21).toordinal())
+        self.assertEqual(matrix.to_park_information(), park_info)
+
+    def testNightsMask_WeekendsOnly(self):
+        matrix = AvailabilityMatrix(datetime(2022, 6, 20).toordinal(), {})
+        # 2022-06-24 is a Friday.
+        mask = matrix.nights_mask(
+            datetime(2022, 6, 22), datetime(2022, 7, 3), weekends_only=True
+        )
+        self.assertEqual(list(iter_bits(mask)), [4, 5, 11, 12])
+
+        mask = matrix.nights_mask(datetime(2022, 6, 18), datetime(2022, 6, 23))
+        self.assertEqual(list(iter_bits(mask)), [0, 1, 2])
+
+    def testStayRuns_OnlyYieldsSitesWithAStay(self):
+        matrix = AvailabilityMatrix(100, {"1": 0b0111, "2": 0b0101, "3": 0})
+        self.assertEqual(
+            list(matrix.stay_runs(0b1111, 2)),
+            [("1", StayWindows([StayRun(100, 2, 2)]))],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
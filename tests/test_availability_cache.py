@@ -0,0 +1,57 @@
+import json
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+from availability_cache import AvailabilityCache
+
+
+class TestAvailabilityCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.now = 1000.0
+        self.cache = AvailabilityCache(
+            Path(self.tempdir.name) / "availability.sqlite3",
+            freshness=60,
+            clock=lambda: self.now,
+        )
+        self.month = datetime(2022, 6, 1)
+        self.body = json.dumps({"campsites": {}}).encode()
+
+    def tearDown(self):
+        self.cache.close()
+        self.tempdir.cleanup()
+
+    def testGet_ReturnsWhatWasPut(self):
+        self.assertIsNone(self.cache.get(1, self.month))
+        self.cache.put(1, self.month, self.body, etag='"abc"')
+
+        cached = self.cache.get(1, self.month)
+        self.assertEqual(cached.data, {"campsites": {}})
+        self.assertEqual(cached.validators(), {"If-None-Match": '"abc"'})
+        self.assertIsNone(self.cache.get(1, datetime(2022, 7, 1)))
+
+    def testIsFresh_OnlyWithoutValidatorsAndWithinWindow(self):
+        self.cache.put(1, self.month, self.body)
+        self.cache.put(2, self.month, self.body, last_modified="yesterday")
+
+        self.assertTrue(self.cache.is_fresh(self.cache.get(1, self.month)))
+        self.assertFalse(self.cache.is_fresh(self.cache.get(2, self.month)))
+
+        self.now += 61
+        self.assertFalse(self.cache.is_fresh(self.cache.get(1, self.month)))
+        self.cache.touch(1, self.month)
+        self.assertTrue(self.cache.is_fresh(self.cache.get(1, self.month)))
+
+    def testPrune_RemovesPastMonths(self):
+        self.cache.put(1, datetime(2022, 5, 1), self.body)
+        self.cache.put(1, self.month, self.body)
+
+        self.assertEqual(self.cache.prune(datetime(2022, 6, 15)), 1)
+        self.assertIsNone(self.cache.get(1, datetime(2022, 5, 1)))
+        self.assertIsNotNone(self.cache.get(1, self.month))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import json
+import os
+import unittest
+
+from clients.availability_parser import parse_availability, select_campsites
+
+SAMPLE_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "other", "sample.json"
+)
+
+
+class TestAvailabilityParser(unittest.TestCase):
+    def setUp(self):
+        self.response = {
+            "campsites": {
+                "100": {
+                    "availabilities": {
+                        "2022-06-22T00:00:00Z": "Available",
+                        "2022-06-23T00:00:00Z": "Reserved",
+                        "2022-06-24T00:00:00Z": "Not Reservable",
+                        "2022-06-25T00:00:00Z": "Available",
+                    },
+                    "campsite_id": "100",
+                    "campsite_type": "STANDARD NONELECTRIC",
+                    "loop": "A",
+                    "quantities": {"2022-06-22T00:00:00Z": 1},
+                    "site": "001",
+                },
+                "200": {
+                    "availabilities": {"2022-06-22T00:00:00Z": "Available"},
+                    "campsite_id": "200",
+                    "campsite_type": "GROUP STANDARD NONELECTRIC",
+                    "site": "002",
+                },
+            },
+            "count": 2,
+        }
+        self.body = json.dumps(self.response).encode()
+
+    def testParseAvailability_KeepsOnlyAvailableDatesAndNeededFields(self):
+        data = parse_availability(self.body)
+
+        self.assertEqual(data["count"], 2)
+        self.assertEqual(
+            data["campsites"]["100"],
+            {
+                "availabilities": {
+                    "2022-06-22T00:00:00Z": "Available",
+                    "2022-06-25T00:00:00Z": "Available",
+                },
+                "campsite_id": "100",
+                "campsite_type": "STANDARD NONELECTRIC",
+                "site": "001",
+            },
+        )
+
+    def testParseAvailability_FiltersCampsitesButKeepsThemListed(self):
+        data = parse_availability(self.body, campsite_type="STANDARD NONELECTRIC")
+        self.assertEqual(len(data["campsites"]["100"]["availabilities"]), 2)
+        self.assertEqual(data["campsites"]["200"]["availabilities"], {})
+
+        data = parse_availability(self.body, campsite_ids=(200,))
+        self.assertEqual(data["campsites"]["100"]["availabilities"], {})
+        self.assertEqual(len(data["campsites"]["200"]["availabilities"]), 1)
+
+    def testSelectCampsites_MatchesFilteringWhileParsing(self):
+        for campsite_type, campsite_ids in [
+            (None, ()),
+            ("STANDARD NONELECTRIC", ()),
+            (None, (200,)),
+        ]:
+            self.assertEqual(
+                select_campsites(
+                    parse_availability(self.body), campsite_type, campsite_ids
+                ),
+                parse_availability(self.body, campsite_type, campsite_ids),
+            )
+
+    def testParseAvailability_SampleResponse(self):
+        with open(SAMPLE_FILE, "rb") as sample_file:
+            sample = json.loads(sample_file.read())[0]
+        data = parse_availability(json.dumps(sample).encode())
+
+        self.assertEqual(set(data["campsites"]), set(sample["campsites"]))
+        for campsite_id, campsite in sample["campsites"].items():
+            self.assertEqual(
+                list(data["campsites"][campsite_id]["availabilities"]),
+                [
+                    d
+                    for d, v in campsite["availabilities"].items()
+                    if v == "Available"
+                ],
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
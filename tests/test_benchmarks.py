@@ -0,0 +1,45 @@
+import unittest
+
+from benchmarks.fake_recreation_server import FakeServerConfig
+from benchmarks.run_benchmarks import benchmark_cycle, benchmark_evaluation
+from clients.recreation_client import RecreationClient
+
+
+class TestBenchmarks(unittest.TestCase):
+    def testBenchmarkCycle_FakeServer(self):
+        settings = (
+            RecreationClient.BASE_URL,
+            RecreationClient.POOL_SIZE,
+            RecreationClient.rate_limiter,
+            RecreationClient._METADATA_CACHE,
+            RecreationClient._AVAILABILITY_CACHE,
+        )
+        result = benchmark_cycle(
+            FakeServerConfig(sites_per_park=5, rate_limited_fraction=0.2, seed=3),
+            parks=2,
+            months=1,
+            max_concurrency=2,
+            rate_limit=1000.0,
+        )
+        # One availability request and one name request per park, plus the
+        # retries for every 429.
+        self.assertEqual(result["requests"] - result["rate_limited"], 4)
+        self.assertGreater(result["bytes_downloaded"], 0)
+        # The client is left as it was.
+        self.assertEqual(
+            settings,
+            (
+                RecreationClient.BASE_URL,
+                RecreationClient.POOL_SIZE,
+                RecreationClient.rate_limiter,
+                RecreationClient._METADATA_CACHE,
+                RecreationClient._AVAILABILITY_CACHE,
+            ),
+        )
+
+    def testBenchmarkEvaluation(self):
+        result = benchmark_evaluation(
+            sites=5, days=30, nights=2, available_fraction=0.5, repeats=1, seed=0
+        )
+        self.assertEqual(result["sites"], 5)
+        self.assertGreaterEqual(result["get_num_available_sites_cpu_seconds"], 0)
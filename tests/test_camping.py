@@ -1,9 +1,21 @@
+import random
+import smtplib
+import threading
+import time
 import unittest
+from datetime import datetime, timedelta
+from unittest import mock
 
 import camping
+from availability import AvailabilityMatrix
+from clients.recreation_client import RecreationClient, SearchCount
 from enums.date_format import DateFormat
 from enums.emoji import Emoji
 from utils.camping_argparser import CampingArgumentParser
+from queries import StayQuery
+from watch import Watch
+
+date_of = datetime.fromordinal
 
 
 class TestCamping(unittest.TestCase):
@@ -181,6 +193,367 @@ class TestCamping(unittest.TestCase):
         )
         self.assertEqual(output, expected)
 
+    def testCheckParks_MatchesSerialCheckPark(self):
+        start_date = CampingArgumentParser.TypeConverter.date("2022-06-28")
+        end_date = CampingArgumentParser.TypeConverter.date("2022-07-03")
+
+        def get_availability(park_id, month_date, campsite_type=None, campsite_ids=()):
+            day = 29 if month_date.month == 6 else 1
+            return {
+                "campsites": {
+                    str(park_id * 10): {
+                        "availabilities": {
+                            "{:%Y-%m}-{:02d}T00:00:00Z".format(month_date, day): "Available",
+                        },
+                        "campsite_id": str(park_id * 10),
+                        "campsite_type": "STANDARD NONELECTRIC",
+                    },
+                }
+            }
+
+        with mock.patch.object(
+            RecreationClient, "get_availability", side_effect=get_availability
+        ), mock.patch.object(
+            RecreationClient, "get_park_name", side_effect=lambda p: "PARK {}".format(p)
+        ):
+            serial = {
+                park_id: camping.check_park(
+                    park_id, start_date, end_date, None, nights=1
+                )
+                for park_id in (1, 2, 3)
+            }
+            concurrent = camping.check_parks(
+                [1, 2, 3], start_date, end_date, None, nights=1, max_concurrency=4
+            )
+
+        self.assertEqual(list(concurrent.keys()), [1, 2, 3])
+        self.assertEqual(serial, concurrent)
+
+    def testGetMonths_SkipsMonthsInThePast(self):
+        start_date = CampingArgumentParser.TypeConverter.date("2022-05-20")
+        end_date = CampingArgumentParser.TypeConverter.date("2022-07-03")
+
+        self.assertEqual(
+            [m.month for m in camping.get_months(start_date, end_date)],
+            [5, 6, 7],
+        )
+        self.assertEqual(
+            [
+                m.month
+                for m in camping.get_months(
+                    start_date, end_date, today=datetime(2022, 6, 15)
+                )
+            ],
+            [6, 7],
+        )
+        self.assertEqual(
+            [
+                m.month
+                for m in camping.get_months(
+                    start_date, end_date, today=datetime(2022, 9, 1)
+                )
+            ],
+            [7],
+        )
+
+    def testPlanMonths_SkipsMonthsNoStayCanUse(self):
+        def months(*args, **kwargs):
+            return [m.strftime("%Y-%m") for m in camping.plan_months(*args, **kwargs)]
+
+        # Checking out on the 1st doesn't need the next month.
+        self.assertEqual(months(datetime(2022, 6, 28), datetime(2022, 7, 1)), ["2022-06"])
+        # Nor do nights before today.
+        self.assertEqual(
+            months(
+                datetime(2022, 5, 20), datetime(2022, 7, 3), nights=2, today=datetime(2022, 6, 15)
+            ),
+            ["2022-06", "2022-07"],
+        )
+        # 2022-07-01 is a Friday, and the only weekend in the range.
+        self.assertEqual(
+            months(datetime(2022, 6, 27), datetime(2022, 7, 5), weekends_only=True),
+            ["2022-07"],
+        )
+        # No stay of 3 weekend nights is possible, but we still need to know
+        # how many sites there are.
+        self.assertEqual(
+            months(datetime(2022, 6, 27), datetime(2022, 7, 5), nights=3, weekends_only=True),
+            ["2022-07"],
+        )
+        # A stay of 5 nights can't start in the last 4 nights of June, but it
+        # can cover them.
+        self.assertEqual(
+            months(datetime(2022, 6, 1), datetime(2022, 7, 10), nights=5),
+            ["2022-06", "2022-07"],
+        )
+        self.assertEqual(
+            months(
+                datetime(2022, 5, 1),
+                datetime(2022, 9, 1),
+                stays=[StayQuery(2, 2, windows=((datetime(2022, 7, 30), datetime(2022, 8, 5)),))],
+            ),
+            ["2022-07", "2022-08"],
+        )
+
+    def testPlanMonths_KeepsEveryMonthAStayNeeds(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            start_date = datetime(2022, 1, 1) + timedelta(days=rng.randint(0, 60))
+            end_date = start_date + timedelta(days=rng.randint(1, 90))
+            nights = rng.choice([None, 1, 2, 3, 7])
+            weekends_only = rng.random() < 0.3
+            first = datetime(2021, 12, 1).toordinal()
+            matrix = AvailabilityMatrix(
+                first, {str(site): rng.getrandbits(200) for site in range(3)}
+            )
+            planned = set(
+                (m.year, m.month)
+                for m in camping.plan_months(start_date, end_date, nights, weekends_only)
+            )
+            pruned = AvailabilityMatrix(
+                first,
+                {
+                    site: sum(
+                        1 << i
+                        for i in range(200)
+                        if mask >> i & 1
+                        and (date_of(first + i).year, date_of(first + i).month) in planned
+                    )
+                    for site, mask in matrix.sites.items()
+                },
+            )
+            self.assertEqual(
+                camping.get_num_available_sites(
+                    pruned, start_date, end_date, nights, weekends_only
+                ),
+                camping.get_num_available_sites(
+                    matrix, start_date, end_date, nights, weekends_only
+                ),
+            )
+
+    def testCheckWatches_FetchesEachPageOnce(self):
+        start_date = CampingArgumentParser.TypeConverter.date("2022-06-28")
+        end_date = CampingArgumentParser.TypeConverter.date("2022-07-03")
+        watches = [
+            Watch("a", [1, 2], start_date, end_date, nights=1),
+            Watch("b", [2, 3], start_date, end_date, nights=2),
+        ]
+        get_availability = mock.Mock(return_value={"campsites": {}})
+        get_park_name = mock.Mock(side_effect=lambda p: "PARK {}".format(p))
+
+        with mock.patch.object(
+            RecreationClient, "get_availability", get_availability
+        ), mock.patch.object(RecreationClient, "get_park_name", get_park_name):
+            info_by_watch = camping.check_watches(watches, max_concurrency=4)
+
+        self.assertEqual(get_availability.call_count, 6)
+        self.assertEqual(get_park_name.call_count, 3)
+        self.assertEqual(list(info_by_watch["a"].keys()), [1, 2])
+        self.assertEqual(list(info_by_watch["b"].keys()), [2, 3])
+        self.assertEqual(info_by_watch["b"][3], (0, 0, {}, "PARK 3"))
+
+    def testCheckWatches_PrefilterSkipsSoldOutParks(self):
+        start_date = CampingArgumentParser.TypeConverter.date("2022-06-28")
+        end_date = CampingArgumentParser.TypeConverter.date("2022-07-03")
+        watches = [Watch("a", [1, 2, 3], start_date, end_date, nights=1)]
+        get_availability_counts = mock.Mock(
+            return_value={1: SearchCount(0, 40), 2: SearchCount(3, 12)}
+        )
+        get_availability = mock.Mock(return_value={"campsites": {}})
+        get_park_name = mock.Mock(side_effect=lambda p: "PARK {}".format(p))
+
+        with mock.patch.object(
+            RecreationClient, "get_availability_counts", get_availability_counts
+        ), mock.patch.object(
+            RecreationClient, "get_availability", get_availability
+        ), mock.patch.object(
+            RecreationClient, "get_park_name", get_park_name
+        ), mock.patch.dict(RecreationClient._SITE_COUNTS, clear=True):
+            # The search's total isn't what a full check counts.
+            RecreationClient.remember_site_count(1, None, (), 35)
+            info_by_watch = camping.check_watches(watches, prefilter=True)
+
+        get_availability_counts.assert_called_once_with([1, 2, 3], start_date, end_date)
+        # Park 3 wasn't in the search results, so it's checked in full too.
+        self.assertEqual(
+            sorted(set(c[0][0] for c in get_availability.call_args_list)), [2, 3]
+        )
+        self.assertEqual(list(info_by_watch["a"].keys()), [1, 2, 3])
+        self.assertEqual(info_by_watch["a"][1], (0, 35, {}, "PARK 1"))
+
+    def testCheckWatches_PrefilterChecksParksWithUnknownSiteCountsInFull(self):
+        start_date = CampingArgumentParser.TypeConverter.date("2022-06-28")
+        end_date = CampingArgumentParser.TypeConverter.date("2022-07-03")
+        watches = [Watch("a", [1], start_date, end_date, nights=1)]
+        get_availability = mock.Mock(return_value={"campsites": {}})
+
+        with mock.patch.object(
+            RecreationClient,
+            "get_availability_counts",
+            mock.Mock(return_value={1: SearchCount(0, 40)}),
+        ), mock.patch.object(
+            RecreationClient, "get_availability", get_availability
+        ), mock.patch.object(
+            RecreationClient, "get_park_name", mock.Mock(return_value="PARK")
+        ), mock.patch.dict(RecreationClient._SITE_COUNTS, clear=True):
+            first = camping.check_watches(watches, prefilter=True)
+            calls = get_availability.call_count
+            second = camping.check_watches(watches, prefilter=True)
+
+        self.assertEqual(calls, 2)
+        # The second check uses the count from the first.
+        self.assertEqual(get_availability.call_count, calls)
+        self.assertEqual(first, second)
+        self.assertEqual(second["a"][1], (0, 0, {}, "PARK"))
+
+    def testCheckWatches_PrefilterFallsBackWhenSearchFails(self):
+        start_date = CampingArgumentParser.TypeConverter.date("2022-06-28")
+        end_date = CampingArgumentParser.TypeConverter.date("2022-07-03")
+        watches = [Watch("a", [1], start_date, end_date)]
+        get_availability = mock.Mock(return_value={"campsites": {}})
+
+        with mock.patch.object(
+            RecreationClient,
+            "get_availability_counts",
+            mock.Mock(side_effect=RuntimeError("failedRequest")),
+        ), mock.patch.object(
+            RecreationClient, "get_availability", get_availability
+        ), mock.patch.object(
+            RecreationClient, "get_park_name", mock.Mock(return_value="PARK")
+        ), self.assertLogs(camping.LOG, level="WARNING"):
+            camping.check_watches(watches, prefilter=True)
+
+        self.assertEqual(get_availability.call_count, 2)
+
+    def testPageFingerprint_OnlyChangesForWhatAWatchReports(self):
+        watch = Watch(
+            "w", [1], datetime(2022, 6, 10), datetime(2022, 6, 20),
+            campsite_type="STANDARD",
+        )
+
+        def page(standard_dates, group_dates):
+            return {
+                "campsites": {
+                    "1": {
+                        "campsite_id": "1",
+                        "campsite_type": "STANDARD",
+                        "availabilities": {d: "Available" for d in standard_dates},
+                    },
+                    "2": {
+                        "campsite_id": "2",
+                        "campsite_type": "GROUP",
+                        "availabilities": {d: "Available" for d in group_dates},
+                    },
+                }
+            }
+
+        inside = "2022-06-12T00:00:00Z"
+        outside = "2022-06-02T00:00:00Z"
+        fingerprint = camping.page_fingerprint(page([inside], []), [watch])
+        self.assertEqual(
+            camping.page_fingerprint(page([inside, outside], [inside]), [watch]),
+            fingerprint,
+        )
+        self.assertNotEqual(
+            camping.page_fingerprint(page([], []), [watch]), fingerprint
+        )
+
+    def testConsecutiveNights_ReturnsEveryStay(self):
+        available = [
+            "2022-06-01T00:00:00Z",
+            "2022-06-02T00:00:00Z",
+            "2022-06-03T00:00:00Z",
+            "2022-06-05T00:00:00Z",
+            "2022-06-06T00:00:00Z",
+        ]
+        stays = camping.consecutive_nights(available, 2)
+        self.assertEqual(len(stays.runs), 2)
+        self.assertEqual(
+            stays,
+            [
+                {"start": "2022-06-01", "end": "2022-06-03"},
+                {"start": "2022-06-02", "end": "2022-06-04"},
+                {"start": "2022-06-05", "end": "2022-06-07"},
+            ],
+        )
+        self.assertEqual(camping.consecutive_nights(available, 4), [])
+
+    def testDispatchReports_DoesNotWaitForSlowOrFailingReporters(self):
+        release = threading.Event()
+        reported = []
+
+        def slow(info_by_park_id, has_availabilities):
+            release.wait(5)
+
+        def failing(info_by_park_id, has_availabilities):
+            raise RuntimeError("boom")
+
+        def fast(info_by_park_id, has_availabilities):
+            reported.append((info_by_park_id, has_availabilities))
+
+        started = time.monotonic()
+        with self.assertLogs(camping.LOG, level="WARNING") as logs:
+            camping.dispatch_reports(
+                [
+                    camping.Reporter("slow", slow, timeout=0.1),
+                    camping.Reporter("failing", failing),
+                    camping.Reporter("fast", fast),
+                ],
+                {},
+                True,
+            )
+        release.set()
+
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(reported, [({}, True)])
+        self.assertTrue(any("slow did not finish" in line for line in logs.output))
+        self.assertTrue(any("failing failed" in line for line in logs.output))
+
+    def testDispatchReports_SkipsReportersStillBusyWithTheLastReport(self):
+        release = threading.Event()
+        reported = []
+
+        def slow(info_by_park_id, has_availabilities):
+            release.wait(5)
+            reported.append(has_availabilities)
+
+        reporter = camping.Reporter("slow", slow, timeout=0.01)
+        with self.assertLogs(camping.LOG, level="WARNING") as logs:
+            camping.dispatch_reports([reporter], {}, True)
+            camping.dispatch_reports([reporter], {}, False)
+        self.assertTrue(any("still busy" in line for line in logs.output))
+
+        threading.Timer(0.1, release.set).start()
+        self.assertEqual(camping.wait_for_reporters(), 1)
+        self.assertEqual(reported, [True])
+        self.assertEqual(camping.wait_for_reporters(), 0)
+
+    def testMailReporter_ReusesOneConnection(self):
+        settings = {
+            "host": "smtp.example.com",
+            "port": 587,
+            "user": "user",
+            "password": "password",
+            "from_name": "Watcher",
+            "from_email": "watcher@example.com",
+            "recipients": ["camper@example.com"],
+        }
+        with mock.patch("smtplib.SMTP") as smtp:
+            server = smtp.return_value
+            server.sendmail.side_effect = [
+                None,
+                smtplib.SMTPServerDisconnected(),
+                None,
+            ]
+            reporter = camping.mail_reporter(settings, lambda info, has: "hello")
+            reporter({}, True)
+            reporter({}, True)
+            camping.SmtpConnection.close_all()
+
+        self.assertEqual(smtp.call_count, 2)
+        self.assertEqual(server.login.call_count, 2)
+        self.assertEqual(server.sendmail.call_count, 3)
+
 
 if __name__ == "__main__":
     unittest.main()
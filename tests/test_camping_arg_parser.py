@@ -31,6 +31,57 @@ class TestCampingArgParser(unittest.TestCase):
         args.extend(self.end_date)
         CampingArgumentParser().parse_args(args)
 
+    def testWatchesDoNotNeedASearch(self):
+        args = CampingArgumentParser().parse_args(["--watches"])
+        self.assertEqual(args.watches, [])
+
+        args = CampingArgumentParser().parse_args(["--watches", "a", "b"])
+        self.assertEqual(args.watches, ["a", "b"])
+
+    def testWatchesWithASearchThrowsException(self):
+        with self.assertRaises(CampingArgumentParser.ArgumentCombinationError):
+            args = ["--watches"]
+            args.extend(self.default_args)
+            CampingArgumentParser().parse_args(args)
+
+    def testPrefilterSearchWithDaemonThrowsException(self):
+        with self.assertRaises(CampingArgumentParser.ArgumentCombinationError):
+            args = ["--prefilter-search", "--daemon"]
+            args.extend(self.default_args)
+            CampingArgumentParser().parse_args(args)
+
+    def testRecordWithReplayThrowsException(self):
+        with self.assertRaises(CampingArgumentParser.ArgumentCombinationError):
+            args = ["--record", "a.jsonl.gz", "--replay", "b.jsonl.gz"]
+            args.extend(self.default_args)
+            CampingArgumentParser().parse_args(args)
+
+    def testServeQueueWithoutCoordinatorThrowsException(self):
+        with self.assertRaises(CampingArgumentParser.ArgumentCombinationError):
+            args = ["--serve-queue", "8765"]
+            args.extend(self.default_args)
+            CampingArgumentParser().parse_args(args)
+
+    def testServeQueueHost(self):
+        args = ["--coordinator", "queue.sqlite3"]
+        args.extend(self.default_args)
+        parsed = CampingArgumentParser().parse_args(args + ["--serve-queue", "8765"])
+        self.assertEqual(parsed.serve_queue, ("127.0.0.1", 8765))
+        parsed = CampingArgumentParser().parse_args(
+            args + ["--serve-queue", "0.0.0.0:8765"]
+        )
+        self.assertEqual(parsed.serve_queue, ("0.0.0.0", 8765))
+
+    def testHistoryWithReplayThrowsException(self):
+        with self.assertRaises(CampingArgumentParser.ArgumentCombinationError):
+            args = ["--replay", "a.jsonl.gz", "--history"]
+            args.extend(self.default_args)
+            CampingArgumentParser().parse_args(args)
+
+    def testSearchRequiresDates(self):
+        with self.assertRaises(SystemExit):
+            CampingArgumentParser().parse_args(self.parks)
+
 
 if __name__ == "__main__":
     unittest.main()
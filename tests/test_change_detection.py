@@ -0,0 +1,162 @@
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+from unittest import mock
+
+import change_detection
+import formatters
+from availability import DateRange, StayRun, StayWindows
+from hash_store import HashStore
+
+
+JUNE_22 = date(2022, 6, 22).toordinal()
+
+
+class TestChangeDetection(unittest.TestCase):
+    def setUp(self):
+        self.info_by_park_id = {
+            1: (
+                2,
+                3,
+                {
+                    18621: [{"start": "2022-06-22", "end": "2022-06-23"}],
+                    18654: [
+                        {"start": "2022-06-22", "end": "2022-06-23"},
+                        {"start": "2022-06-23", "end": "2022-06-24"},
+                    ],
+                },
+                "SOME PARK",
+            ),
+            2: (0, 5, {}, "OTHER PARK"),
+        }
+
+    def testSnapshot_FlattensOpenings(self):
+        self.assertEqual(
+            change_detection.snapshot(self.info_by_park_id),
+            {
+                ("1", 18621, JUNE_22, 1, 1),
+                # Back-to-back stays are kept as one run.
+                ("1", 18654, JUNE_22, 2, 1),
+            },
+        )
+
+    def testSnapshot_KeepsTheRunsOfStayWindows(self):
+        # Two-night stays starting on any of 90 days.
+        windows = StayWindows([StayRun(JUNE_22, 90, 2)])
+        with mock.patch.object(
+            StayRun, "windows", side_effect=AssertionError("expanded")
+        ):
+            openings = change_detection.snapshot({1: (1, 1, {5: windows}, "PARK")})
+        self.assertEqual(openings, {("1", 5, JUNE_22, 90, 2)})
+
+    def testSnapshot_KeepsOrdinalsOfDateRanges(self):
+        with mock.patch.object(
+            DateRange,
+            "start",
+            new_callable=mock.PropertyMock,
+            side_effect=AssertionError("turned into a string"),
+        ):
+            openings = change_detection.snapshot(
+                {1: (1, 1, {5: [DateRange(JUNE_22, JUNE_22 + 2)]}, "PARK")}
+            )
+        self.assertEqual(openings, {("1", 5, JUNE_22, 1, 2)})
+
+    def testDiff_ReturnsAddedAndRemoved(self):
+        old = {("1", 1, 10, 1, 1), ("1", 2, 10, 1, 1)}
+        new = {("1", 2, 10, 1, 1), ("1", 3, 10, 1, 1)}
+        self.assertEqual(
+            change_detection.diff(old, new),
+            ({("1", 3, 10, 1, 1)}, {("1", 1, 10, 1, 1)}),
+        )
+
+    def testDiff_OnlyReturnsTheStaysARunGainedOrLost(self):
+        old = {("1", 1, 10, 5, 2), ("1", 1, 20, 5, 2), ("1", 1, 10, 5, 3)}
+        new = {("1", 1, 12, 15, 2), ("1", 1, 10, 5, 3)}
+        self.assertEqual(
+            change_detection.diff(old, new),
+            (
+                {("1", 1, 15, 5, 2), ("1", 1, 25, 2, 2)},
+                {("1", 1, 10, 2, 2)},
+            ),
+        )
+
+    def testOnlyOpenings_KeepsOnlyTheGivenOpenings(self):
+        delta = change_detection.only_openings(
+            self.info_by_park_id, {("1", 18654, JUNE_22 + 1, 1, 1)}
+        )
+        self.assertEqual(
+            delta,
+            {
+                1: (
+                    1,
+                    3,
+                    {18654: [{"start": "2022-06-23", "end": "2022-06-24"}]},
+                    "SOME PARK",
+                )
+            },
+        )
+
+    def testJson_RoundTrips(self):
+        openings = change_detection.snapshot(self.info_by_park_id)
+        saved = change_detection.to_json(openings)
+        # Saved as dates, like before openings were kept as ordinals.
+        self.assertEqual(saved[0], ["1", 18621, "2022-06-22", 1, 1])
+        self.assertEqual(change_detection.from_json(saved), openings)
+
+    def testFromJson_ReadsOneStayPerOpening(self):
+        saved = [
+            ["1", 18654, "2022-06-22", "2022-06-23"],
+            ["1", 18654, "2022-06-23", "2022-06-24"],
+        ]
+        self.assertEqual(
+            change_detection.from_json(saved), {("1", 18654, JUNE_22, 2, 1)}
+        )
+
+    def testOnlyOpenings_KeepsStayWindows(self):
+        windows = StayWindows([StayRun(JUNE_22, 90, 2)])
+        delta = change_detection.only_openings(
+            {1: (1, 3, {5: windows}, "PARK")}, {("1", 5, JUNE_22 + 89, 1, 2)}
+        )
+        sites = delta[1].sites
+        self.assertIsInstance(sites[5], StayWindows)
+        self.assertEqual(sites[5].runs, [StayRun(JUNE_22 + 89, 1, 2)])
+
+    def testMakeFormatter_OnlyReportsNewOpenings(self):
+        with tempfile.TemporaryDirectory() as tempdir, mock.patch.object(
+            HashStore, "STORE_FILE", Path(tempdir) / "hashes.json"
+        ):
+            formatter = formatters.make_formatter({"format": "verbose_ascii"})
+            with mock.patch.object(
+                formatters.RecreationClient,
+                "get_site_attributes",
+                side_effect=lambda site_id: {
+                    "campsite_name": str(site_id),
+                    "campsite_type": "STANDARD",
+                },
+            ):
+                first = formatter(self.info_by_park_id, True)
+                HashStore.shared().flush()
+                second = formatter(self.info_by_park_id, True)
+
+                sites = self.info_by_park_id[1][2]
+                sites[18621].append({"start": "2022-06-23", "end": "2022-06-24"})
+                del sites[18654]
+                third = formatter(self.info_by_park_id, True)
+
+        self.assertIn("Site 18654", first)
+        self.assertIsNone(second)
+        self.assertEqual(
+            third,
+            "\n".join(
+                [
+                    "-=-=- SOME PARK: 1 of 3 sites available -=-=-",
+                    "Site 18621 (STANDARD):",
+                    " * 2022-06-23 -> 2022-06-24 (1 nights)",
+                ]
+            ),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,219 @@
+import io
+import json
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest import mock
+
+import camping
+
+from availability import ParkResult
+from clients.recreation_client import RecreationClient
+from events import EventStream
+from hash_store import HashStore
+from watch import Watch
+from work_queue import WorkQueue
+
+
+class TestEvents(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.store_file = mock.patch.object(
+            HashStore, "STORE_FILE", Path(self.tempdir.name) / "hashes.json"
+        )
+        self.store_file.start()
+        self.out = io.StringIO()
+        self.clock = lambda: datetime(2022, 6, 1, tzinfo=timezone.utc)
+
+    def tearDown(self):
+        self.store_file.stop()
+        self.tempdir.cleanup()
+
+    def events(self):
+        lines = self.out.getvalue().splitlines()
+        self.out.seek(0)
+        self.out.truncate()
+        return [json.loads(line) for line in lines]
+
+    def testParkChecked_EmitsOpeningsAndClosingsSinceLastCheck(self):
+        stream = EventStream(self.out, clock=self.clock)
+        stay = {"start": "2022-06-22", "end": "2022-06-23"}
+        later = {"start": "2022-06-23", "end": "2022-06-24"}
+
+        stream.park_checked("w", 1, ParkResult(1, 3, {18621: [stay]}, "PARK"))
+        self.assertEqual(
+            self.events(),
+            [
+                {
+                    "event": "site_opened",
+                    "time": "2022-06-01T00:00:00+00:00",
+                    "watch": "w",
+                    "park_id": 1,
+                    "park_name": "PARK",
+                    "site_id": 18621,
+                    "start": "2022-06-22",
+                    "end": "2022-06-23",
+                },
+                {
+                    "event": "park_checked",
+                    "time": "2022-06-01T00:00:00+00:00",
+                    "watch": "w",
+                    "park_id": 1,
+                    "park_name": "PARK",
+                    "available": 1,
+                    "total": 3,
+                },
+            ],
+        )
+
+        stream.park_checked("w", 1, ParkResult(1, 3, {18621: [stay]}, "PARK"))
+        self.assertEqual([e["event"] for e in self.events()], ["park_checked"])
+
+        # A new process picks up where the last one left off.
+        HashStore.shared().flush()
+        HashStore._shared = None
+        stream = EventStream(self.out, clock=self.clock)
+        stream.park_checked("w", 1, ParkResult(1, 3, {18654: [later]}, "PARK"))
+        self.assertEqual(
+            [(e["event"], e.get("site_id")) for e in self.events()],
+            [("site_closed", 18621), ("site_opened", 18654), ("park_checked", None)],
+        )
+
+    def testCheckWatches_EmitsEachParkWithoutWaitingForTheRest(self):
+        first_park_emitted = threading.Event()
+
+        class Out(io.StringIO):
+            def write(self, s):
+                if '"park_checked"' in s and '"park_id":1' in s:
+                    first_park_emitted.set()
+                return super().write(s)
+
+        def get_availability(park_id, *args):
+            if park_id == 2:
+                # Only answer for the second park once the first was emitted.
+                self.assertTrue(first_park_emitted.wait(5))
+            return {"campsites": {}}
+
+        out = Out()
+        watch = Watch("w", [1, 2], datetime(2022, 6, 1), datetime(2022, 6, 3), nights=1)
+        with mock.patch.object(
+            RecreationClient, "get_availability", side_effect=get_availability
+        ), mock.patch.object(
+            RecreationClient, "get_park_name", side_effect=lambda p: "PARK {}".format(p)
+        ):
+            info_by_watch = camping.check_watches(
+                [watch], max_concurrency=2, events=EventStream(out)
+            )
+
+        events = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(
+            [(e["event"], e["park_id"]) for e in events],
+            [("park_checked", 1), ("park_checked", 2)],
+        )
+        self.assertEqual(info_by_watch["w"][2], (0, 0, {}, "PARK 2"))
+
+    def testFetchFromQueue_ReportsEachParkWhenItsPagesAreDone(self):
+        june = datetime(2022, 6, 1)
+        queue = WorkQueue(Path(self.tempdir.name) / "queue.sqlite3")
+        seen = []
+        first_park_seen = threading.Event()
+
+        def on_park(park_id, pages, name):
+            seen.append((park_id, list(pages), name))
+            first_park_seen.set()
+
+        fetch = threading.Thread(
+            target=camping.fetch_from_queue,
+            args=(queue, [(1, june), (2, june)], [1, 2]),
+            kwargs={"timeout": 5, "on_park": on_park},
+        )
+        try:
+            fetch.start()
+            while queue.counts().get("pending") != 2:
+                time.sleep(0.01)
+            park_1, park_2 = sorted(queue.claim("worker", 2))
+            queue.complete(park_1, "worker", {"campsites": {}}, "PARK 1")
+            # Park 1 is reported while park 2 is still being fetched.
+            self.assertTrue(first_park_seen.wait(5))
+            self.assertEqual(seen, [(1, [(1, june)], "PARK 1")])
+            queue.complete(park_2, "worker", {"campsites": {}}, "PARK 2")
+            fetch.join()
+        finally:
+            queue.close()
+        self.assertEqual(seen[1], (2, [(2, june)], "PARK 2"))
+
+    def testRunDaemon_EmitsEachParkWithoutWaitingForTheRest(self):
+        first_park_emitted = threading.Event()
+
+        class Out(io.StringIO):
+            def write(self, s):
+                if '"park_checked"' in s and '"park_id":1' in s:
+                    first_park_emitted.set()
+                return super().write(s)
+
+        def get_availability(park_id, *args):
+            if park_id == 2:
+                self.assertTrue(first_park_emitted.wait(5))
+            return {"campsites": {}}
+
+        class Stop(Exception):
+            pass
+
+        out = Out()
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        watch = Watch("w", [1, 2], today, today + timedelta(days=2), nights=1)
+        with mock.patch.object(
+            RecreationClient, "get_availability", side_effect=get_availability
+        ), mock.patch.object(
+            RecreationClient, "get_park_name", side_effect=lambda p: "PARK {}".format(p)
+        ), mock.patch.object(camping.time, "sleep", side_effect=Stop):
+            with self.assertRaises(Stop):
+                camping.run_daemon(
+                    [watch], {"w": []}, max_concurrency=2, events=EventStream(out)
+                )
+
+        events = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(
+            [(e["event"], e["park_id"]) for e in events],
+            [("park_checked", 1), ("park_checked", 2)],
+        )
+
+    def testGetReporters_PrintsNothingAlongsideEvents(self):
+        settings = {"print": {"enabled": True}}
+        start_date = datetime(2022, 6, 1)
+        end_date = datetime(2022, 6, 3)
+        self.assertEqual(
+            [r.name for r in camping.get_reporters(settings, start_date, end_date)],
+            ["default/print"],
+        )
+        self.assertEqual(
+            camping.get_reporters(settings, start_date, end_date, print_reports=False),
+            [],
+        )
+
+    def testRunWatches_EmitsAnErrorWhenTheCheckFails(self):
+        stream = EventStream(self.out, clock=self.clock)
+        watch = Watch("w", [1], datetime(2022, 6, 1), datetime(2022, 6, 3))
+        with mock.patch.object(
+            RecreationClient, "get_availability", side_effect=RuntimeError("boom")
+        ), mock.patch.object(RecreationClient, "get_park_name", return_value="PARK"):
+            with self.assertRaises(RuntimeError):
+                camping.run_watches([watch], {"w": []}, events=stream)
+
+        self.assertEqual(
+            self.events(),
+            [
+                {
+                    "event": "error",
+                    "time": "2022-06-01T00:00:00+00:00",
+                    "message": "Failed to check watches: RuntimeError('boom')",
+                }
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from datetime import date
+
+from availability import StayRun, StayWindows
+from formatters import compress_dates
+
+
+class TestFormatters(unittest.TestCase):
+    def testCompressDates_MergesBackToBackNights(self):
+        dates = [
+            {"start": "2022-06-01", "end": "2022-06-02"},
+            {"start": "2022-06-02", "end": "2022-06-03"},
+            {"start": "2022-06-05", "end": "2022-06-06"},
+            {"start": "2022-06-08", "end": "2022-06-09"},
+            {"start": "2022-06-09", "end": "2022-06-10"},
+        ]
+        self.assertEqual(
+            compress_dates(dates),
+            [
+                {"start": "2022-06-01", "end": "2022-06-03", "length": "2"},
+                {"start": "2022-06-05", "end": "2022-06-06", "length": "1"},
+                {"start": "2022-06-08", "end": "2022-06-10", "length": "2"},
+            ],
+        )
+
+    def testCompressDates_MergesOverlappingStays(self):
+        dates = [
+            {"start": "2022-06-01", "end": "2022-06-03"},
+            {"start": "2022-06-02", "end": "2022-06-04"},
+            {"start": "2022-06-10", "end": "2022-06-12"},
+        ]
+        self.assertEqual(
+            compress_dates(dates),
+            [
+                {"start": "2022-06-01", "end": "2022-06-04", "length": "3"},
+                {"start": "2022-06-10", "end": "2022-06-12", "length": "2"},
+            ],
+        )
+        self.assertEqual(compress_dates([]), [])
+
+    def testCompressDates_StayWindowsMatchExpandedStays(self):
+        first = date(2022, 6, 1).toordinal()
+        stays = StayWindows([StayRun(first, 3, 2), StayRun(first + 10, 1, 2)])
+        self.assertEqual(compress_dates(stays), compress_dates(list(stays)))
+        self.assertEqual(
+            compress_dates(stays)[0],
+            {"start": "2022-06-01", "end": "2022-06-05", "length": "4"},
+        )
+
+    def testCompressDates_StayWindowsOfSeveralLengths(self):
+        first = date(2022, 6, 1).toordinal()
+        stays = StayWindows(
+            [StayRun(first, 3, 1), StayRun(first, 2, 2), StayRun(first + 5, 1, 2)]
+        )
+        self.assertEqual(compress_dates(stays), compress_dates(list(stays)))
+        self.assertEqual(
+            compress_dates(stays),
+            [
+                {"start": "2022-06-01", "end": "2022-06-04", "length": "3"},
+                {"start": "2022-06-06", "end": "2022-06-08", "length": "2"},
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
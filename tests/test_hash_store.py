@@ -0,0 +1,54 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from hash_store import HashStore
+
+
+class TestHashStore(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tempdir.name) / "hashes.json"
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def testCheckAndSave_OnlyWritesOnFlush(self):
+        store = HashStore(self.path)
+        self.assertTrue(store.check_and_save("a/print/classic", "hello"))
+        self.assertFalse(store.check_and_save("a/print/classic", "hello"))
+        self.assertFalse(self.path.exists())
+
+        store.flush()
+        self.assertTrue(self.path.exists())
+        self.assertFalse(HashStore(self.path).check_and_save("a/print/classic", "hello"))
+
+    def testFlush_MergesWithOtherProcesses(self):
+        first = HashStore(self.path)
+        second = HashStore(self.path)
+        first.save_snapshot("a/print/classic", [[1, 2, "x", "y"]])
+        second.save_snapshot("b/print/classic", [[3, 4, "x", "y"]])
+        first.flush()
+        second.flush()
+
+        stored = json.loads(self.path.read_text())
+        self.assertEqual(stored["a/print/classic"]["snapshot"], [[1, 2, "x", "y"]])
+        self.assertEqual(stored["b/print/classic"]["snapshot"], [[3, 4, "x", "y"]])
+        self.assertEqual(
+            second.get_snapshot("a/print/classic"), [[1, 2, "x", "y"]]
+        )
+
+    def testFlush_LeavesNoTemporaryFiles(self):
+        store = HashStore(self.path)
+        store.check_and_save("a", "hello")
+        store.flush()
+        store.flush()
+        self.assertEqual(
+            sorted(p.name for p in Path(self.tempdir.name).iterdir()),
+            ["hashes.json", "hashes.json.lock"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import tempfile
+import unittest
+from datetime import date, datetime
+from pathlib import Path
+
+from clients.recreation_client import RecreationClient
+from history_store import AVAILABLE, UNAVAILABLE, HistoryStore, Transition
+
+
+def page(dates_by_site, campsite_type="STANDARD"):
+    return {
+        "campsites": {
+            str(site_id): {
+                "campsite_id": str(site_id),
+                "campsite_type": campsite_type,
+                "availabilities": {
+                    "2022-06-{:02d}T00:00:00Z".format(day): "Available" for day in days
+                },
+            }
+            for site_id, days in dates_by_site.items()
+        }
+    }
+
+
+class TestHistoryStore(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.now = datetime(2022, 6, 1, 9).timestamp()
+        self.store = HistoryStore(
+            Path(self.tempdir.name) / "history.sqlite3", clock=lambda: self.now
+        )
+        self.june = datetime(2022, 6, 1)
+
+    def tearDown(self):
+        self.store.close()
+        self.tempdir.cleanup()
+
+    def testRecord_OnlyRecordsChangesAfterTheFirstSighting(self):
+        self.assertEqual(self.store.record(1, self.june, page({10: [1, 2]})), 0)
+        self.assertEqual(self.store.record(1, self.june, page({10: [1, 2]})), 0)
+
+        self.now += 60
+        self.assertEqual(self.store.record(1, self.june, page({10: [2, 5]})), 2)
+        self.assertEqual(
+            list(self.store.transitions(park_id=1)),
+            [
+                Transition("1", 10, date(2022, 6, 1), AVAILABLE, UNAVAILABLE, self.now),
+                Transition("1", 10, date(2022, 6, 5), UNAVAILABLE, AVAILABLE, self.now),
+            ],
+        )
+        self.assertEqual(list(self.store.transitions(park_id=2)), [])
+        self.assertEqual(
+            len(list(self.store.transitions(new_state=AVAILABLE))), 1
+        )
+
+    def testRecord_SkipsCampsitesFilteredOutWhileParsing(self):
+        self.store.record(1, self.june, page({10: [1]}), campsite_type="STANDARD")
+        # The dates of the other type were never parsed, so losing them
+        # isn't a change.
+        self.store.record(1, self.june, page({10: []}), campsite_type="GROUP")
+        self.store.record(1, self.june, page({10: [1]}), campsite_ids=(11,))
+        self.assertEqual(list(self.store.transitions()), [])
+
+    def testReleaseHistogram_CountsOpenings(self):
+        self.store.record(1, self.june, page({10: [], 11: []}))
+        self.now = datetime(2022, 6, 1, 7, 30).timestamp()
+        self.store.record(1, self.june, page({10: [3], 11: [3, 4]}))
+        self.now = datetime(2022, 6, 2, 18, 0).timestamp()
+        self.store.record(1, self.june, page({10: [3, 20], 11: []}))
+
+        self.assertEqual(self.store.release_histogram("hour"), {7: 3, 18: 1})
+        self.assertEqual(
+            self.store.release_histogram("lead_days"), {2: 2, 3: 1, 18: 1}
+        )
+        self.assertEqual(self.store.release_histogram("weekday"), {2: 3, 3: 1})
+        self.assertEqual(self.store.release_histogram("month"), {"2022-06": 4})
+        self.assertEqual(
+            self.store.release_histogram(
+                "hour", since=datetime(2022, 6, 2).timestamp()
+            ),
+            {18: 1},
+        )
+
+    def testRecordHistory_FeedsTheStoreFromTheClient(self):
+        RecreationClient.use_history_store(self.store)
+        try:
+            RecreationClient.record_history(1, self.june, page({10: [1]}))
+            RecreationClient.record_history(1, self.june, page({10: []}))
+        finally:
+            RecreationClient.use_history_store(None)
+        self.assertEqual(len(list(self.store.transitions())), 1)
+
+    def testPrune_RemovesOldTransitions(self):
+        self.store.record(1, self.june, page({10: []}))
+        self.store.record(1, self.june, page({10: list(range(1, 31))}))
+        self.assertEqual(self.store.prune(self.now + 1), 30)
+        self.assertEqual(list(self.store.transitions()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
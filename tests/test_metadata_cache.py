@@ -0,0 +1,60 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from metadata_cache import MetadataCache
+
+
+class TestMetadataCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tempdir.name) / "metadata.sqlite3"
+        self.now = 1000.0
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def openCache(self, ttl=100):
+        return MetadataCache(self.path, ttl=ttl, clock=lambda: self.now)
+
+    def testPut_PersistsAcrossInstances(self):
+        cache = self.openCache()
+        cache.put(MetadataCache.CAMPGROUND, 232447, "UPPER PINES")
+        cache.put(MetadataCache.CAMPSITE, 18621, {"campsite_name": "001"})
+        cache.close()
+
+        cache = self.openCache()
+        self.assertEqual(cache.get(MetadataCache.CAMPGROUND, 232447), "UPPER PINES")
+        self.assertEqual(cache.get(MetadataCache.CAMPGROUND, "232447"), "UPPER PINES")
+        self.assertEqual(
+            cache.get(MetadataCache.CAMPSITE, 18621), {"campsite_name": "001"}
+        )
+
+    def testGet_IgnoresExpiredEntries(self):
+        cache = self.openCache()
+        cache.put(MetadataCache.CAMPGROUND, 1, "OLD PARK")
+        cache.close()
+
+        self.now += 101
+        cache = self.openCache()
+        self.assertIsNone(cache.get(MetadataCache.CAMPGROUND, 1))
+
+    def testInvalidate_ByKindAndKey(self):
+        cache = self.openCache()
+        cache.put(MetadataCache.CAMPGROUND, 1, "PARK 1")
+        cache.put(MetadataCache.CAMPGROUND, 2, "PARK 2")
+        cache.put(MetadataCache.CAMPSITE, 3, {})
+
+        self.assertEqual(cache.invalidate(MetadataCache.CAMPGROUND, 1), 1)
+        self.assertIsNone(cache.get(MetadataCache.CAMPGROUND, 1))
+        self.assertEqual(cache.get(MetadataCache.CAMPGROUND, 2), "PARK 2")
+
+        self.assertEqual(cache.invalidate(), 2)
+        cache.close()
+        cache = self.openCache()
+        self.assertIsNone(cache.get(MetadataCache.CAMPGROUND, 2))
+        self.assertIsNone(cache.get(MetadataCache.CAMPSITE, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import tempfile
+import unittest
+import urllib.request
+from pathlib import Path
+
+from metrics import Histogram, Metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def testInc_CountsPerLabels(self):
+        metrics = Metrics()
+        metrics.inc("requests_total", endpoint="availability", status=200)
+        metrics.inc("requests_total", endpoint="availability", status=200)
+        metrics.inc("requests_total", endpoint="availability", status=429)
+
+        self.assertEqual(metrics.counter("requests_total", endpoint="availability", status="200"), 2)
+        self.assertEqual(metrics.counter("requests_total", status="429", endpoint="availability"), 1)
+        self.assertEqual(metrics.counter("requests_total", endpoint="campground", status="200"), 0)
+
+    def testTimed_RecordsStageEvenOnError(self):
+        ticks = iter([1.0, 1.5, 2.0, 4.0])
+        metrics = Metrics(clock=lambda: next(ticks))
+        with metrics.timed("decode"):
+            pass
+        with self.assertRaises(ValueError):
+            with metrics.timed("decode"):
+                raise ValueError()
+
+        histogram = metrics.histogram("stage_seconds", stage="decode")
+        self.assertEqual(histogram.count, 2)
+        self.assertEqual(histogram.sum, 2.5)
+        self.assertEqual(histogram.max, 2.0)
+
+    def testHistogram_Quantile(self):
+        histogram = Histogram((0.1, 1.0, 10.0))
+        for value in [0.05] * 9 + [5.0]:
+            histogram.observe(value)
+        self.assertEqual(histogram.quantile(0.5), 0.1)
+        self.assertEqual(histogram.quantile(0.95), 5.0)
+
+    def testToPrometheus(self):
+        metrics = Metrics()
+        metrics.inc("rate_limited_total", endpoint="availability")
+        metrics.observe("request_seconds", 0.02, endpoint="availability")
+        text = metrics.to_prometheus()
+
+        self.assertIn("# TYPE campsite_checker_rate_limited_total counter", text)
+        self.assertIn('campsite_checker_rate_limited_total{endpoint="availability"} 1', text)
+        self.assertIn("# TYPE campsite_checker_request_seconds histogram", text)
+        self.assertIn(
+            'campsite_checker_request_seconds_bucket{endpoint="availability",le="0.01"} 0', text
+        )
+        self.assertIn(
+            'campsite_checker_request_seconds_bucket{endpoint="availability",le="0.025"} 1', text
+        )
+        self.assertIn(
+            'campsite_checker_request_seconds_bucket{endpoint="availability",le="+Inf"} 1', text
+        )
+        self.assertIn('campsite_checker_request_seconds_count{endpoint="availability"} 1', text)
+
+    def testWritePrometheus(self):
+        metrics = Metrics()
+        metrics.inc("cycles_total")
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = Path(tempdir) / "campsite_checker.prom"
+            metrics.write_prometheus(path)
+            self.assertIn("campsite_checker_cycles_total 1", path.read_text())
+            self.assertEqual([p.name for p in Path(tempdir).iterdir()], [path.name])
+
+    def testServePrometheus(self):
+        metrics = Metrics()
+        metrics.inc("cycles_total")
+        httpd = metrics.serve_prometheus(0)
+        try:
+            url = "http://127.0.0.1:{}/metrics".format(httpd.server_address[1])
+            with urllib.request.urlopen(url) as resp:
+                self.assertIn(b"campsite_checker_cycles_total 1", resp.read())
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+
+    def testSummary(self):
+        metrics = Metrics()
+        metrics.observe("stage_seconds", 0.25, stage="fetch")
+        metrics.inc("cache_requests_total", cache="availability", result="miss")
+        summary = metrics.summary()
+
+        self.assertIn('stage_seconds{stage="fetch"}', summary)
+        self.assertIn('cache_requests_total{cache="availability",result="miss"}', summary)
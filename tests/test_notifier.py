@@ -67,5 +67,19 @@ class TestNotifier(unittest.TestCase):
         self.assertEqual(expected, availability_strings)
 
 
+    def testGenerateAvailabilityString_EventStream(self):
+        lines = [
+            '{"event":"site_opened","watch":"w","park_id":1000,"park_name":"SOME PARK",'
+            '"site_id":18621,"start":"2022-06-22","end":"2022-06-23"}',
+            '{"event":"park_checked","watch":"w","park_id":1000,"park_name":"SOME PARK",'
+            '"available":2,"total":3}',
+            '{"event":"park_checked","watch":"w","park_id":1001,"park_name":"OTHER PARK",'
+            '"available":0,"total":3}',
+        ]
+        availability_strings = notifier.generate_availability_strings(lines)
+        expected = ["2 site(s) available in SOME PARK (1000)"]
+        self.assertEqual(expected, availability_strings)
+
+
 if __name__ == "__main__":
     unittest.main()
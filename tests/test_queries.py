@@ -0,0 +1,147 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+
+import camping
+from availability import AvailabilityMatrix
+from queries import StayQuery, find_stays, merge_stays
+
+# 2022-06-24 is a Friday.
+START = datetime(2022, 6, 20)
+FRI, SAT = 4, 5
+
+
+def expand(stays_by_site):
+    """
+    Lists the stays of each site as (first night's day ordinal, nights).
+    """
+    return {
+        site: [(d.first, d.nights) for d in stays] for site, stays in stays_by_site.items()
+    }
+
+
+class TestQueries(unittest.TestCase):
+    def setUp(self):
+        first = START.toordinal()
+        # Site 1 is available from Monday 6/20 to Sunday 6/26 (7 nights),
+        # site 2 on 6/24 only and site 3 never.
+        self.matrix = AvailabilityMatrix(first, {"1": 0b1111111, "2": 0b10000, "3": 0})
+        self.first = first
+
+    def testFindStays_NightsRange(self):
+        [stays_by_site] = find_stays(
+            self.matrix, [StayQuery(6, 7)], START, START + timedelta(days=10)
+        )
+        self.assertEqual(
+            expand(stays_by_site),
+            {"1": [(self.first, 6), (self.first, 7), (self.first + 1, 6)]},
+        )
+
+    def testFindStays_ArrivalWeekdays(self):
+        [stays_by_site] = find_stays(
+            self.matrix,
+            [StayQuery(1, 2, frozenset([FRI, SAT]))],
+            START,
+            START + timedelta(days=10),
+        )
+        self.assertEqual(
+            stays_by_site["1"],
+            [
+                {"start": "2022-06-24", "end": "2022-06-25"},
+                {"start": "2022-06-24", "end": "2022-06-26"},
+                {"start": "2022-06-25", "end": "2022-06-26"},
+                {"start": "2022-06-25", "end": "2022-06-27"},
+            ],
+        )
+        self.assertEqual(expand(stays_by_site)["2"], [(self.first + 4, 1)])
+
+    def testFindStays_Windows(self):
+        query = StayQuery(
+            2,
+            2,
+            windows=(
+                (datetime(2022, 6, 1), datetime(2022, 6, 22)),
+                (datetime(2022, 6, 25), datetime(2022, 7, 5)),
+            ),
+        )
+        [stays_by_site] = find_stays(
+            self.matrix, [query], START, START + timedelta(days=10)
+        )
+        # 6/20-6/22 fits the first window, 6/25-6/27 the second one.
+        self.assertEqual(
+            expand(stays_by_site), {"1": [(self.first, 2), (self.first + 5, 2)]}
+        )
+
+    def testFindStays_OverlappingWindowsDontRepeatStays(self):
+        query = StayQuery(
+            1,
+            2,
+            windows=(
+                (datetime(2022, 6, 20), datetime(2022, 6, 24)),
+                (datetime(2022, 6, 22), datetime(2022, 6, 25)),
+            ),
+        )
+        [stays_by_site] = find_stays(
+            self.matrix, [query], START, START + timedelta(days=10)
+        )
+        # Stays from both windows, every one of them once, in order.
+        self.assertEqual(
+            expand(stays_by_site)["1"],
+            [
+                (self.first, 1),
+                (self.first, 2),
+                (self.first + 1, 1),
+                (self.first + 1, 2),
+                (self.first + 2, 1),
+                (self.first + 2, 2),
+                (self.first + 3, 1),
+                (self.first + 3, 2),
+                (self.first + 4, 1),
+            ],
+        )
+        # Only one run per length, however many windows the stays came from.
+        self.assertEqual(len(stays_by_site["1"].runs), 2)
+
+    def testFindStays_EvaluatesEveryQuery(self):
+        results = find_stays(
+            self.matrix,
+            [StayQuery(8, 9), StayQuery(1, 1, frozenset([FRI]))],
+            START,
+            START + timedelta(days=10),
+        )
+        self.assertEqual(results[0], {})
+        self.assertEqual(
+            expand(merge_stays(results)),
+            {"1": [(self.first + 4, 1)], "2": [(self.first + 4, 1)]},
+        )
+
+    def testMergeStays_CombinesOverlappingQueries(self):
+        results = find_stays(
+            self.matrix,
+            [StayQuery(1, 2), StayQuery(2, 3, frozenset([FRI]))],
+            START,
+            START + timedelta(days=10),
+        )
+        merged = expand(merge_stays(results))["1"]
+        self.assertEqual(merged, sorted(set(merged)))
+        self.assertIn((self.first + 4, 3), merged)
+        self.assertEqual(len([s for s in merged if s[1] == 2]), 6)
+
+    def testFindStays_MatchesGetNumAvailableSites(self):
+        rng = random.Random(0)
+        first = START.toordinal()
+        for _ in range(50):
+            matrix = AvailabilityMatrix(
+                first, {str(site): rng.getrandbits(60) for site in range(5)}
+            )
+            start_date = START + timedelta(days=rng.randint(0, 20))
+            end_date = start_date + timedelta(days=rng.randint(1, 40))
+            nights = rng.randint(1, (end_date - start_date).days)
+
+            expected = camping.get_num_available_sites(
+                matrix, start_date, end_date, nights=nights
+            )
+            actual = camping.get_available_stays(
+                matrix, start_date, end_date, [StayQuery(nights, nights)]
+            )
+            self.assertEqual(actual, expected)
@@ -0,0 +1,71 @@
+import unittest
+from datetime import datetime, timezone
+
+from clients.rate_limiter import TokenBucket, backoff_delay, parse_retry_after
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestRateLimiter(unittest.TestCase):
+    def testTokenBucket_WaitsForTokensOnceBurstIsSpent(self):
+        clock = FakeClock()
+        bucket = TokenBucket(2.0, clock=clock, sleep=clock.sleep)
+
+        for _ in range(2):
+            bucket.acquire()
+        self.assertEqual(clock.now, 0.0)
+
+        bucket.acquire()
+        self.assertAlmostEqual(clock.now, 0.5)
+
+    def testTokenBucket_PenalizeAndRewardAdaptRate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(10.0, clock=clock, sleep=clock.sleep)
+
+        bucket.penalize()
+        self.assertEqual(bucket.rate, 5.0)
+        for _ in range(100):
+            bucket.reward()
+        self.assertEqual(bucket.rate, 10.0)
+
+    def testTokenBucket_DeferHoldsBackCallers(self):
+        clock = FakeClock()
+        bucket = TokenBucket(1.0, clock=clock, sleep=clock.sleep)
+
+        bucket.defer(3.0)
+        bucket.acquire()
+        self.assertAlmostEqual(clock.now, 3.0)
+
+    def testBackoffDelay_IsJitteredAndCapped(self):
+        self.assertEqual(backoff_delay(3, 0.5, 30.0, rand=lambda: 1.0), 4.0)
+        self.assertEqual(backoff_delay(10, 0.5, 30.0, rand=lambda: 1.0), 30.0)
+        self.assertEqual(backoff_delay(10, 0.5, 30.0, rand=lambda: 0.0), 0.0)
+
+    def testParseRetryAfter_SecondsAndHttpDate(self):
+        now = datetime(2022, 6, 22, 12, 0, 0, tzinfo=timezone.utc)
+        self.assertEqual(parse_retry_after("7"), 7.0)
+        self.assertEqual(
+            parse_retry_after("Wed, 22 Jun 2022 12:00:05 GMT", now=now), 5.0
+        )
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+
+    def testParseRetryAfter_Capped(self):
+        now = datetime(2022, 6, 22, 12, 0, 0, tzinfo=timezone.utc)
+        self.assertEqual(parse_retry_after("86400", cap=30.0), 30.0)
+        self.assertEqual(
+            parse_retry_after("Wed, 22 Jun 2033 12:00:05 GMT", now=now, cap=30.0), 30.0
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
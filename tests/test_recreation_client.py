@@ -0,0 +1,201 @@
+import json
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from availability_cache import AvailabilityCache
+from clients.recreation_client import RecreationClient
+from metadata_cache import MetadataCache
+from metrics import Metrics
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        body = json.dumps({"campground": {"facility_name": "SOME PARK"}}).encode()
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.server.not_modified += 1
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header("ETag", '"v1"')
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestRecreationClient(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.statuses = []
+        self.server.not_modified = 0
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = "http://127.0.0.1:{}/api".format(self.server.server_address[1])
+        self.pool_size = RecreationClient.POOL_SIZE
+        self.rate_limit = RecreationClient.RATE_LIMIT
+        RecreationClient.configure_pool(2)
+        RecreationClient.configure_rate_limit(1000.0)
+        self.backoff_base = RecreationClient.BACKOFF_BASE
+        RecreationClient.BACKOFF_BASE = 0.0
+
+    def tearDown(self):
+        RecreationClient.BACKOFF_BASE = self.backoff_base
+        RecreationClient.configure_rate_limit(self.rate_limit)
+        RecreationClient.configure_pool(self.pool_size)
+        self.server.shutdown()
+        self.server.server_close()
+
+    def testSendRequest_ReusesConnections(self):
+        for _ in range(5):
+            resp = RecreationClient._send_request(self.url, {})
+            self.assertEqual(resp["campground"]["facility_name"], "SOME PARK")
+
+        stats = RecreationClient.connection_stats()
+        self.assertEqual(stats["requests"], 5)
+        self.assertEqual(stats["new_connections"], 1)
+        self.assertEqual(stats["reused_connections"], 4)
+
+    def testSendRequest_RetriesRateLimitedAndServerErrors(self):
+        self.server.statuses = [429, 503, 429]
+        resp = RecreationClient._send_request(self.url, {})
+        self.assertEqual(resp["campground"]["facility_name"], "SOME PARK")
+        self.assertEqual(RecreationClient.connection_stats()["requests"], 4)
+
+    def testSendRequest_RecordsMetrics(self):
+        metrics = Metrics.shared()
+        metrics.reset()
+        self.server.statuses = [429, 503]
+        RecreationClient._send_request(self.url, {}, endpoint="campground")
+
+        self.assertEqual(metrics.counter("retries_total", endpoint="campground"), 2)
+        self.assertEqual(metrics.counter("rate_limited_total", endpoint="campground"), 1)
+        self.assertEqual(
+            metrics.counter("requests_total", endpoint="campground", status="200"), 1
+        )
+        self.assertGreater(
+            metrics.counter("downloaded_bytes_total", endpoint="campground"), 0
+        )
+        self.assertEqual(metrics.histogram("request_seconds", endpoint="campground").count, 3)
+
+    def testGetAvailabilityCounts_ChunksParks(self):
+        def search(url, params, endpoint):
+            ids = params["fq"][len("asset_id:(") : -1].split(" OR ")
+            return {
+                "results": [
+                    {"entity_id": i, "availability_counts": {"Available": int(i) % 2, "Reserved": 5}}
+                    for i in ids
+                    if i != "3"
+                ]
+            }
+
+        send_request = mock.Mock(side_effect=search)
+        chunk_size = RecreationClient.SEARCH_CHUNK_SIZE
+        RecreationClient.SEARCH_CHUNK_SIZE = 2
+        try:
+            with mock.patch.object(RecreationClient, "_send_request", send_request):
+                counts = RecreationClient.get_availability_counts(
+                    [1, 2, 3, "4"], datetime(2022, 6, 1), datetime(2022, 6, 5)
+                )
+        finally:
+            RecreationClient.SEARCH_CHUNK_SIZE = chunk_size
+
+        self.assertEqual(send_request.call_count, 2)
+        params = send_request.call_args_list[0][0][1]
+        self.assertEqual(params["fq"], "asset_id:(1 OR 2)")
+        self.assertEqual(params["start_date"], "2022-06-01T00:00:00.000Z")
+        self.assertEqual(params["end_date"], "2022-06-05T00:00:00.000Z")
+        self.assertEqual(counts, {1: (1, 6), 2: (0, 5), "4": (0, 5)})
+
+    def testGetSiteSummary_UsesAvailabilityResponses(self):
+        data = {
+            "campsites": {
+                "90001": {
+                    "availabilities": {},
+                    "campsite_id": "90001",
+                    "campsite_type": "STANDARD NONELECTRIC",
+                    "site": "A01",
+                }
+            }
+        }
+        get_site_attributes = mock.Mock(
+            side_effect=lambda site_id: {"campsite_name": "X", "campsite_type": "Y"}
+        )
+        with mock.patch.object(
+            RecreationClient, "_get_availability", mock.Mock(return_value=data)
+        ), mock.patch.object(
+            RecreationClient, "get_site_attributes", get_site_attributes
+        ):
+            RecreationClient.get_availability(1, datetime(2022, 6, 1))
+            RecreationClient.prefetch_site_attributes([90001, 90002, 90003, 90002])
+            summary = RecreationClient.get_site_summary(90001)
+
+        self.assertEqual(
+            summary,
+            {"campsite_name": "A01", "campsite_type": "STANDARD NONELECTRIC"},
+        )
+        self.assertEqual(
+            sorted(c[0][0] for c in get_site_attributes.call_args_list), [90002, 90003]
+        )
+
+    def testSendRequest_GivesUpAfterMaxAttempts(self):
+        self.server.statuses = [503] * RecreationClient.MAX_ATTEMPTS
+        with self.assertRaises(RuntimeError):
+            RecreationClient._send_request(self.url, {})
+
+    def testSendRequest_DoesNotRetryClientErrors(self):
+        self.server.statuses = [404]
+        with self.assertRaises(RuntimeError):
+            RecreationClient._send_request(self.url, {})
+        self.assertEqual(RecreationClient.connection_stats()["requests"], 1)
+
+    def testGetAvailability_RevalidatesCachedMonths(self):
+        endpoint = RecreationClient.AVAILABILITY_ENDPOINT
+        RecreationClient.AVAILABILITY_ENDPOINT = self.url + "/{park_id}/month"
+        with tempfile.TemporaryDirectory() as tempdir:
+            cache = AvailabilityCache(Path(tempdir) / "availability.sqlite3")
+            RecreationClient.use_availability_cache(cache)
+            try:
+                first = RecreationClient.get_availability(1, datetime(2022, 6, 1))
+                second = RecreationClient.get_availability(1, datetime(2022, 6, 1))
+            finally:
+                RecreationClient.use_availability_cache(None)
+                RecreationClient.AVAILABILITY_ENDPOINT = endpoint
+                cache.close()
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.server.not_modified, 1)
+
+    def testGetParkName_UsesMetadataCache(self):
+        endpoint = RecreationClient.MAIN_PAGE_ENDPOINT
+        RecreationClient.MAIN_PAGE_ENDPOINT = self.url + "/{park_id}"
+        with tempfile.TemporaryDirectory() as tempdir:
+            cache = MetadataCache(Path(tempdir) / "metadata.sqlite3")
+            RecreationClient.use_metadata_cache(cache)
+            try:
+                names = [RecreationClient.get_park_name(1) for _ in range(3)]
+            finally:
+                RecreationClient.use_metadata_cache(None)
+                RecreationClient.MAIN_PAGE_ENDPOINT = endpoint
+                cache.close()
+
+        self.assertEqual(names, ["SOME PARK"] * 3)
+        self.assertEqual(RecreationClient.connection_stats()["requests"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from clients.recreation_client import RecreationClient
+from clients.replay import RecordingAdapter, ReplayAdapter, ReplayMissError
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.requests += 1
+        body = json.dumps({"campground": {"facility_name": self.path}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.requests = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = "http://127.0.0.1:{}/api".format(self.server.server_address[1])
+        RecreationClient.configure_rate_limit(1000.0)
+
+    def tearDown(self):
+        RecreationClient.use_adapter(None)
+        RecreationClient.configure_rate_limit(10.0)
+        self.server.shutdown()
+        self.server.server_close()
+
+    def testReplay_ServesRecordedResponses(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            archive = Path(tempdir) / "session.jsonl.gz"
+            recorder = RecordingAdapter(archive)
+            RecreationClient.use_adapter(recorder)
+            recorded = [
+                RecreationClient._send_request(self.url, {"park": p}) for p in (1, 2)
+            ]
+            recorder.close_archive()
+            self.assertEqual(self.server.requests, 2)
+
+            sleeps = []
+            replay = ReplayAdapter(archive, timing=True, sleep=sleeps.append)
+            RecreationClient.use_adapter(replay)
+            replayed = [
+                RecreationClient._send_request(self.url, {"park": p}) for p in (2, 1, 1)
+            ]
+            with self.assertRaises(ReplayMissError):
+                RecreationClient._send_request(self.url, {"park": 3})
+
+        self.assertEqual(len(replay), 2)
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(replayed, [recorded[1], recorded[0], recorded[0]])
+        self.assertEqual(
+            recorded[0], {"campground": {"facility_name": "/api?park=1"}}
+        )
+        self.assertEqual(len(sleeps), 3)
+
+    def testReplay_LoadsArchivesThatWereNeverFinished(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            archive = Path(tempdir) / "session.jsonl.gz"
+            recorder = RecordingAdapter(archive)
+            RecreationClient.use_adapter(recorder)
+            recorded = [
+                RecreationClient._send_request(self.url, {"park": p}) for p in (1, 2)
+            ]
+            # As if we'd been killed: the archive has no gzip trailer.
+            unfinished = Path(tempdir) / "unfinished.jsonl.gz"
+            shutil.copy(str(archive), str(unfinished))
+            recorder.close_archive()
+
+            replay = ReplayAdapter(unfinished)
+            RecreationClient.use_adapter(replay)
+            replayed = [
+                RecreationClient._send_request(self.url, {"park": p}) for p in (1, 2)
+            ]
+            self.assertEqual(replayed, recorded)
+
+            # Cut off in the middle of the last exchange.
+            truncated = Path(tempdir) / "truncated.jsonl.gz"
+            truncated.write_bytes(unfinished.read_bytes()[:-20])
+            self.assertEqual(len(ReplayAdapter(truncated)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+from datetime import datetime
+
+from scheduler import PollScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = PollScheduler(clock=self.clock)
+        self.today = datetime(2022, 6, 15)
+        self.june = datetime(2022, 6, 1)
+        self.december = datetime(2022, 12, 1)
+
+    def testMonthSlowdown_PollsFarMonthsLessOften(self):
+        self.assertEqual(PollScheduler.month_slowdown(self.june, self.today), 1)
+        self.assertEqual(
+            PollScheduler.month_slowdown(datetime(2022, 7, 1), self.today), 1
+        )
+        self.assertEqual(
+            PollScheduler.month_slowdown(datetime(2022, 8, 1), self.today), 2
+        )
+        self.assertEqual(
+            PollScheduler.month_slowdown(self.december, self.today), 8
+        )
+
+    def testDue_NewPagesAreDueImmediatelyThenWaitForInterval(self):
+        self.scheduler.set_watch("a", [(1, self.june), (1, self.december)], 60)
+        self.assertEqual(
+            self.scheduler.due(), {(1, self.june), (1, self.december)}
+        )
+
+        self.scheduler.mark_fetched(self.scheduler.due(), self.today)
+        self.assertEqual(self.scheduler.due(), set())
+        self.assertEqual(self.scheduler.seconds_until_due(), 60)
+
+        self.clock.now = 60
+        self.assertEqual(self.scheduler.due(), {(1, self.june)})
+        self.clock.now = 480
+        self.assertEqual(
+            self.scheduler.due(), {(1, self.june), (1, self.december)}
+        )
+
+    def testSetWatch_OverlappingWatchesShareTheFastestSchedule(self):
+        self.scheduler.set_watch("slow", [(1, self.june), (2, self.june)], 300)
+        self.scheduler.set_watch("fast", [(1, self.june)], 30)
+        self.assertEqual(len(self.scheduler.due()), 2)
+
+        self.scheduler.mark_fetched(self.scheduler.due(), self.today)
+        self.clock.now = 30
+        self.assertEqual(self.scheduler.due(), {(1, self.june)})
+        self.assertEqual(
+            self.scheduler.watches_for({(1, self.june)}), {"slow", "fast"}
+        )
+
+    def testSetWatch_ForgetsPagesNoWatchNeeds(self):
+        self.scheduler.set_watch("a", [(1, self.june)], 60)
+        self.scheduler.set_watch("a", [(1, self.december)], 60)
+        self.assertEqual(self.scheduler.due(), {(1, self.december)})
+
+    def testRecord_PollsChangingPagesMoreOften(self):
+        busy, quiet = (1, self.june), (2, self.june)
+        self.scheduler.set_watch("a", [busy, quiet], 60)
+        self.assertEqual(self.scheduler.interval(busy, self.today), 60)
+
+        self.assertFalse(self.scheduler.record(busy, 0))
+        self.scheduler.record(quiet, 0)
+        for fingerprint in range(1, 20):
+            self.assertTrue(self.scheduler.record(busy, fingerprint))
+            self.assertFalse(self.scheduler.record(quiet, 0))
+
+        self.assertLess(self.scheduler.interval(busy, self.today), 60 / 3)
+        self.assertGreater(self.scheduler.interval(quiet, self.today), 60 * 3)
+        self.assertGreaterEqual(
+            self.scheduler.interval(busy, self.today), 60 / PollScheduler.CHURN_RANGE
+        )
+
+    def testMarkFailed_RetriesSoonWithBackoff(self):
+        key = (1, self.december)
+        self.scheduler.set_watch("a", [key], 60)
+        self.scheduler.mark_failed([key], self.today)
+        self.assertEqual(
+            self.scheduler.seconds_until_due(), PollScheduler.RETRY_BACKOFF
+        )
+        self.scheduler.mark_failed([key], self.today)
+        self.assertEqual(
+            self.scheduler.seconds_until_due(), 2 * PollScheduler.RETRY_BACKOFF
+        )
+
+        # The backoff never exceeds the page's interval, and resets once the
+        # page is fetched.
+        for _ in range(10):
+            self.scheduler.mark_failed([key], self.today)
+        self.assertEqual(self.scheduler.seconds_until_due(), 60 * 8)
+        self.scheduler.mark_fetched([key], self.today)
+        self.scheduler.mark_failed([key], self.today)
+        self.assertEqual(
+            self.scheduler.seconds_until_due(), PollScheduler.RETRY_BACKOFF
+        )
+
+    def testBudget_StretchesEveryIntervalAlike(self):
+        scheduler = PollScheduler(clock=self.clock, budget=0.05)
+        keys = [(park, self.june) for park in range(4)]
+        scheduler.set_watch("a", keys, 60)
+        # 4 pages every 60s is a third more than the budget.
+        self.assertAlmostEqual(scheduler.budget_scale(self.today), 4 / 60 / 0.05)
+
+        scheduler.mark_fetched(keys, self.today)
+        self.clock.now = 60
+        self.assertEqual(scheduler.due(), set())
+        self.clock.now = 60 * 4 / 60 / 0.05
+        self.assertEqual(scheduler.due(), set(keys))
+
+
+if __name__ == "__main__":
+    unittest.main()
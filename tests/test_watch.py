@@ -0,0 +1,177 @@
+import io
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from datetime import date, datetime
+from pathlib import Path
+from unittest import mock
+
+import camping
+from hash_store import HashStore
+from queries import StayQuery
+from utils.camping_argparser import CampingArgumentParser
+from watch import Watch, WatchConfigError, watches_from_settings
+
+
+class TestWatch(unittest.TestCase):
+    def setUp(self):
+        self.settings = {
+            "print": {"enabled": True},
+            "watches": [
+                {
+                    "name": "yosemite",
+                    "parks": [232447, 232450],
+                    "start_date": date(2022, 6, 1),
+                    "end_date": "2022-06-30",
+                    "nights": 2,
+                },
+                {
+                    "name": "big-bend",
+                    "parks": [234038],
+                    "start_date": date(2022, 6, 1),
+                    "end_date": date(2022, 6, 30),
+                    "campsite_ids": [6943],
+                    "weekends_only": True,
+                    "smtp": {"enabled": True, "format": "verbose_ascii"},
+                },
+            ],
+        }
+
+    def testWatchesFromSettings_ParsesEveryWatch(self):
+        watches = watches_from_settings(self.settings)
+
+        yosemite, yosemite_reporters = watches[0]
+        self.assertEqual(yosemite.name, "yosemite")
+        self.assertEqual(yosemite.parks, [232447, 232450])
+        self.assertEqual(yosemite.start_date, datetime(2022, 6, 1))
+        self.assertEqual(yosemite.end_date, datetime(2022, 6, 30))
+        self.assertEqual(yosemite.nights, 2)
+        self.assertEqual(yosemite_reporters, {"print": {"enabled": True}})
+
+        big_bend, big_bend_reporters = watches[1]
+        self.assertEqual(big_bend.campsite_ids, (6943,))
+        self.assertTrue(big_bend.weekends_only)
+        self.assertEqual(list(big_bend_reporters), ["smtp"])
+
+    def testWatchesFromSettings_SelectsByName(self):
+        watches = watches_from_settings(self.settings, ["big-bend"])
+        self.assertEqual([w.name for w, _ in watches], ["big-bend"])
+
+        with self.assertRaises(WatchConfigError):
+            watches_from_settings(self.settings, ["nope"])
+
+    def testWatchesFromSettings_RejectsInvalidWatches(self):
+        self.settings["watches"].append(dict(self.settings["watches"][0]))
+        with self.assertRaises(WatchConfigError):
+            watches_from_settings(self.settings)
+
+        with self.assertRaises(WatchConfigError):
+            Watch.from_settings({"name": "incomplete", "parks": [1]})
+
+    def testFromSettings_ParsesStays(self):
+        watch = Watch.from_settings(
+            {
+                "name": "summer",
+                "parks": [232447],
+                "start_date": "2022-06-01",
+                "end_date": "2022-09-30",
+                "stays": [
+                    {
+                        "nights": "2-3",
+                        "arrival": ["Fri", "sat"],
+                        "windows": [[date(2022, 6, 1), "2022-06-30"]],
+                    },
+                    {"nights": 5},
+                ],
+            }
+        )
+        self.assertEqual(
+            watch.stays,
+            (
+                StayQuery(
+                    2,
+                    3,
+                    frozenset([4, 5]),
+                    ((datetime(2022, 6, 1), datetime(2022, 6, 30)),),
+                ),
+                StayQuery(5, 5),
+            ),
+        )
+
+    def testFromSettings_RejectsInvalidStays(self):
+        watch_settings = dict(self.settings["watches"][0])
+        del watch_settings["nights"]
+        for stay in ({"nights": "3-2"}, {"arrival": ["someday"]}, {"nights": "two"}):
+            watch_settings["stays"] = [stay]
+            with self.assertRaises(WatchConfigError):
+                Watch.from_settings(watch_settings)
+
+        watch_settings = dict(self.settings["watches"][0], stays=[{"nights": 2}])
+        with self.assertRaises(WatchConfigError):
+            Watch.from_settings(watch_settings)
+
+    def testFromArgs_NamesTheWatchAfterTheSearch(self):
+        def from_args(*extra):
+            return Watch.from_args(
+                CampingArgumentParser().parse_args(
+                    ["--start-date", "2022-06-01", "--end-date", "2022-06-30"]
+                    + list(extra)
+                )
+            )
+
+        yosemite = from_args("--parks", "232447", "232450")
+        self.assertEqual(from_args("--parks", "232450", "232447").name, yosemite.name)
+        self.assertNotEqual(from_args("--parks", "232447").name, yosemite.name)
+        self.assertNotEqual(
+            from_args("--parks", "232447", "232450", "--nights", "2").name,
+            yosemite.name,
+        )
+
+    def testFromArgs_ParallelSearchesDoNotReReportEachOther(self):
+        def from_args(park):
+            return Watch.from_args(
+                CampingArgumentParser().parse_args(
+                    ["--start-date", "2022-06-01", "--end-date", "2022-06-03"]
+                    + ["--parks", str(park)]
+                )
+            )
+
+        def run(watch):
+            # Each cron run loads the store afresh and flushes when it's done.
+            HashStore._shared = None
+            reporters = camping.get_reporters(
+                {"print": {"enabled": True}},
+                watch.start_date,
+                watch.end_date,
+                watch_name=watch.name,
+            )
+            out = io.StringIO()
+            with redirect_stdout(out):
+                for reporter in reporters:
+                    reporter(
+                        {
+                            watch.parks[0]: (
+                                1,
+                                1,
+                                {1: [{"start": "2022-06-01", "end": "2022-06-02"}]},
+                                "PARK",
+                            )
+                        },
+                        True,
+                    )
+            HashStore.shared().flush()
+            return out.getvalue()
+
+        first, second = from_args(1), from_args(2)
+        with tempfile.TemporaryDirectory() as tempdir, mock.patch.object(
+            HashStore, "STORE_FILE", Path(tempdir) / "hashes.json"
+        ):
+            self.assertTrue(run(first))
+            self.assertTrue(run(second))
+            self.assertEqual(run(first), "")
+            self.assertEqual(run(second), "")
+        HashStore._shared = None
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,207 @@
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+import camping
+
+from benchmarks.fake_recreation_server import FakeRecreationServer, FakeServerConfig
+from clients.recreation_client import RecreationClient
+from watch import Watch
+from work_queue import FetchTask, RemoteWorkQueue, WorkQueue, WorkQueueError
+from worker import run_worker
+
+
+class TestWorkQueue(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.now = 1000.0
+        self.queue = WorkQueue(
+            Path(self.tempdir.name) / "queue.sqlite3",
+            lease=60,
+            clock=lambda: self.now,
+        )
+        self.june = FetchTask("1", datetime(2022, 6, 1))
+        self.july = FetchTask("1", datetime(2022, 7, 1))
+
+    def tearDown(self):
+        self.queue.close()
+        self.tempdir.cleanup()
+
+    def testClaim_HandsOutEachTaskOnce(self):
+        since = self.queue.submit([self.june, self.july])
+        # Submitting a queued page again doesn't queue it twice.
+        self.queue.submit([self.june])
+
+        self.assertEqual(self.queue.claim("a", 10), [self.june, self.july])
+        self.assertEqual(self.queue.claim("b", 10), [])
+
+        self.queue.complete(self.june, "a", {"campsites": {}}, "PARK")
+        self.assertEqual(
+            self.queue.results([self.june, self.july], since),
+            {("1", "2022-06"): ({"campsites": {}}, "PARK")},
+        )
+        self.assertEqual(self.queue.counts(), {"claimed": 1, "done": 1})
+
+    def testClaim_TakesOverExpiredLeases(self):
+        since = self.queue.submit([self.june])
+        self.assertEqual(self.queue.claim("a"), [self.june])
+
+        self.now += 61
+        self.assertEqual(self.queue.claim("b"), [self.june])
+        # The first worker lost the task, so its late result is ignored.
+        self.queue.complete(self.june, "a", {"campsites": {"stale": {}}}, "PARK")
+        self.queue.complete(self.june, "b", {"campsites": {}}, "PARK")
+        self.assertEqual(
+            self.queue.results([self.june], since)[self.june.key].data,
+            {"campsites": {}},
+        )
+
+    def testFail_RetriesAndThenGivesUp(self):
+        since = self.queue.submit([self.june])
+        for attempt in range(WorkQueue.MAX_ATTEMPTS):
+            self.assertEqual(self.queue.claim("a"), [self.june])
+            self.queue.fail(self.june, "a", "boom")
+        self.assertEqual(self.queue.claim("a"), [])
+
+        with self.assertRaises(WorkQueueError):
+            self.queue.results([self.june], since)
+
+        # Submitting it again starts over.
+        self.queue.submit([self.june])
+        self.assertEqual(self.queue.claim("a"), [self.june])
+
+    def testFetchFromQueue_CoordinatorsWithDifferentFiltersShareAFetch(self):
+        page = {
+            "campsites": {
+                str(site): {
+                    "campsite_id": str(site),
+                    "campsite_type": "STANDARD",
+                    "site": str(site),
+                    "availabilities": {"2022-06-22T00:00:00Z": "Available"},
+                }
+                for site in (5, 6)
+            }
+        }
+        key = ("1", datetime(2022, 6, 1))
+        results = {}
+
+        def coordinator(name, filters):
+            results[name] = camping.fetch_from_queue(
+                self.queue, [key], filters=filters, timeout=5
+            )[0][key]
+
+        coordinators = [
+            threading.Thread(target=coordinator, args=("5", {key: (None, (5,))})),
+            threading.Thread(target=coordinator, args=("all", {})),
+        ]
+        get_availability = mock.Mock(return_value=page)
+        submitted = threading.Semaphore(0)
+        submit = self.queue.submit
+
+        def submit_and_signal(tasks):
+            try:
+                return submit(tasks)
+            finally:
+                submitted.release()
+
+        with mock.patch.object(
+            RecreationClient, "get_availability", get_availability
+        ), mock.patch.object(
+            RecreationClient, "get_park_name", return_value="PARK"
+        ), mock.patch.object(self.queue, "submit", side_effect=submit_and_signal):
+            for thread in coordinators:
+                thread.start()
+            for _ in coordinators:
+                self.assertTrue(submitted.acquire(timeout=5))
+            self.assertEqual(self.queue.counts(), {"pending": 1})
+            run_worker(self.queue, "worker", exit_when_idle=True)
+            for thread in coordinators:
+                thread.join()
+
+        # One unfiltered fetch, narrowed down by each coordinator.
+        get_availability.assert_called_once_with("1", datetime(2022, 6, 1))
+        self.assertEqual(
+            results["5"]["campsites"]["6"].get("availabilities", {}), {}
+        )
+        self.assertEqual(results["5"]["campsites"]["5"]["availabilities"], {
+            "2022-06-22T00:00:00Z": "Available"
+        })
+        self.assertEqual(results["all"], page)
+
+    def testServe_OnlyListensLocallyByDefault(self):
+        httpd = self.queue.serve(0)
+        try:
+            self.assertEqual(httpd.server_address[0], "127.0.0.1")
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+
+    def testWait_TimesOut(self):
+        since = self.queue.submit([self.june])
+        with self.assertRaises(WorkQueueError):
+            self.queue.wait([self.june], since, timeout=0, sleep=lambda _: None)
+
+    def testRemoteWorkQueue_ClaimsOverHttp(self):
+        since = self.queue.submit([self.june])
+        httpd = self.queue.serve(0, host="127.0.0.1")
+        remote = RemoteWorkQueue("http://127.0.0.1:{}".format(httpd.server_address[1]))
+        try:
+            self.assertEqual(remote.claim("a", 5), [self.june])
+            remote.complete(self.june, "a", {"campsites": {}}, "PARK")
+        finally:
+            remote.close()
+            httpd.shutdown()
+            httpd.server_close()
+        self.assertEqual(
+            self.queue.wait([self.june], since, timeout=0),
+            {self.june.key: ({"campsites": {}}, "PARK")},
+        )
+
+
+class TestCoordinator(unittest.TestCase):
+    def testCheckWatches_WorkersFetchForTheCoordinator(self):
+        watch = Watch("w", [1, 2], datetime(2030, 6, 20), datetime(2030, 7, 10), nights=2)
+        base_url = RecreationClient.BASE_URL
+        metadata_cache = RecreationClient._METADATA_CACHE
+        availability_cache = RecreationClient._AVAILABILITY_CACHE
+        with tempfile.TemporaryDirectory() as tempdir, FakeRecreationServer(
+            FakeServerConfig(sites_per_park=5, available_fraction=0.5)
+        ) as fake:
+            RecreationClient.use_base_url(fake.base_url)
+            RecreationClient.use_metadata_cache(None)
+            RecreationClient.use_availability_cache(None)
+            queue = WorkQueue(Path(tempdir) / "queue.sqlite3")
+            try:
+                expected = camping.check_watches([watch])
+                fake.reset_counters()
+
+                results = {}
+                coordinator = threading.Thread(
+                    target=lambda: results.update(
+                        camping.check_watches([watch], queue=queue)
+                    )
+                )
+                coordinator.start()
+                while not queue.counts().get("pending"):
+                    time.sleep(0.01)
+                fetched = run_worker(queue, "worker", max_concurrency=2, exit_when_idle=True)
+                coordinator.join()
+            finally:
+                queue.close()
+                RecreationClient.use_base_url(base_url)
+                RecreationClient.use_metadata_cache(metadata_cache)
+                RecreationClient.use_availability_cache(availability_cache)
+
+        self.assertEqual(fetched, 4)
+        # One request per page, plus the park's name with each, since the
+        # metadata cache is off.
+        self.assertEqual(fake.requests, 8)
+        self.assertEqual(results, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,9 @@
 import argparse
 import logging
+import os
 import sys
 from datetime import datetime
+from pathlib import Path
 
 from enums.date_format import DateFormat
 
@@ -14,13 +16,11 @@ class CampingArgumentParser(argparse.ArgumentParser):
         )
         self.add_argument(
             "--start-date",
-            required=True,
             help="Start date [YYYY-MM-DD]",
             type=self.TypeConverter.date,
         )
         self.add_argument(
             "--end-date",
-            required=True,
             help="End date [YYYY-MM-DD]. You expect to leave this day, not stay the night.",
             type=self.TypeConverter.date,
         )
@@ -58,6 +58,16 @@ class CampingArgumentParser(argparse.ArgumentParser):
                 "available dates and which sites are available."
             ),
         )
+        self.add_argument(
+            "--events",
+            action="store_true",
+            help=(
+                "Write newline-delimited JSON events to stdout as soon as each "
+                "park is checked (site_opened, site_closed, park_checked and "
+                "error), instead of printing a report at the end. The twitter "
+                "notifier reads these too."
+            ),
+        )
         self.add_argument(
             "--weekends-only",
             action="store_true",
@@ -65,7 +75,169 @@ class CampingArgumentParser(argparse.ArgumentParser):
                 "Include only weekends (i.e. starting Friday or Saturday)"
             ),
         )
-        parks_group = self.add_mutually_exclusive_group(required=True)
+        self.add_argument(
+            "--max-concurrency",
+            type=self.TypeConverter.positive_int,
+            default=8,
+            help=(
+                "Maximum number of requests to recreation.gov in flight at "
+                "once (default is 8)."
+            ),
+        )
+        self.add_argument(
+            "--rate-limit",
+            type=self.TypeConverter.positive_float,
+            default=10.0,
+            help=(
+                "Maximum number of requests per second to recreation.gov "
+                "(default is 10). This is lowered automatically when "
+                "recreation.gov starts rate limiting us."
+            ),
+        )
+        self.add_argument(
+            "--no-metadata-cache",
+            action="store_true",
+            help=(
+                "Don't cache campground names and campsite attributes in "
+                "~/.campsite-checker-metadata.sqlite3."
+            ),
+        )
+        self.add_argument(
+            "--no-availability-cache",
+            action="store_true",
+            help=(
+                "Don't cache availability responses in "
+                "~/.campsite-checker-availability.sqlite3."
+            ),
+        )
+        self.add_argument(
+            "--history",
+            metavar="path",
+            nargs="?",
+            const=str(Path(os.environ["HOME"]) / ".campsite-checker-history.sqlite3"),
+            help=(
+                "Record every change in availability that is seen in this "
+                "SQLite file (default is ~/.campsite-checker-history.sqlite3), "
+                "to query with history_store.py."
+            ),
+        )
+        self.add_argument(
+            "--availability-freshness",
+            type=self.TypeConverter.positive_float,
+            default=60.0,
+            help=(
+                "Seconds to reuse a cached availability month for when "
+                "recreation.gov doesn't support conditional requests for it "
+                "(default is 60)."
+            ),
+        )
+        self.add_argument(
+            "--daemon",
+            action="store_true",
+            help=(
+                "Keep running and poll for availability instead of checking "
+                "once and exiting."
+            ),
+        )
+        self.add_argument(
+            "--interval",
+            type=self.TypeConverter.positive_float,
+            default=60.0,
+            help=(
+                "With --daemon, seconds between polls of the coming months "
+                "(default is 60). Months further out are polled less often."
+            ),
+        )
+        self.add_argument(
+            "--watches",
+            metavar="name",
+            nargs="*",
+            help=(
+                "Check the watches configured in ~/.campsite-checker.yml "
+                "instead of a single search from the command line. Pass "
+                "watch names to only check some of them."
+            ),
+        )
+        self.add_argument(
+            "--prefilter-search",
+            action="store_true",
+            help=(
+                "Ask recreation.gov's search for the parks with anything "
+                "available first, and only check those in full. Saves a lot "
+                "of requests when most parks are sold out. Not supported "
+                "with --daemon."
+            ),
+        )
+        self.add_argument(
+            "--record",
+            metavar="path",
+            help=(
+                "Save every request to recreation.gov and its response to "
+                "this gzipped archive, for replaying later with --replay. "
+                "Caches are skipped so that everything gets recorded."
+            ),
+        )
+        self.add_argument(
+            "--replay",
+            metavar="path",
+            help=(
+                "Answer every request from an archive made with --record "
+                "instead of contacting recreation.gov."
+            ),
+        )
+        self.add_argument(
+            "--replay-timing",
+            action="store_true",
+            help=(
+                "With --replay, make each response take as long as it did "
+                "when it was recorded, instead of answering at once."
+            ),
+        )
+        self.add_argument(
+            "--profile",
+            action="store_true",
+            help=(
+                "Print how long each stage took, along with request and "
+                "cache counts, to stderr when done."
+            ),
+        )
+        self.add_argument(
+            "--metrics-file",
+            metavar="path",
+            help=(
+                "Write metrics in the Prometheus text format to this file, "
+                "after every poll with --daemon."
+            ),
+        )
+        self.add_argument(
+            "--metrics-port",
+            type=self.TypeConverter.positive_int,
+            help=(
+                "With --daemon, serve metrics in the Prometheus text format "
+                "at http://localhost:<port>/metrics."
+            ),
+        )
+        self.add_argument(
+            "--coordinator",
+            metavar="path",
+            help=(
+                "Don't fetch anything from recreation.gov here: queue every "
+                "page in this SQLite file for workers (see worker.py) to "
+                "fetch, and report on what they send back."
+            ),
+        )
+        self.add_argument(
+            "--serve-queue",
+            metavar="[host:]port",
+            type=self.TypeConverter.host_port,
+            help=(
+                "With --coordinator, serve the queue to workers at "
+                "http://<host>:<port>. It's only served to this machine "
+                "unless a host is given, e.g. 0.0.0.0:8765 for every "
+                "interface; anyone who can reach it can send results."
+            ),
+        )
+        parks_group = self.add_mutually_exclusive_group()
         parks_group.add_argument(
             "--parks",
             dest="parks",
@@ -83,6 +255,42 @@ class CampingArgumentParser(argparse.ArgumentParser):
 
     def parse_args(self, args=None, namespace=None):
         args = super().parse_args(args, namespace)
+        if args.record and args.replay:
+            raise self.ArgumentCombinationError(
+                "--record can't be combined with --replay."
+            )
+        if args.serve_queue and not args.coordinator:
+            raise self.ArgumentCombinationError(
+                "--serve-queue can only be used with --coordinator."
+            )
+        if args.history and args.replay:
+            raise self.ArgumentCombinationError(
+                "--history can't be combined with --replay."
+            )
+        if args.coordinator and (args.record or args.replay):
+            raise self.ArgumentCombinationError(
+                "--coordinator can't be combined with --record or --replay."
+            )
+        if args.prefilter_search and args.daemon:
+            raise self.ArgumentCombinationError(
+                "--prefilter-search can't be combined with --daemon."
+            )
+        if args.watches is not None:
+            if args.parks or args.stdin or args.start_date or args.end_date:
+                raise self.ArgumentCombinationError(
+                    "--watches can't be combined with a search on the command line."
+                )
+            args.parks = []
+            return args
+        for required in ("start_date", "end_date"):
+            if getattr(args, required) is None:
+                self.error(
+                    "the following arguments are required: --{}".format(
+                        required.replace("_", "-")
+                    )
+                )
+        if not args.parks and not args.stdin:
+            self.error("one of the arguments --parks --stdin - is required")
         args.parks = args.parks or [p.strip() for p in sys.stdin]
         self._validate_args(args)
         return args
@@ -110,9 +318,25 @@ class CampingArgumentParser(argparse.ArgumentParser):
         def positive_int(cls, i):
             i = int(i)
             if i <= 0:
-                msg = "Not a valid number of nights: {0}".format(i)
+                msg = "Not a valid positive number: {0}".format(i)
                 raise argparse.ArgumentTypeError(msg)
             return i
 
+        @classmethod
+        def positive_float(cls, f):
+            f = float(f)
+            if f <= 0:
+                msg = "Not a valid positive number: {0}".format(f)
+                raise argparse.ArgumentTypeError(msg)
+            return f
+
+        @classmethod
+        def host_port(cls, value):
+            """
+            Parses "[host:]port", the host defaulting to this machine only.
+            """
+            host, _, port = value.rpartition(":")
+            return host or "127.0.0.1", cls.positive_int(port)
+
     class ArgumentCombinationError(Exception):
         pass
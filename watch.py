@@ -0,0 +1,210 @@
+import hashlib
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from enums.date_format import DateFormat
+from queries import WEEKDAYS, StayQuery
+
+
+DEFAULT_INTERVAL = 60.0
+
+# Settings sections that configure reporters rather than the search itself.
+REPORTER_SECTIONS = ("print", "smtp")
+
+
+class Watch(NamedTuple):
+    """
+    A single search: a set of parks, a date range and the constraints a stay
+    has to satisfy.
+    """
+
+    name: str
+    parks: List[Any]
+    start_date: datetime
+    end_date: datetime
+    nights: Optional[int] = None
+    campsite_type: Optional[str] = None
+    campsite_ids: Tuple[int, ...] = ()
+    weekends_only: bool = False
+    # Seconds between polls of this watch's nearest months.
+    interval: float = DEFAULT_INTERVAL
+    # Stay patterns to look for instead of `nights`/`weekends_only`.
+    stays: Tuple[StayQuery, ...] = ()
+
+    @classmethod
+    def from_args(cls, args) -> "Watch":
+        watch = cls(
+            name="",
+            parks=list(args.parks),
+            start_date=args.start_date,
+            end_date=args.end_date,
+            nights=args.nights,
+            campsite_type=args.campsite_type,
+            campsite_ids=tuple(args.campsite_ids),
+            weekends_only=args.weekends_only,
+            interval=getattr(args, "interval", DEFAULT_INTERVAL),
+        )
+        return watch._replace(name=watch.search_name())
+
+    def search_name(self) -> str:
+        """
+        Names the watch after what it searches for, so that command line runs
+        looking for different things, e.g. from parallel cron jobs, keep
+        separate snapshots in the hash store.
+        """
+        search = {
+            "parks": sorted(str(park) for park in self.parks),
+            "start_date": self.start_date.strftime(DateFormat.INPUT_DATE_FORMAT.value),
+            "end_date": self.end_date.strftime(DateFormat.INPUT_DATE_FORMAT.value),
+            "nights": self.nights,
+            "campsite_type": self.campsite_type,
+            "campsite_ids": sorted(self.campsite_ids),
+            "weekends_only": self.weekends_only,
+        }
+        digest = hashlib.sha1(json.dumps(search, sort_keys=True).encode("utf-8"))
+        return "search-{}".format(digest.hexdigest()[:12])
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> "Watch":
+        """
+        Builds a watch from one entry of the `watches` list in the settings
+        file. The keys mirror the command line arguments:
+
+            name: yosemite
+            parks: [232447, 232450]
+            start_date: 2022-06-01
+            end_date: 2022-06-30
+            nights: 2
+            campsite_type: STANDARD NONELECTRIC
+            campsite_ids: []
+            weekends_only: false
+            interval: 60
+
+        Instead of `nights` and `weekends_only`, `stays` can list several
+        patterns at once. A site is available if any of them matches:
+
+            stays:
+              - nights: 2-3
+                arrival: [fri, sat]
+                windows:
+                  - [2022-06-01, 2022-06-30]
+                  - [2022-08-01, 2022-08-31]
+              - nights: 5
+        """
+        for key in ("name", "parks", "start_date", "end_date"):
+            if key not in settings:
+                raise WatchConfigError(
+                    "Watch {} is missing '{}'.".format(
+                        settings.get("name", "<unnamed>"), key
+                    )
+                )
+        campsite_ids = tuple(int(i) for i in settings.get("campsite_ids") or ())
+        if len(settings["parks"]) > 1 and len(campsite_ids) > 0:
+            raise WatchConfigError(
+                "Watch {}: campsite_ids can only be used with a single park ID.".format(
+                    settings["name"]
+                )
+            )
+        stays = tuple(
+            _stay_from_settings(settings["name"], s)
+            for s in settings.get("stays") or ()
+        )
+        if stays and (settings.get("nights") or settings.get("weekends_only")):
+            raise WatchConfigError(
+                "Watch {}: stays can't be combined with nights or weekends_only.".format(
+                    settings["name"]
+                )
+            )
+        return cls(
+            name=str(settings["name"]),
+            parks=list(settings["parks"]),
+            start_date=_to_datetime(settings["start_date"]),
+            end_date=_to_datetime(settings["end_date"]),
+            nights=settings.get("nights"),
+            campsite_type=settings.get("campsite_type"),
+            campsite_ids=campsite_ids,
+            weekends_only=bool(settings.get("weekends_only", False)),
+            interval=float(settings.get("interval", DEFAULT_INTERVAL)),
+            stays=stays,
+        )
+
+
+def watches_from_settings(
+    settings: Dict[str, Any], names: Optional[List[str]] = None
+) -> List[Tuple[Watch, Dict[str, Any]]]:
+    """
+    Returns the watches configured in the settings file, each with the
+    settings its reporters should use. A watch with its own `print` or
+    `smtp` sections uses those; otherwise it reports like the top-level
+    settings say. Pass `names` to only return some of the watches.
+    """
+    reporter_defaults = {
+        k: v for k, v in settings.items() if k in REPORTER_SECTIONS
+    }
+    watches: List[Tuple[Watch, Dict[str, Any]]] = []
+    seen = set()
+    for watch_settings in settings.get("watches") or []:
+        watch = Watch.from_settings(watch_settings)
+        if watch.name in seen:
+            raise WatchConfigError(
+                "Watch {} is configured more than once.".format(watch.name)
+            )
+        seen.add(watch.name)
+        if names and watch.name not in names:
+            continue
+        reporter_settings = {
+            k: v for k, v in watch_settings.items() if k in REPORTER_SECTIONS
+        }
+        watches.append((watch, reporter_settings or reporter_defaults))
+
+    missing = set(names or ()) - seen
+    if missing:
+        raise WatchConfigError(
+            "No such watch(es): {}.".format(", ".join(sorted(missing)))
+        )
+    return watches
+
+
+def _stay_from_settings(watch_name: str, settings: Dict[str, Any]) -> StayQuery:
+    try:
+        nights = settings.get("nights", 1)
+        if isinstance(nights, str) and "-" in nights:
+            min_nights, max_nights = (int(n) for n in nights.split("-", 1))
+        elif isinstance(nights, (list, tuple)):
+            min_nights, max_nights = (int(n) for n in nights)
+        else:
+            min_nights = max_nights = int(nights)
+        arrival = settings.get("arrival")
+        arrival_weekdays = (
+            frozenset(WEEKDAYS.index(str(day).lower()[:3]) for day in arrival)
+            if arrival
+            else None
+        )
+        windows = tuple(
+            (_to_datetime(start), _to_datetime(end))
+            for start, end in settings.get("windows") or ()
+        )
+    except (TypeError, ValueError) as e:
+        raise WatchConfigError(
+            "Watch {}: invalid stay {}: {}".format(watch_name, settings, e)
+        )
+    if not 0 < min_nights <= max_nights:
+        raise WatchConfigError(
+            "Watch {}: invalid number of nights in stay {}.".format(
+                watch_name, settings
+            )
+        )
+    return StayQuery(min_nights, max_nights, arrival_weekdays, windows)
+
+
+def _to_datetime(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return datetime.strptime(str(value), DateFormat.INPUT_DATE_FORMAT.value)
+
+
+class WatchConfigError(Exception):
+    pass
@@ -0,0 +1,363 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+
+import requests
+
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+class FetchTask(NamedTuple):
+    """
+    One (park, month) page to fetch. Workers fetch the whole page, so that
+    coordinators filtering campsites differently can share it; each
+    coordinator throws away the campsites it doesn't need.
+    """
+
+    park_id: Any
+    month_date: datetime
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return str(self.park_id), self.month_date.strftime("%Y-%m")
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "park_id": str(self.park_id),
+            "month": self.month_date.strftime("%Y-%m"),
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "FetchTask":
+        return cls(data["park_id"], datetime.strptime(data["month"], "%Y-%m"))
+
+
+class FetchResult(NamedTuple):
+    # The availability response, as returned by `get_availability`.
+    data: Dict[str, Any]
+    park_name: str
+
+
+class WorkQueueError(Exception):
+    """
+    Raised when a task failed on every attempt, or wasn't done in time.
+    """
+
+
+class WorkQueue:
+    """
+    A queue of (park, month) fetch tasks in a SQLite file, shared between a
+    coordinator and any number of workers.
+
+    A page is only ever queued once: submitting it again while it's waiting
+    or being fetched is a no-op, so overlapping watches and coordinators
+    share a single fetch. A worker claims a task for `lease` seconds; if it
+    neither completes nor fails it by then (e.g. because it died), another
+    worker can claim it.
+    """
+
+    STORE_FILE = Path(os.environ["HOME"]) / ".campsite-checker-queue.sqlite3"
+    DEFAULT_LEASE = 120.0
+    # Attempts at a task before it's given up on.
+    MAX_ATTEMPTS = 3
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        lease: float = DEFAULT_LEASE,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = Path(path) if path is not None else self.STORE_FILE
+        self.lease = lease
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Transactions are managed explicitly, so that claiming is atomic
+        # across processes.
+        self._db = sqlite3.connect(
+            str(self.path), timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS tasks (
+                park_id TEXT NOT NULL,
+                month TEXT NOT NULL,
+                task TEXT NOT NULL,
+                state TEXT NOT NULL,
+                submitted_at REAL NOT NULL,
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                finished_at REAL,
+                park_name TEXT,
+                body BLOB,
+                error TEXT,
+                PRIMARY KEY (park_id, month)
+            )"""
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS tasks_by_state ON tasks (state, submitted_at)"
+        )
+
+    def submit(self, tasks: Iterable[FetchTask]) -> float:
+        """
+        Queues every task that isn't already waiting or being fetched.
+        Returns the time of submission, for `wait`.
+        """
+        now = self._clock()
+        rows = [
+            (*task.key, json.dumps(task.to_json()), now) for task in tasks
+        ]
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(
+                    "INSERT INTO tasks (park_id, month, task, state, submitted_at) "
+                    "VALUES (?, ?, ?, 'pending', ?) "
+                    "ON CONFLICT (park_id, month) DO UPDATE SET "
+                    "task = excluded.task, state = 'pending', "
+                    "submitted_at = excluded.submitted_at, worker = NULL, "
+                    "lease_expires = NULL, attempts = 0, error = NULL "
+                    "WHERE state NOT IN ('pending', 'claimed')",
+                    rows,
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return now
+
+    def claim(self, worker: str, limit: int = 1) -> List[FetchTask]:
+        """
+        Hands up to `limit` waiting tasks, oldest first, to `worker`.
+        """
+        now = self._clock()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    "SELECT park_id, month, task FROM tasks "
+                    "WHERE state = 'pending' "
+                    "OR (state = 'claimed' AND lease_expires < ?) "
+                    "ORDER BY submitted_at LIMIT ?",
+                    (now, limit),
+                ).fetchall()
+                self._db.executemany(
+                    "UPDATE tasks SET state = 'claimed', worker = ?, "
+                    "lease_expires = ?, attempts = attempts + 1 "
+                    "WHERE park_id = ? AND month = ?",
+                    [(worker, now + self.lease, p, m) for p, m, _ in rows],
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return [FetchTask.from_json(json.loads(task)) for _, _, task in rows]
+
+    def complete(
+        self, task: FetchTask, worker: str, data: Dict[str, Any], park_name: str
+    ) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE tasks SET state = 'done', finished_at = ?, park_name = ?, "
+                "body = ?, error = NULL "
+                "WHERE park_id = ? AND month = ? AND worker = ? AND state = 'claimed'",
+                (
+                    self._clock(),
+                    park_name,
+                    zlib.compress(json.dumps(data).encode()),
+                    *task.key,
+                    worker,
+                ),
+            )
+
+    def fail(self, task: FetchTask, worker: str, error: str) -> None:
+        """
+        Puts a task back for another attempt, or gives up on it after
+        `MAX_ATTEMPTS`.
+        """
+        with self._lock:
+            self._db.execute(
+                "UPDATE tasks SET "
+                "state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "finished_at = ?, worker = NULL, lease_expires = NULL, error = ? "
+                "WHERE park_id = ? AND month = ? AND worker = ? AND state = 'claimed'",
+                (self.MAX_ATTEMPTS, self._clock(), error, *task.key, worker),
+            )
+
+    def results(
+        self, tasks: Iterable[FetchTask], since: float
+    ) -> Dict[Tuple[str, str], FetchResult]:
+        """
+        Returns the results of the tasks that are done, and were done after
+        `since`. Raises `WorkQueueError` if any of them failed.
+        """
+        keys = {task.key for task in tasks}
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT park_id, month, state, park_name, body, error FROM tasks "
+                "WHERE state IN ('done', 'failed') AND finished_at >= ?",
+                (since,),
+            ).fetchall()
+        results = {}
+        for park_id, month, state, park_name, body, error in rows:
+            if (park_id, month) not in keys:
+                continue
+            if state == "failed":
+                raise WorkQueueError(
+                    "Fetching park {} for {} failed: {}".format(park_id, month, error)
+                )
+            results[(park_id, month)] = FetchResult(
+                json.loads(zlib.decompress(body)), park_name
+            )
+        return results
+
+    def wait(
+        self,
+        tasks: Iterable[FetchTask],
+        since: float,
+        timeout: float,
+        poll_interval: float = 0.5,
+        sleep: Callable[[float], None] = time.sleep,
+        on_results: Optional[Callable[[Dict[Tuple[str, str], FetchResult]], None]] = None,
+    ) -> Dict[Tuple[str, str], FetchResult]:
+        """
+        Waits until every task is done, and returns their results. If given,
+        `on_results` is called with the results that came in since it was
+        last called, as soon as they're seen.
+        """
+        tasks = list(tasks)
+        deadline = time.monotonic() + timeout
+        seen: set = set()
+        while True:
+            results = self.results(tasks, since)
+            if on_results is not None and len(results) > len(seen):
+                new = {k: r for k, r in results.items() if k not in seen}
+                seen.update(new)
+                on_results(new)
+            if len(results) == len({task.key for task in tasks}):
+                return results
+            if time.monotonic() >= deadline:
+                raise WorkQueueError(
+                    "Timed out waiting for {} of {} task(s)".format(
+                        len(tasks) - len(results), len(tasks)
+                    )
+                )
+            sleep(poll_interval)
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Returns the number of tasks in each state.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT state, COUNT(*) FROM tasks GROUP BY state"
+            ).fetchall()
+        return dict(rows)
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """
+        Lets workers use the queue through `RemoteWorkQueue`, by serving it
+        over HTTP from a background thread. Anyone who can reach it can post
+        results, so it's only served to this machine unless given another
+        `host`. Call `shutdown` on the returned server to stop it.
+        """
+        queue = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path == "/claim":
+                    tasks = queue.claim(request["worker"], int(request.get("limit", 1)))
+                    response: Dict[str, Any] = {"tasks": [t.to_json() for t in tasks]}
+                elif self.path == "/complete":
+                    queue.complete(
+                        FetchTask.from_json(request["task"]),
+                        request["worker"],
+                        request["data"],
+                        request["park_name"],
+                    )
+                    response = {}
+                elif self.path == "/fail":
+                    queue.fail(
+                        FetchTask.from_json(request["task"]),
+                        request["worker"],
+                        request["error"],
+                    )
+                    response = {}
+                else:
+                    self.send_error(404)
+                    return
+                body = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        httpd = ThreadingHTTPServer((host, port), Handler)
+        httpd.daemon_threads = True
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        return httpd
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class RemoteWorkQueue:
+    """
+    The worker's side of a `WorkQueue` served by another host.
+    """
+
+    TIMEOUT = 30
+
+    def __init__(self, base_url: str) -> None:
+        self.base_url = base_url.rstrip("/")
+        self._session = requests.Session()
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        resp = self._session.post(self.base_url + path, json=payload, timeout=self.TIMEOUT)
+        resp.raise_for_status()
+        return resp.json()
+
+    def claim(self, worker: str, limit: int = 1) -> List[FetchTask]:
+        response = self._post("/claim", {"worker": worker, "limit": limit})
+        return [FetchTask.from_json(t) for t in response["tasks"]]
+
+    def complete(
+        self, task: FetchTask, worker: str, data: Dict[str, Any], park_name: str
+    ) -> None:
+        self._post(
+            "/complete",
+            {"task": task.to_json(), "worker": worker, "data": data, "park_name": park_name},
+        )
+
+    def fail(self, task: FetchTask, worker: str, error: str) -> None:
+        self._post("/fail", {"task": task.to_json(), "worker": worker, "error": error})
+
+    def close(self) -> None:
+        self._session.close()
+
+
+def open_queue(location: str):
+    """
+    Opens the queue at `location`: either the URL of a queue served with
+    `WorkQueue.serve`, or the path of a SQLite queue file.
+    """
+    if location.startswith(("http://", "https://")):
+        return RemoteWorkQueue(location)
+    return WorkQueue(Path(location))
+
+
+def default_worker_id() -> str:
+    return "{}-{}".format(socket.gethostname(), os.getpid())
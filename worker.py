@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python3
+"""
+Fetches (park, month) pages for a coordinator, i.e. `camping.py` running
+with --coordinator.
+
+    python worker.py --queue ~/.campsite-checker-queue.sqlite3
+    python worker.py --queue http://coordinator:8765
+"""
+import argparse
+import logging
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from availability_cache import AvailabilityCache
+from clients.recreation_client import RecreationClient
+from metadata_cache import MetadataCache
+from utils.camping_argparser import CampingArgumentParser
+from work_queue import FetchTask, default_worker_id, open_queue
+
+
+LOG = logging.getLogger(__name__)
+log_formatter = logging.Formatter(
+    "%(asctime)s - %(process)s - %(levelname)s - %(message)s"
+)
+sh = logging.StreamHandler()
+sh.setFormatter(log_formatter)
+LOG.addHandler(sh)
+
+# Seconds to wait before asking again when there's nothing to do.
+IDLE_SLEEP = 1.0
+
+
+def fetch_task(queue, worker_id: str, task: FetchTask) -> bool:
+    """
+    Fetches one task and posts the result back. Returns whether it worked.
+    """
+    try:
+        data = RecreationClient.get_availability(task.park_id, task.month_date)
+        park_name = RecreationClient.get_park_name(task.park_id)
+    except Exception as e:
+        LOG.warning(
+            "Failed to fetch park {} for {:%Y-%m}".format(task.park_id, task.month_date),
+            exc_info=True,
+        )
+        queue.fail(task, worker_id, repr(e))
+        return False
+    queue.complete(task, worker_id, data, park_name)
+    return True
+
+
+def run_worker(
+    queue,
+    worker_id: str,
+    max_concurrency: int = 8,
+    exit_when_idle: bool = False,
+    sleep: Callable[[float], None] = time.sleep,
+) -> int:
+    """
+    Claims tasks, at most `max_concurrency` at a time, and fetches them
+    until interrupted, or until the queue is empty with `exit_when_idle`.
+    Returns the number of tasks fetched.
+    """
+    fetched = 0
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        while True:
+            tasks = queue.claim(worker_id, max_concurrency)
+            if not tasks:
+                if exit_when_idle:
+                    return fetched
+                sleep(IDLE_SLEEP)
+                continue
+            LOG.debug("{} claimed {} task(s)".format(worker_id, len(tasks)))
+            fetched += sum(
+                executor.map(lambda task: fetch_task(queue, worker_id, task), tasks)
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--debug", "-d", action="store_true", help="Debug log level")
+    parser.add_argument(
+        "--queue",
+        required=True,
+        help=(
+            "The coordinator's queue: the path of its SQLite queue file, or "
+            "the http://<host>:<port> it serves the queue at with --serve-queue."
+        ),
+    )
+    parser.add_argument(
+        "--worker-id",
+        default=default_worker_id(),
+        help="Name of this worker in the queue (default is <host>-<pid>).",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=CampingArgumentParser.TypeConverter.positive_int,
+        default=8,
+        help="Maximum number of requests to recreation.gov in flight at once (default is 8).",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=CampingArgumentParser.TypeConverter.positive_float,
+        default=10.0,
+        help="Maximum number of requests per second to recreation.gov (default is 10).",
+    )
+    parser.add_argument(
+        "--exit-when-idle",
+        action="store_true",
+        help="Stop once there are no tasks left, instead of waiting for more.",
+    )
+    parser.add_argument(
+        "--no-availability-cache",
+        action="store_true",
+        help="Don't cache availability responses between fetches.",
+    )
+    args = parser.parse_args()
+
+    if args.debug:
+        LOG.setLevel(logging.DEBUG)
+
+    RecreationClient.configure_pool(args.max_concurrency)
+    RecreationClient.configure_rate_limit(args.rate_limit)
+    RecreationClient.use_metadata_cache(MetadataCache())
+    if not args.no_availability_cache:
+        RecreationClient.use_availability_cache(AvailabilityCache())
+
+    queue = open_queue(args.queue)
+    try:
+        run_worker(
+            queue,
+            args.worker_id,
+            max_concurrency=args.max_concurrency,
+            exit_when_idle=args.exit_when_idle,
+        )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        queue.close()